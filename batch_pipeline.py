@@ -0,0 +1,89 @@
+import argparse
+import os
+import sys
+from spect import BatchRunner, EnergyWindows, ProjectionQC, ScanGeometry, load_manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch SPECT reconstruction over a manifest of studies")
+    parser.add_argument("manifest", help="CSV or JSON manifest: study_id, projection, orbit, [reference], "
+                                         "[reference_filtered], [scatter_lower], [scatter_upper], [cor_offset_mm]")
+    parser.add_argument("--output-dir", default=None, help="Output directory (default: outputs/batch)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--n-subsets", type=int, default=4)
+    parser.add_argument("--n-iterations", type=int, default=10)
+    parser.add_argument("--fwhm", type=float, default=10.0, help="Post-filter FWHM in mm")
+    parser.add_argument("--cache-dir", default=None, help="System matrix cache directory")
+    parser.add_argument("--detector-bins", type=int, default=128, help="Detector bins (u)")
+    parser.add_argument("--detector-rows", type=int, default=128, help="Detector axial rows (v)")
+    parser.add_argument("--n-angles", type=int, default=64, help="Projection angles")
+    parser.add_argument("--bin-size", type=float, default=3.3, help="Detector bin size in mm")
+    parser.add_argument("--recon-size", type=int, default=None,
+                        help="In-plane recon grid size, e.g. 64 for preview or 256 for high-res (default: detector bins)")
+    parser.add_argument("--n-slices", type=int, default=None,
+                        help="Recon slices; must divide detector rows (default: detector rows)")
+    parser.add_argument("--format", choices=["dat", "svol"], default="dat",
+                        help="Output volume format: raw .dat or chunked compressed .svol")
+    parser.add_argument("--multires", default=None,
+                        help="Coarse-to-fine schedule run before the full grid, as size:iterations pairs, "
+                             "e.g. 32:2,64:3 (the iterations count towards --n-iterations)")
+    parser.add_argument("--support", choices=["fov", "body"], default=None,
+                        help="Only reconstruct pixels inside the field of view or a quick body outline")
+    parser.add_argument("--subset-order", choices=["sequential", "bit_reversal", "max_separation", "random"],
+                        default="sequential", help="Order in which OSEM subsets are visited")
+    parser.add_argument("--subset-seed", type=int, default=None,
+                        help="Seed of the per-iteration random subset orders (--subset-order random), for reproducible runs")
+    parser.add_argument("--head-offsets", default=None,
+                        help="Lateral detector offset (mm) of each head as probe:offset pairs, e.g. 1:0,2:1.6")
+    parser.add_argument("--cor", default=None,
+                        help="Center-of-rotation offset of the studies in mm, or 'auto' to estimate it per study "
+                             "from the projections (a manifest cor_offset_mm column takes precedence)")
+    parser.add_argument("--qc", choices=["warn", "fail"], default=None,
+                        help="Check the projections for missing frames and patient motion before reconstructing; "
+                             "'fail' skips studies that do not pass, 'warn' only records the result")
+    parser.add_argument("--tew-widths", default="28:3:3",
+                        help="Photopeak, lower and upper window widths in keV for TEW scatter correction "
+                             "of studies with scatter windows")
+    parser.add_argument("--scatter-smooth", type=float, default=2.0,
+                        help="FWHM in detector bins of the smoothing applied to the scatter estimate")
+    parser.add_argument("--events", default=None,
+                        help="Append machine-readable progress events (JSON lines, tagged with study_id) to this file")
+    args = parser.parse_args()
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    output_dir = args.output_dir or os.path.join(base_dir, "outputs", "batch")
+
+    try:
+        studies = load_manifest(args.manifest)
+        resolution_schedule = None
+        if args.multires:
+            resolution_schedule = [tuple(int(x) for x in level.split(":")) for level in args.multires.split(",")]
+        head_offsets_mm = None
+        if args.head_offsets:
+            head_offsets_mm = {int(probe): float(offset) for probe, offset in
+                               (pair.split(":") for pair in args.head_offsets.split(","))}
+        cor = args.cor if args.cor in (None, "auto") else float(args.cor)
+        peak_width, lower_width, upper_width = (float(w) for w in args.tew_widths.split(":"))
+        energy_windows = EnergyWindows(peak_width, lower_width, upper_width, args.scatter_smooth)
+        geometry = ScanGeometry(args.detector_bins, args.detector_rows, args.n_angles, args.bin_size,
+                                recon_size=args.recon_size, n_slices=args.n_slices)
+        runner = BatchRunner(output_dir, n_workers=args.workers,
+                             n_subsets=args.n_subsets, n_iterations=args.n_iterations,
+                             fwhm_mm=args.fwhm, cache_dir=args.cache_dir,
+                             output_format=args.format, geometry=geometry,
+                             resolution_schedule=resolution_schedule, support=args.support,
+                             subset_ordering=args.subset_order, subset_seed=args.subset_seed,
+                             head_offsets_mm=head_offsets_mm,
+                             energy_windows=energy_windows, events_path=args.events, cor=cor,
+                             qc=ProjectionQC(strict=args.qc == "fail") if args.qc else None)
+        rows = runner.run(studies)
+    except Exception as e:
+        print(f"BATCH ERROR: {e}", file=sys.stderr, flush=True)
+        sys.exit(1)
+
+    n_failed = sum(1 for row in rows if row['status'] != 'ok')
+    print(f"Batch complete: {len(rows) - n_failed} ok, {n_failed} failed. "
+          f"Summary: {os.path.join(output_dir, 'summary.csv')}", flush=True)
+    sys.exit(1 if n_failed else 0)
+
+if __name__ == "__main__":
+    main()
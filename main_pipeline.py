@@ -1,65 +1,69 @@
+import asyncio
 import os
-import numpy as np
-import time
+import json
 import sys
-from spect import SPECTDataLoader, OSEMReconstructor, Evaluator
+from spect import SPECTDataLoader, OSEMReconstructor, Pipeline, ProjectionQC
+from spect.preview_pack import preview_path
 
 def main():
     try:
         print("--- SPECT Reconstruction Pipeline Started ---", flush=True)
         
-        # 1. Load Data
+        # 1. Setup
         loader = SPECTDataLoader()
         base_dir = os.path.dirname(os.path.abspath(__file__))
         data_dir = os.path.join(base_dir, "data")
         outputs_dir = os.path.join(base_dir, "outputs")
-    
-        print("Loading data...", flush=True)
-        proj_data = loader.load_projection(os.path.join(data_dir, "input", "Proj.dat"))
-        orbit_df = loader.load_orbit(os.path.join(data_dir, "input", "orbit.xlsx"))
-        ref_recon = loader.load_volume(os.path.join(data_dir, "reference", "OSEMReconed.dat"))
-        ref_filtered = loader.load_volume(os.path.join(data_dir, "reference", "Filtered.dat"))
-        
-        orbit_angles = orbit_df['angle'].values
+        os.makedirs(outputs_dir, exist_ok=True)
         
-        # 2. Reconstruction
-        print("\nStarting OSEM Reconstruction...", flush=True)
+        # Every stage (load -> preprocess -> qc -> reconstruct -> filter -> evaluate) is cached in
+        # outputs/stage_cache under a hash of its inputs, so changing e.g. the
+        # filter FWHM reuses the cached reconstruction.
         # Using 4 subsets and 10 iterations as a standard choice
         reconstructor = OSEMReconstructor(n_subsets=4, n_iterations=10)
+        pipeline = Pipeline(os.path.join(outputs_dir, "stage_cache"),
+                            fwhm_mm=10.0, pixel_size_mm=3.3,
+                            reconstructor=reconstructor, loader=loader,
+                            qc=ProjectionQC(strict=False))
         
-        # Reconstruct volume
-        my_recon = reconstructor.reconstruct_volume(proj_data, orbit_angles)
-        
-        # Save My Recon
-        os.makedirs(outputs_dir, exist_ok=True)
+        # 2. Load -> Reconstruct -> Filter -> Evaluate, 3. Save Outputs
+        # References are read while OSEM runs and the outputs are written while
+        # the next stage computes (see Pipeline.run_async)
+        print("\nRunning pipeline stages...", flush=True)
         my_recon_path = os.path.join(outputs_dir, "MyRecon.dat")
-        my_recon.tofile(my_recon_path)
-        print(f"Saved reconstruction to {my_recon_path}", flush=True)
-        
-        # 3. Post-Processing
-        print("\nApplying Gaussian Filter...", flush=True)
-        my_filtered = Evaluator.apply_filter(my_recon, fwhm_mm=10.0, pixel_size_mm=3.3)
-        
-        # Save My Filtered
         my_filtered_path = os.path.join(outputs_dir, "MyFiltered.dat")
-        my_filtered.tofile(my_filtered_path)
+        # Progress is checkpointed so an interrupted reconstruction resumes on restart
+        result = asyncio.run(pipeline.run_async(
+            os.path.join(data_dir, "input", "Proj.dat"),
+            os.path.join(data_dir, "input", "orbit.xlsx"),
+            reference_path=os.path.join(data_dir, "reference", "OSEMReconed.dat"),
+            reference_filtered_path=os.path.join(data_dir, "reference", "Filtered.dat"),
+            checkpoint_dir=os.path.join(outputs_dir, "checkpoint"),
+            output_paths={'recon': my_recon_path, 'filtered': my_filtered_path},
+        ))
+        for stage, key, hit in pipeline.stage_log:
+            print(f"  {stage:<12} {'cached' if hit else 'computed'} ({key[:12]})", flush=True)
+        # Projection QC (missing frames, patient motion) only warns here
+        for line in ProjectionQC.describe(result['qc']):
+            print(f"QC WARNING: {line}", flush=True)
+        print(f"Saved reconstruction to {my_recon_path}", flush=True)
         print(f"Saved filtered result to {my_filtered_path}", flush=True)
+        # MIPs, peak slices and thumbnails for the visualizer and reports
+        for name, path in (('recon', my_recon_path), ('filtered', my_filtered_path)):
+            result['previews'][name].save(preview_path(path))
         
         # 4. Evaluation
         print("\n--- Evaluation Results ---", flush=True)
-        
-        # Raw Recon Comparison
-        rmse_recon = Evaluator.calculate_rmse(my_recon, ref_recon)
-        ssim_recon = Evaluator.calculate_ssim(my_recon, ref_recon)
+        metrics = result['metrics']
+        rmse_recon = metrics['rmse_recon']
+        ssim_recon = metrics['ssim_recon']
+        rmse_filt = metrics['rmse_filtered']
+        ssim_filt = metrics['ssim_filtered']
         
         print(f"My Recon vs Ref Recon:", flush=True)
         print(f"  RMSE: {rmse_recon:.6f}", flush=True)
         print(f"  SSIM: {ssim_recon:.6f}", flush=True)
         
-        # Filtered Comparison
-        rmse_filt = Evaluator.calculate_rmse(my_filtered, ref_filtered)
-        ssim_filt = Evaluator.calculate_ssim(my_filtered, ref_filtered)
-        
         print(f"My Filtered vs Ref Filtered:", flush=True)
         print(f"  RMSE: {rmse_filt:.6f}", flush=True)
         print(f"  SSIM: {ssim_filt:.6f}", flush=True)
@@ -75,6 +79,14 @@ def main():
             f.write(f"  RMSE: {rmse_filt:.6f}\n")
             f.write(f"  SSIM: {ssim_filt:.6f}\n")
         
+        # Machine-readable copy of the metrics and the parameters that produced them
+        with open(os.path.join(outputs_dir, "evaluation_results.json"), "w") as f:
+            json.dump({
+                'parameters': pipeline.parameters(),
+                'metrics': metrics,
+                'stage_keys': result['keys'],
+            }, f, indent=2)
+        
         print("Pipeline Completed Successfully.", flush=True)
         
     except Exception as e:
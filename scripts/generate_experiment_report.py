@@ -1,196 +1,125 @@
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_JUSTIFY, TA_CENTER
 import os
-from datetime import datetime
+import sys
 
-def register_chinese_font():
-    """注册中文字体"""
-    fonts_to_try = [
-        ("SimSun", "C:\\Windows\\Fonts\\simsun.ttc"), # 宋体 usually preferred for academic reports
-        ("SimHei", "C:\\Windows\\Fonts\\simhei.ttf"),
-        ("MsYaHei", "C:\\Windows\\Fonts\\msyh.ttf")
-    ]
-    
-    for font_name, font_path in fonts_to_try:
-        if os.path.exists(font_path):
-            try:
-                # For TTC, usually we need to specify subfont index, reportlab might need help.
-                # TTFont in reportlab handles .ttf well. .ttc might be tricky without index.
-                # Let's try SimHei.ttf first as it is safer.
-                if font_path.endswith(".ttf"):
-                    pdfmetrics.registerFont(TTFont(font_name, font_path))
-                    return font_name
-            except Exception:
-                continue
-                
-    # Fallback to SimHei if available
-    path = "C:\\Windows\\Fonts\\simhei.ttf"
-    if os.path.exists(path):
-        pdfmetrics.registerFont(TTFont("SimHei", path))
-        return "SimHei"
-        
-    return "Helvetica"
+# 添加项目根目录到路径
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
 
-def generate_experiment_report():
-    output_dir = r"d:\SPECT\reports"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        
-    filename = os.path.join(output_dir, "SPECT_Experiment_Report.pdf")
-    
-    doc = SimpleDocTemplate(filename, pagesize=A4,
-                            rightMargin=60, leftMargin=60,
-                            topMargin=60, bottomMargin=50)
-    
-    Story = []
-    
-    cn_font = register_chinese_font()
-    styles = getSampleStyleSheet()
-    
-    # Custom Styles
-    style_title = ParagraphStyle(name='TitleCN', parent=styles['Title'], fontName=cn_font, fontSize=18, leading=22, spaceAfter=20, alignment=TA_CENTER)
-    style_h1 = ParagraphStyle(name='H1CN', parent=styles['Heading1'], fontName=cn_font, fontSize=14, leading=18, spaceBefore=12, spaceAfter=6)
-    style_h2 = ParagraphStyle(name='H2CN', parent=styles['Heading2'], fontName=cn_font, fontSize=12, leading=15, spaceBefore=10, spaceAfter=4)
-    style_normal = ParagraphStyle(name='NormalCN', parent=styles['Normal'], fontName=cn_font, fontSize=10.5, leading=16, alignment=TA_JUSTIFY, spaceAfter=6)
-    style_caption = ParagraphStyle(name='CaptionCN', parent=styles['Normal'], fontName=cn_font, fontSize=9, leading=12, alignment=TA_CENTER, textColor=colors.grey)
-    
-    # --- Title Page ---
-    Story.append(Spacer(1, 100))
-    Story.append(Paragraph("SPECT 图像重建实验报告", style_title))
-    Story.append(Spacer(1, 20))
-    Story.append(Paragraph(f"日期: {datetime.now().strftime('%Y年%m月%d日')}", ParagraphStyle(name='Date', parent=style_normal, alignment=TA_CENTER)))
-    Story.append(PageBreak())
-    
-    # --- 1. 实验目的 ---
-    Story.append(Paragraph("1. 实验目的", style_h1))
-    
-    text_1 = """
-    单光子发射计算机断层成像（Single Photon Emission Computed Tomography, SPECT）是一种重要的核医学成像技术。本实验旨在深入理解SPECT成像的基本物理原理和数学模型，掌握图像重建的核心算法。
-    <br/><br/>
-    具体目标包括：
-    <br/>1. 理解投影数据的获取过程及Radon变换原理。
-    <br/>2. 掌握最大似然期望最大化（MLEM）及其加速算法有序子集期望最大化（OSEM）的原理与实现。
-    <br/>3. 实现对临床人体投影数据的三维重建，并评估重建图像的质量。
-    """
-    Story.append(Paragraph(text_1, style_normal))
-    
-    # --- 2. 实验方法 ---
-    Story.append(Paragraph("2. 实验方法", style_h1))
-    
-    Story.append(Paragraph("2.1 图像重建算法", style_h2))
-    text_2_1 = """
-    本实验采用 OSEM (Ordered Subsets Expectation Maximization) 算法进行图像重建。OSEM 是 MLEM 算法的加速版本，通过将投影数据划分为若干个有序子集，在每次迭代中依次使用各子集数据更新图像估计值，从而显著加快收敛速度。
-    <br/><br/>
-    迭代公式如下：
-    <br/>(此处省略复杂数学公式渲染，以文字描述)
-    <br/>对于第 n 次迭代的第 k 个子集，像素 j 的更新因子取决于测量投影与估计投影的比值的反投影。
-    """
-    Story.append(Paragraph(text_2_1, style_normal))
-    
-    Story.append(Paragraph("2.2 系统矩阵建模", style_h2))
-    text_2_2 = """
-    实验中采用了基于射线驱动（Ray-driven）的几何投影模型。假设探测器准直器为理想平行孔，忽略准直器的距离模糊效应（Collimator Blurring）和衰减效应。将 128x128x128 的三维重建视野离散化，计算每个体素对探测器单元的几何贡献权重，构建稀疏系统矩阵。
-    """
-    Story.append(Paragraph(text_2_2, style_normal))
-    
-    Story.append(Paragraph("2.3 参数设置与处理流程", style_h2))
-    data_params = [
-        ["参数项", "数值/说明"],
-        ["输入数据", "Proj.dat (128x128x64, float32)"],
-        ["重建算法", "OSEM"],
-        ["子集数目 (Subsets)", "4"],
-        ["迭代次数 (Iterations)", "10"],
-        ["体素尺寸", "3.30 mm x 3.30 mm x 3.30 mm"],
-        ["后处理", "三维高斯滤波 (FWHM = 10 mm)"]
-    ]
-    
-    t = Table(data_params, colWidths=[150, 250], hAlign='CENTER')
-    t.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), cn_font),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('PADDING', (0, 0), (-1, -1), 6),
-    ]))
-    Story.append(t)
-    Story.append(Spacer(1, 12))
-    
-    # --- 3. 实验结果 ---
-    Story.append(Paragraph("3. 实验结果", style_h1))
-    
-    Story.append(Paragraph("3.1 定性结果展示", style_h2))
-    Story.append(Paragraph("下图展示了重建结果（MyRecon）与参考结果（Reference）在轴向层面的对比。可以看出，重建图像清晰地恢复了放射性示踪剂在体内的分布结构。", style_normal))
-    
-    # Insert Images
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    pics_dir = os.path.join(base_dir, "pictures")
-    img_1_path = os.path.join(pics_dir, "viz_compare_raw_axial.png")
-    if os.path.exists(img_1_path):
-        img1 = Image(img_1_path, width=450, height=150)
-        Story.append(img1)
-        Story.append(Paragraph("图 1: 原始重建结果 (MyRecon) 与参考结果对比", style_caption))
-        Story.append(Spacer(1, 12))
+from spect.report import ReportEngine, load_fields
 
-    img_2_path = os.path.join(pics_dir, "viz_compare_filtered_axial.png")
-    if os.path.exists(img_2_path):
-        img2 = Image(img_2_path, width=450, height=150)
-        Story.append(img2)
-        Story.append(Paragraph("图 2: 滤波后结果 (MyFiltered) 与参考结果对比", style_caption))
-        Story.append(Spacer(1, 12))
-
-    Story.append(Paragraph("3.2 定量分析", style_h2))
-    Story.append(Paragraph("采用均方根误差 (RMSE) 和结构相似性 (SSIM) 对重建质量进行评估：", style_normal))
-    
-    data_results = [
-        ["对比组", "RMSE (越小越好)", "SSIM (越大越好)"],
-        ["原始重建 (MyRecon vs Ref)", "0.209455", "0.537552"],
-        ["滤波后 (MyFiltered vs RefFiltered)", "0.128543", "0.329922"]
-    ]
-    
-    t2 = Table(data_results, colWidths=[180, 100, 100], hAlign='CENTER')
-    t2.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), cn_font),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
-    ]))
-    Story.append(t2)
-    Story.append(Spacer(1, 12))
-    
-    # --- 4. 讨论分析 ---
-    Story.append(Paragraph("4. 讨论分析", style_h1))
-    text_4 = """
-    <b>4.1 滤波的影响</b><br/>
-    从定量结果可以看出，高斯滤波显著降低了 RMSE（从 0.209 降至 0.128），说明滤波有效地抑制了迭代重建过程中产生的高频噪声，提高了图像的信噪比。
-    <br/><br/>
-    <b>4.2 误差来源分析</b><br/>
-    重建结果与参考图像的 SSIM 约为 0.54，主要差异可能来源于系统矩阵建模的简化。本实验仅考虑了几何投影，未包含准直器的距离模糊效应（Depth-dependent resolution）。在实际物理过程中，随着源到准直器距离的增加，点扩展函数（PSF）会变宽。忽略这一效应会导致重建图像的分辨率恢复不足。
-    <br/><br/>
-    <b>4.3 算法优缺点</b><br/>
-    OSEM 算法的优点是收敛速度快，能够处理泊松噪声统计特性。缺点是在高迭代次数下噪声会随之放大，因此必须配合正则化或后平滑处理。
-    """
-    Story.append(Paragraph(text_4, style_normal))
-    
-    # --- 5. 结论 ---
-    Story.append(Paragraph("5. 结论", style_h1))
-    text_5 = """
-    本实验成功基于 Python 实现了 SPECT 投影数据的 OSEM 重建。通过与参考数据的对比分析，验证了算法实现的正确性。实验结果表明，OSEM 算法结合适当的后处理滤波，能够有效地重建出体内的放射性分布。
-    <br/><br/>
-    未来的工作可以从以下方面改进：
-    <br/>1. 在系统矩阵中引入准直器模糊模型，以提高分辨率恢复能力。
-    <br/>2. 引入解剖结构先验信息或使用 MAP 算法（如 One-step-late 算法）进一步抑制噪声并保留边缘。
-    """
-    Story.append(Paragraph(text_5, style_normal))
-    
-    # Build
-    doc.build(Story)
-    print(f"Report generated: {filename}")
+# Experiment report (purpose / method / results / discussion), in the
+# section format of spect.report.REPORT_SECTIONS
+EXPERIMENT_SECTIONS = [
+    {
+        "key": "purpose",
+        "title": "1. 实验目的",
+        "subsections": [
+            {
+                "subtitle": "1.1 实验目标",
+                "content": """单光子发射计算机断层成像（Single Photon Emission Computed Tomography, SPECT）是一种重要的核医学成像技术。本实验旨在深入理解SPECT成像的基本物理原理和数学模型，掌握图像重建的核心算法。
+具体目标包括：
+1. 理解投影数据的获取过程及Radon变换原理。
+2. 掌握最大似然期望最大化（MLEM）及其加速算法有序子集期望最大化（OSEM）的原理与实现。
+3. 实现对临床人体投影数据的三维重建，并评估重建图像的质量。""",
+            },
+        ],
+    },
+    {
+        "key": "method",
+        "title": "2. 实验方法",
+        "subsections": [
+            {
+                "subtitle": "2.1 图像重建算法",
+                "content": """本实验采用 OSEM (Ordered Subsets Expectation Maximization) 算法进行图像重建。OSEM 是 MLEM 算法的加速版本，通过将投影数据划分为若干个有序子集，在每次迭代中依次使用各子集数据更新图像估计值，从而显著加快收敛速度。
+对于第 n 次迭代的第 k 个子集，像素 j 的更新因子取决于测量投影与估计投影的比值的反投影。""",
+            },
+            {
+                "subtitle": "2.2 系统矩阵建模",
+                "content": "实验中采用了基于射线驱动（Ray-driven）的几何投影模型。假设探测器准直器为理想平行孔，忽略准直器的距离模糊效应（Collimator Blurring）和衰减效应。将 128x128x128 的三维重建视野离散化，计算每个体素对探测器单元的几何贡献权重，构建稀疏系统矩阵。",
+            },
+            {
+                "subtitle": "2.3 参数设置与处理流程",
+                "table": [
+                    ["参数项", "数值/说明"],
+                    ["输入数据", "Proj.dat (128x128x64, float32)"],
+                    ["重建算法", "OSEM"],
+                    ["子集数目 (Subsets)", "{n_subsets}"],
+                    ["迭代次数 (Iterations)", "{n_iterations}"],
+                    ["体素尺寸", "{pixel_size_mm:.2f} mm x {pixel_size_mm:.2f} mm x {pixel_size_mm:.2f} mm"],
+                    ["后处理", "三维高斯滤波 (FWHM = {fwhm_mm:g} mm)"],
+                ],
+                "col_widths": [150, 250],
+            },
+        ],
+    },
+    {
+        "key": "results",
+        "title": "3. 实验结果",
+        "subsections": [
+            {
+                "subtitle": "3.1 定性结果展示",
+                "content": "下图展示了重建结果（MyRecon）与参考结果（Reference）在轴向层面的对比。可以看出，重建图像清晰地恢复了放射性示踪剂在体内的分布结构。",
+                "image": "compare_raw",
+                "caption": "图 1: 原始重建结果 (MyRecon) 与参考结果对比",
+            },
+            {
+                "subtitle": "3.2 滤波后结果",
+                "image": "compare_filtered",
+                "caption": "图 2: 滤波后结果 (MyFiltered) 与参考结果对比",
+            },
+            {
+                "subtitle": "3.3 定量分析",
+                "content": "采用均方根误差 (RMSE) 和结构相似性 (SSIM) 对重建质量进行评估：",
+                "table": [
+                    ["对比组", "RMSE (越小越好)", "SSIM (越大越好)"],
+                    ["原始重建 (MyRecon vs Ref)", "{rmse_recon:.6f}", "{ssim_recon:.6f}"],
+                    ["滤波后 (MyFiltered vs RefFiltered)", "{rmse_filtered:.6f}", "{ssim_filtered:.6f}"],
+                ],
+                "col_widths": [180, 100, 100],
+            },
+        ],
+    },
+    {
+        "key": "discussion",
+        "title": "4. 讨论分析",
+        "subsections": [
+            {
+                "subtitle": "4.1 滤波的影响",
+                "content": "从定量结果可以看出，高斯滤波后 RMSE 从 {rmse_recon:.3f} 变为 {rmse_filtered:.3f}，滤波抑制了迭代重建过程中产生的高频噪声，提高了图像的信噪比。",
+            },
+            {
+                "subtitle": "4.2 误差来源分析",
+                "content": "重建结果与参考图像的 SSIM 约为 {ssim_recon:.2f}，主要差异可能来源于系统矩阵建模的简化。本实验仅考虑了几何投影，未包含准直器的距离模糊效应（Depth-dependent resolution）。在实际物理过程中，随着源到准直器距离的增加，点扩展函数（PSF）会变宽。忽略这一效应会导致重建图像的分辨率恢复不足。",
+            },
+            {
+                "subtitle": "4.3 算法优缺点",
+                "content": "OSEM 算法的优点是收敛速度快，能够处理泊松噪声统计特性。缺点是在高迭代次数下噪声会随之放大，因此必须配合正则化或后平滑处理。",
+            },
+        ],
+    },
+    {
+        "key": "conclusion",
+        "title": "5. 结论",
+        "subsections": [
+            {
+                "subtitle": "5.1 总结与展望",
+                "content": """本实验成功基于 Python 实现了 SPECT 投影数据的 OSEM 重建。通过与参考数据的对比分析，验证了算法实现的正确性。实验结果表明，OSEM 算法结合适当的后处理滤波，能够有效地重建出体内的放射性分布。
+未来的工作可以从以下方面改进：
+1. 在系统矩阵中引入准直器模糊模型，以提高分辨率恢复能力。
+2. 引入解剖结构先验信息或使用 MAP 算法（如 One-step-late 算法）进一步抑制噪声并保留边缘。""",
+            },
+        ],
+    },
+]
 
 if __name__ == "__main__":
-    generate_experiment_report()
+    # Metric values and parameters come from the pipeline's
+    # evaluation_results.json, figures from pictures/
+    output_dir = os.path.join(BASE_DIR, "reports")
+    os.makedirs(output_dir, exist_ok=True)
+    engine = ReportEngine(os.path.join(BASE_DIR, "outputs", "report_cache"), sections=EXPERIMENT_SECTIONS)
+    paths = engine.build(os.path.join(output_dir, "SPECT_Experiment_Report"),
+                         load_fields(os.path.join(BASE_DIR, "outputs", "evaluation_results.json")),
+                         figures_dir=os.path.join(BASE_DIR, "pictures"), formats=('pdf',))
+    for fmt, path in paths.items():
+        print(f"{fmt.upper()} Generated: {path}")
@@ -2,22 +2,77 @@
 SPECT 图像重建核心模块包
 
 本包包含 SPECT 图像重建的核心功能模块：
+- settings: 配置对象基类（由 to_dict 派生相等、哈希与 repr）
+- geometry: 扫描几何配置模块
 - data_loader: 数据加载模块
 - system_matrix: 系统矩阵计算模块
+- subsets: OSEM 子集划分与排序模块
+- scatter: 能窗散射估计（TEW）模块
 - reconstruction: OSEM 重建算法模块
+- events: 进度事件模块
+- sinogram: 正弦图预处理模块
+- cor: 旋转中心估计模块
+- qc: 重建前投影质控（缺帧、运动检测）模块
+- preview: 快速低分辨率预览重建模块
+- preview_pack: 预览包（MIP、峰值切片、缩略图）模块
+- simulation: 泊松噪声仿真模块
 - evaluate: 评估和滤波模块
+- volume_format: 分块压缩体数据格式模块
+- checkpoint: 重建断点续算模块
+- pipeline: 带阶段缓存的重建流程模块
+- batch: 批量重建模块
+- service: 常驻重建服务模块
+- report: 增量报告生成模块
+- report_template: 报告字体与样式模板模块
 """
 
-from .data_loader import SPECTDataLoader
-from .system_matrix import SystemMatrix
-from .reconstruction import OSEMReconstructor
-from .evaluate import Evaluator
+import importlib
 
-__all__ = [
-    'SPECTDataLoader',
-    'SystemMatrix',
-    'OSEMReconstructor',
-    'Evaluator',
-]
+# 公开名称 -> 所在子模块。子模块在首次访问对应名称时才导入（PEP 562），
+# 因此 `import spect` 不会加载 pandas / scikit-image / scipy.sparse 等重量级依赖。
+_LAZY_ATTRS = {
+    'ScanGeometry': 'geometry',
+    'SPECTDataLoader': 'data_loader',
+    'VolumeFile': 'volume_format',
+    'SystemMatrix': 'system_matrix',
+    'SystemMatrixCache': 'system_matrix',
+    'SubsetPlanner': 'subsets',
+    'EnergyWindows': 'scatter',
+    'SinogramPreprocessor': 'sinogram',
+    'estimate_cor': 'cor',
+    'ProjectionQC': 'qc',
+    'OSEMReconstructor': 'reconstruction',
+    'EventEmitter': 'events',
+    'JsonLinesSink': 'events',
+    'PreviewReconstructor': 'preview',
+    'PreviewPack': 'preview_pack',
+    'PoissonSimulator': 'simulation',
+    'ReconCheckpoint': 'checkpoint',
+    'Evaluator': 'evaluate',
+    'Pipeline': 'pipeline',
+    'StageCache': 'pipeline',
+    'BatchRunner': 'batch',
+    'Study': 'batch',
+    'load_manifest': 'batch',
+    'ReconstructionService': 'service',
+    'ReportEngine': 'report',
+    'ReportTemplate': 'report_template',
+}
+
+__all__ = list(_LAZY_ATTRS)
 
 __version__ = '1.0.0'
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    # Cache on the package so later lookups bypass __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,402 @@
+import csv
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .data_loader import SPECTDataLoader
+from .system_matrix import LRUCache, SystemMatrixCache
+from .geometry import ScanGeometry
+from .reconstruction import OSEMReconstructor
+from .pipeline import Pipeline
+from .qc import ProjectionQC
+from .events import JsonLinesSink
+from .preview_pack import preview_path
+
+SUMMARY_FIELDS = [
+    'study_id', 'status', 'elapsed_s', 'qc_passed', 'cor_offset_mm',
+    'rmse_recon', 'ssim_recon', 'rmse_filtered', 'ssim_filtered',
+    'output_dir', 'error',
+]
+
+
+class Study:
+    """
+    One entry of a batch manifest.
+    reference / reference_filtered are optional; metrics are only computed
+    for the volumes that have a reference.
+    scatter_lower / scatter_upper are the optional scatter window projections
+    for TEW scatter correction (both or neither).
+    cor_offset_mm is the optional measured center-of-rotation offset of the
+    study (overrides the batch's cor setting).
+    """
+    def __init__(self, study_id, projection, orbit, reference=None, reference_filtered=None,
+                 scatter_lower=None, scatter_upper=None, cor_offset_mm=None):
+        self.study_id = study_id
+        self.projection = projection
+        self.orbit = orbit
+        self.reference = reference or None
+        self.reference_filtered = reference_filtered or None
+        self.scatter_lower = scatter_lower or None
+        self.scatter_upper = scatter_upper or None
+        self.cor_offset_mm = None if cor_offset_mm in (None, '') else float(cor_offset_mm)
+
+    def to_dict(self):
+        return {
+            'study_id': self.study_id,
+            'projection': self.projection,
+            'orbit': self.orbit,
+            'reference': self.reference,
+            'reference_filtered': self.reference_filtered,
+            'scatter_lower': self.scatter_lower,
+            'scatter_upper': self.scatter_upper,
+            'cor_offset_mm': self.cor_offset_mm,
+        }
+
+
+def load_manifest(file_path):
+    """
+    Load a batch manifest (.csv or .json).
+    Columns / keys: study_id, projection, orbit, [reference], [reference_filtered],
+    [scatter_lower], [scatter_upper], [cor_offset_mm].
+    Relative paths are resolved against the manifest's directory.
+    Returns: list of Study
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File not found: {file_path}")
+
+    if file_path.lower().endswith('.json'):
+        with open(file_path, encoding='utf-8') as f:
+            entries = json.load(f)
+        if isinstance(entries, dict):
+            entries = entries.get('studies', [])
+    else:
+        with open(file_path, newline='', encoding='utf-8') as f:
+            entries = list(csv.DictReader(f))
+
+    base_dir = os.path.dirname(os.path.abspath(file_path))
+
+    def resolve(path):
+        if not path:
+            return None
+        return path if os.path.isabs(path) else os.path.join(base_dir, path)
+
+    studies = []
+    seen = set()
+    for i, entry in enumerate(entries):
+        study_id = (entry.get('study_id') or f"study_{i:04d}").strip()
+        if not entry.get('projection') or not entry.get('orbit'):
+            raise ValueError(f"Manifest entry '{study_id}' needs 'projection' and 'orbit'")
+        if study_id in seen:
+            raise ValueError(f"Duplicate study_id in manifest: {study_id}")
+        seen.add(study_id)
+        studies.append(Study(
+            study_id,
+            resolve(entry['projection']),
+            resolve(entry['orbit']),
+            resolve(entry.get('reference')),
+            resolve(entry.get('reference_filtered')),
+            resolve(entry.get('scatter_lower')),
+            resolve(entry.get('scatter_upper')),
+            entry.get('cor_offset_mm'),
+        ))
+    return studies
+
+
+# Per-process system matrix caches and reconstructors. A worker process (or
+# the service) handles many studies, so matrices and subset systems stay warm
+# across them: matrix caches are keyed on the geometry only, reconstructors
+# on the reconstruction parameters. Downstream settings (post-filter, scatter
+# windows, COR mode, QC) only shape the cheap per-study Pipeline around them.
+# Both are bounded; evicted reconstructors are closed.
+MAX_WORKER_RECONSTRUCTORS = 4
+_matrix_caches = LRUCache(MAX_WORKER_RECONSTRUCTORS)
+_worker_reconstructors = LRUCache(MAX_WORKER_RECONSTRUCTORS, on_evict=lambda reconstructor: reconstructor.close())
+
+
+def _get_pipeline(stage_cache_dir, matrix_cache_dir, n_subsets, n_iterations, fwhm_mm, pixel_size_mm, geometry,
+                  resolution_schedule=None, support=None, subset_ordering='sequential', head_offsets_mm=None,
+                  energy_windows=None, cor=None, qc=None, subset_seed=None):
+    resolution_schedule = tuple(tuple(level) for level in resolution_schedule or ())
+    cache_key = (geometry, matrix_cache_dir)
+    key = cache_key + (n_subsets, n_iterations, resolution_schedule, support, subset_ordering, subset_seed,
+                       tuple(sorted((head_offsets_mm or {}).items())))
+    reconstructor = _worker_reconstructors.get(key)
+    if reconstructor is None:
+        cache = _matrix_caches.get(cache_key)
+        if cache is None:
+            cache = SystemMatrixCache(geometry.system_matrix(), cache_dir=matrix_cache_dir)
+            _matrix_caches[cache_key] = cache
+        reconstructor = OSEMReconstructor(n_subsets=n_subsets, n_iterations=n_iterations,
+                                          matrix_cache=cache, geometry=geometry,
+                                          resolution_schedule=resolution_schedule, support=support,
+                                          subset_ordering=subset_ordering, subset_seed=subset_seed,
+                                          head_offsets_mm=head_offsets_mm)
+        _worker_reconstructors[key] = reconstructor
+    # The reconstructor's cor_offset_mm is set per run, so the study's own
+    # COR setting is passed explicitly (0 mm without one)
+    return Pipeline(stage_cache_dir, fwhm_mm=fwhm_mm, pixel_size_mm=pixel_size_mm, reconstructor=reconstructor,
+                    energy_windows=energy_windows, cor=0.0 if cor is None else cor, qc=qc)
+
+
+def close_pipelines():
+    """
+    Close and drop this process' cached reconstructors and system matrices,
+    e.g. when a long-running service stops.
+    """
+    for reconstructor in _worker_reconstructors.values():
+        reconstructor.close()
+    _worker_reconstructors.clear()
+    _matrix_caches.clear()
+
+
+def run_study(study, output_dir, n_subsets=4, n_iterations=10, fwhm_mm=10.0,
+              pixel_size_mm=None, cache_dir=None, checkpoint=True, stage_cache_dir=None,
+              output_format='dat', geometry=None, resolution_schedule=None, support=None,
+              subset_ordering='sequential', head_offsets_mm=None, energy_windows=None, events_path=None,
+              cor=None, qc=None, subset_seed=None):
+    """
+    Reconstruct, filter and evaluate a single study.
+    Writes MyRecon, MyFiltered, their preview packs (MyRecon.preview.npz,
+    MyFiltered.preview.npz) and metrics.json to output_dir/<study_id>/.
+    output_format: 'dat' (headerless float32) or 'svol' (chunked, compressed,
+    with voxel size, orbit and provenance in the header).
+    geometry: ScanGeometry of the studies (default 128^3 from 128 x 128 x 64 projections);
+    pixel_size_mm defaults to its voxel size.
+    resolution_schedule, support, subset_ordering, subset_seed, head_offsets_mm:
+    coarse-to-fine OSEM levels, support restriction ('fov' or 'body'), subset
+    order (and the seed of the 'random' one) and per-head detector offsets,
+    see OSEMReconstructor.
+    energy_windows: EnergyWindows for studies with scatter window projections.
+    cor: center-of-rotation offset in mm or 'auto' (estimated per study), see
+    Pipeline; a study's own cor_offset_mm takes precedence.
+    qc: ProjectionQC checking the projections first; a strict one fails the
+    study without reconstructing it.
+    events_path: JSON-lines file receiving the reconstruction progress events
+    (see OSEMReconstructor.reconstruct_volume) and a final study_finished
+    event, each tagged with the study_id.
+    Stage outputs are cached in stage_cache_dir (default output_dir/stage_cache),
+    so rerunning a study with only downstream parameters changed is cheap.
+    With checkpoint=True, an interrupted reconstruction resumes from
+    output_dir/<study_id>/checkpoint the next time the study is run.
+    Returns: summary row (dict)
+    """
+    start_time = time.time()
+    study_dir = os.path.join(output_dir, study.study_id)
+    row = {'study_id': study.study_id, 'output_dir': study_dir}
+    stage_cache_dir = stage_cache_dir or os.path.join(output_dir, "stage_cache")
+    sink = JsonLinesSink(events_path, study_id=study.study_id) if events_path else None
+    pipeline = None
+
+    try:
+        geometry = geometry or ScanGeometry()
+        pipeline = _get_pipeline(stage_cache_dir, cache_dir, n_subsets, n_iterations, fwhm_mm, pixel_size_mm, geometry,
+                                 resolution_schedule, support, subset_ordering, head_offsets_mm,
+                                 energy_windows, cor, qc, subset_seed)
+        if sink is not None:
+            pipeline.reconstructor.events.subscribe(sink)
+        result = pipeline.run(
+            study.projection, study.orbit,
+            reference_path=study.reference,
+            reference_filtered_path=study.reference_filtered,
+            checkpoint_dir=os.path.join(study_dir, "checkpoint") if checkpoint else None,
+            lower_path=study.scatter_lower,
+            upper_path=study.scatter_upper,
+            cor_offset_mm=study.cor_offset_mm,
+        )
+
+        if output_format not in ('dat', 'svol'):
+            raise ValueError(f"Unknown output format '{output_format}'")
+        recon_path = os.path.join(study_dir, f"MyRecon.{output_format}")
+        filtered_path = os.path.join(study_dir, f"MyFiltered.{output_format}")
+        os.makedirs(study_dir, exist_ok=True)
+        if output_format == 'svol':
+            provenance = {'study_id': study.study_id, 'parameters': pipeline.parameters(),
+                          'stage_keys': result['keys']}
+            orbit = pipeline.loader.load_orbit_array(study.orbit)
+            pipeline.loader.save_volume_file(
+                recon_path, result['recon'],
+                voxel_size_mm=geometry.voxel_size_mm, orbit=orbit, provenance=dict(provenance, volume='recon'))
+            pipeline.loader.save_volume_file(
+                filtered_path, result['filtered'],
+                voxel_size_mm=geometry.voxel_size_mm, orbit=orbit, provenance=dict(provenance, volume='filtered'))
+        else:
+            result['recon'].tofile(recon_path)
+            result['filtered'].tofile(filtered_path)
+        result['previews']['recon'].save(preview_path(recon_path))
+        result['previews']['filtered'].save(preview_path(filtered_path))
+
+        metrics = result['metrics']
+        row.update(metrics)
+        row['cor_offset_mm'] = result['cor_offset_mm']
+        if result['qc'] is not None:
+            row['qc_passed'] = result['qc']['passed']
+        row['status'] = 'ok'
+        row['elapsed_s'] = round(time.time() - start_time, 3)
+
+        with open(os.path.join(study_dir, "metrics.json"), "w") as f:
+            json.dump({
+                'study': study.to_dict(),
+                'parameters': pipeline.parameters(),
+                'metrics': metrics,
+                'cor_offset_mm': result['cor_offset_mm'],
+                'qc': None if result['qc'] is None else ProjectionQC.summary(result['qc']),
+                'stage_keys': result['keys'],
+                'elapsed_s': row['elapsed_s'],
+            }, f, indent=2)
+    except Exception as e:
+        row['status'] = 'failed'
+        row['error'] = f"{type(e).__name__}: {e}"
+        row['elapsed_s'] = round(time.time() - start_time, 3)
+        traceback.print_exc()
+    finally:
+        if sink is not None:
+            if pipeline is not None:
+                pipeline.reconstructor.events.unsubscribe(sink)
+            sink({'event': 'study_finished', 'time': time.time(), 'status': row.get('status', 'failed'),
+                  'elapsed_s': round(time.time() - start_time, 3)})
+            sink.close()
+
+    return row
+
+
+class BatchRunner:
+    """
+    Runs many studies across a process pool.
+    System matrices are precomputed once per distinct orbit into cache_dir
+    before dispatch, so workers only ever load them from disk.
+    With checkpoint=True, rerunning an interrupted batch resumes each
+    unfinished reconstruction from its checkpoint.
+    """
+    def __init__(self, output_dir, n_workers=None, n_subsets=4, n_iterations=10,
+                 fwhm_mm=10.0, pixel_size_mm=None, cache_dir=None, checkpoint=True,
+                 output_format='dat', geometry=None, resolution_schedule=None, support=None,
+                 subset_ordering='sequential', head_offsets_mm=None, energy_windows=None, events_path=None,
+                 cor=None, qc=None, subset_seed=None):
+        self.output_dir = output_dir
+        self.n_workers = n_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.n_subsets = n_subsets
+        self.n_iterations = n_iterations
+        self.fwhm_mm = fwhm_mm
+        self.pixel_size_mm = pixel_size_mm
+        self.geometry = geometry or ScanGeometry()
+        self.cache_dir = cache_dir or os.path.join(output_dir, "matrix_cache")
+        self.checkpoint = checkpoint
+        self.output_format = output_format
+        self.resolution_schedule = resolution_schedule
+        self.support = support
+        self.subset_ordering = subset_ordering
+        self.subset_seed = subset_seed
+        self.head_offsets_mm = head_offsets_mm
+        self.energy_windows = energy_windows
+        self.events_path = events_path
+        self.cor = cor
+        self.qc = qc
+
+    def warm_matrix_cache(self, studies):
+        """
+        Compute the system matrix (and those of the coarse-to-fine levels)
+        for each distinct orbit in studies.
+        With cor='auto' the matrices of studies without their own
+        cor_offset_mm cannot be pre-warmed: the center of rotation is only
+        estimated from the projections when the study runs, and the matrix
+        depends on it. Those studies are skipped here; their workers compute
+        (or load from cache_dir) the matrix of the estimated offset.
+        Returns: dict mapping orbit key -> list of study ids sharing it
+        """
+        loader = SPECTDataLoader()
+        cache = SystemMatrixCache(self.geometry.system_matrix(), cache_dir=self.cache_dir)
+        reconstructor = OSEMReconstructor(n_subsets=self.n_subsets, n_iterations=self.n_iterations,
+                                          matrix_cache=cache, geometry=self.geometry,
+                                          resolution_schedule=self.resolution_schedule,
+                                          subset_ordering=self.subset_ordering, subset_seed=self.subset_seed,
+                                          head_offsets_mm=self.head_offsets_mm)
+        groups = {}
+        for study in studies:
+            try:
+                orbit = loader.load_orbit_array(study.orbit)
+            except Exception:
+                # Reported as a failure by the worker that runs the study
+                continue
+            cor_offset_mm = study.cor_offset_mm
+            if cor_offset_mm is None:
+                if self.cor == 'auto':
+                    continue
+                cor_offset_mm = self.cor
+            reconstructor.cor_offset_mm = cor_offset_mm or 0.0
+            key = reconstructor.matrix_key(orbit['angle'], orbit['probe_idx'])
+            if key not in groups:
+                reconstructor.warm_matrices(orbit['angle'], orbit['probe_idx'])
+                groups[key] = []
+            groups[key].append(study.study_id)
+        return groups
+
+    def run(self, studies):
+        """
+        Run all studies and write summary.csv / summary.json to output_dir.
+        Returns: list of summary rows, in manifest order
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        groups = self.warm_matrix_cache(studies)
+        print(f"Batch: {len(studies)} studies, {len(groups)} distinct orbits, "
+              f"{self.n_workers} workers", flush=True)
+
+        kwargs = {
+            'n_subsets': self.n_subsets,
+            'n_iterations': self.n_iterations,
+            'fwhm_mm': self.fwhm_mm,
+            'pixel_size_mm': self.pixel_size_mm,
+            'cache_dir': self.cache_dir,
+            'checkpoint': self.checkpoint,
+            'output_format': self.output_format,
+            'geometry': self.geometry,
+            'resolution_schedule': self.resolution_schedule,
+            'support': self.support,
+            'subset_ordering': self.subset_ordering,
+            'subset_seed': self.subset_seed,
+            'head_offsets_mm': self.head_offsets_mm,
+            'energy_windows': self.energy_windows,
+            'events_path': self.events_path,
+            'cor': self.cor,
+            'qc': self.qc,
+        }
+
+        rows = {}
+        if self.n_workers == 1:
+            for study in studies:
+                rows[study.study_id] = run_study(study, self.output_dir, **kwargs)
+                self._report(rows[study.study_id], len(rows), len(studies))
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_workers) as pool:
+                futures = {
+                    pool.submit(run_study, study, self.output_dir, **kwargs): study
+                    for study in studies
+                }
+                for future in as_completed(futures):
+                    study = futures[future]
+                    try:
+                        row = future.result()
+                    except Exception as e:
+                        # Worker process died (e.g. out of memory)
+                        row = {'study_id': study.study_id, 'status': 'failed',
+                               'error': f"{type(e).__name__}: {e}"}
+                    rows[study.study_id] = row
+                    self._report(row, len(rows), len(studies))
+
+        ordered = [rows[study.study_id] for study in studies]
+        self.write_summary(ordered)
+        return ordered
+
+    @staticmethod
+    def _report(row, n_done, n_total):
+        print(f"[{n_done}/{n_total}] {row['study_id']}: {row['status']}", flush=True)
+
+    def write_summary(self, rows):
+        with open(os.path.join(self.output_dir, "summary.csv"), "w", newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k: row.get(k, '') for k in SUMMARY_FIELDS})
+        with open(os.path.join(self.output_dir, "summary.json"), "w") as f:
+            json.dump(rows, f, indent=2)
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+class ReconCheckpoint:
+    """
+    On-disk state of a slice-by-slice volume reconstruction.
+
+    checkpoint_dir layout:
+      volume.npy      memory-mapped output volume, completed slices filled in
+      progress.json   manifest: run key, completed slices, in-progress slice
+      slice_state.npy image of the in-progress slice after its last finished iteration
+
+    A run is only resumed if its key (inputs + parameters) matches the one
+    stored in the manifest; otherwise the checkpoint is started afresh.
+    """
+    MANIFEST = "progress.json"
+    VOLUME = "volume.npy"
+    SLICE_STATE = "slice_state.npy"
+
+    def __init__(self, checkpoint_dir, shape, run_key, dtype=np.float32):
+        self.checkpoint_dir = checkpoint_dir
+        self.shape = tuple(int(d) for d in shape)
+        self.run_key = run_key
+        self.dtype = np.dtype(dtype)
+        self.completed = set()
+        self.in_progress = None
+        self.volume = None
+
+    @staticmethod
+    def make_run_key(projection_data, angles_deg, **params):
+        """
+        Hash of the projection data, orbit and reconstruction parameters.
+        """
+        h = hashlib.sha1()
+        h.update(str(projection_data.shape).encode())
+        h.update(np.ascontiguousarray(projection_data).tobytes())
+        h.update(np.ascontiguousarray(angles_deg, dtype=np.float64).tobytes())
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def _path(self, name):
+        return os.path.join(self.checkpoint_dir, name)
+
+    def open(self):
+        """
+        Open (resume) or create the checkpoint.
+        Returns: memory-mapped volume of the checkpoint's shape
+        """
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        manifest = self._read_manifest()
+
+        if manifest is not None and manifest.get('run_key') == self.run_key \
+                and os.path.exists(self._path(self.VOLUME)):
+            self.volume = np.lib.format.open_memmap(self._path(self.VOLUME), mode='r+')
+            self.completed = set(manifest.get('completed_slices', []))
+            self.in_progress = manifest.get('in_progress')
+        else:
+            if manifest is not None:
+                print("Checkpoint belongs to a different run; starting afresh.", flush=True)
+            # Fortran order keeps each volume[:, :, z] slice contiguous on disk,
+            # so flushing a finished slice only writes that slice's pages
+            self.volume = np.lib.format.open_memmap(
+                self._path(self.VOLUME), mode='w+', dtype=self.dtype, shape=self.shape,
+                fortran_order=True)
+            self.completed = set()
+            self.in_progress = None
+            self._write_manifest()
+        return self.volume
+
+    def is_done(self, z):
+        return z in self.completed
+
+    def resume_state(self, z):
+        """
+        Returns: (next_iteration, image) for a partially reconstructed slice z,
+        or (0, None) if there is nothing to resume.
+        """
+        state = self.in_progress
+        if state is None or state.get('slice') != z or not os.path.exists(self._path(self.SLICE_STATE)):
+            return 0, None
+        return state['iteration'] + 1, np.load(self._path(self.SLICE_STATE))
+
+    def save_iteration(self, z, iteration, image):
+        """
+        Persist the image of slice z after finishing `iteration` (0-based).
+        """
+        tmp_path = self._path(f"{self.SLICE_STATE}.tmp.npy")
+        np.save(tmp_path, image)
+        os.replace(tmp_path, self._path(self.SLICE_STATE))
+        self.in_progress = {'slice': int(z), 'iteration': int(iteration)}
+        self._write_manifest()
+
+    def mark_slice_done(self, z):
+        # Data must hit the disk before the manifest claims the slice is done
+        self.volume.flush()
+        self.completed.add(int(z))
+        self.in_progress = None
+        self._write_manifest()
+
+    def _read_manifest(self):
+        if not os.path.exists(self._path(self.MANIFEST)):
+            return None
+        try:
+            with open(self._path(self.MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self):
+        manifest = {
+            'run_key': self.run_key,
+            'shape': list(self.shape),
+            'dtype': self.dtype.str,
+            'completed_slices': sorted(self.completed),
+            'in_progress': self.in_progress,
+        }
+        tmp_path = self._path(f"{self.MANIFEST}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._path(self.MANIFEST))
@@ -0,0 +1,138 @@
+import numpy as np
+
+
+def opposing_pairs(angles_deg, tolerance_deg=None):
+    """
+    Pairs of views acquired about 180 degrees apart.
+    tolerance_deg: largest accepted deviation from 180 degrees (default: half
+        the median angular step of the orbit)
+    Returns: (first, second) index arrays, each pair listed once
+    """
+    angles = np.mod(np.asarray(angles_deg, dtype=np.float64), 360.0)
+    if tolerance_deg is None:
+        steps = np.diff(np.unique(angles))
+        tolerance_deg = 0.5 * float(np.median(steps)) if len(steps) else 0.0
+    # Angular distance of every view from the opposite of every other view
+    deviation = np.abs(np.mod(angles[None, :] - angles[:, None], 360.0) - 180.0)
+    partner = np.argmin(deviation, axis=1)
+    first = np.arange(len(angles))
+    keep = (deviation[first, partner] <= tolerance_deg + 1e-9) & (first < partner)
+    return first[keep], partner[keep]
+
+
+METHODS = ('auto', 'xcorr', 'centroid')
+
+
+def estimate_cor(sinograms, angles_deg, detector_pixel_size_mm=None, method='auto', max_offset_bins=None,
+                 precision_bins=0.05, tolerance_deg=None):
+    """
+    Center of rotation of a study, as the offset of the projected rotation
+    axis from the detector center.
+    method:
+    'xcorr'    - a view at theta + 180 is the view at theta mirrored about the
+                 projected axis, so flipping it along u leaves the two views
+                 shifted by twice the axis' distance from the detector center.
+                 The shift is found by FFT cross-correlation of every opposing
+                 pair over all axial rows at once: the cross-power spectra are
+                 summed, so a single inverse FFT gives the correlation of the
+                 whole study, and the peak is refined to sub-bin precision
+                 with a parabola through its neighbours.
+    'centroid' - the count centroid of each view follows
+                 axis + a cos(theta) + b sin(theta); a linear least-squares
+                 fit over all views gives the axis. Works for orbits without
+                 opposing views (e.g. 180 degree acquisitions).
+    'auto'     - 'xcorr' when the orbit has opposing views, else 'centroid'
+    sinograms: (slice, angle, u) stack (see to_sinograms / SinogramPreprocessor)
+    angles_deg: orbit angle of each view
+    detector_pixel_size_mm: bin size, to also report the offset in mm
+    max_offset_bins: 'xcorr' search range (default: a quarter of the detector)
+    precision_bins: the offset is rounded to this step, so studies with the
+        same misalignment share system matrices (0 keeps the raw estimate)
+    tolerance_deg: see opposing_pairs
+    Returns: dict with 'offset_bins' (positive towards higher u bins),
+        'offset_mm' (None without detector_pixel_size_mm; the value for
+        OSEMReconstructor's cor_offset_mm), 'method' and 'n_pairs'
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown COR method '{method}', expected one of {METHODS}")
+    sinograms = np.asarray(sinograms)
+    if sinograms.ndim != 3:
+        raise ValueError(f"Expected a (slice, angle, u) sinogram stack, got shape {sinograms.shape}")
+    if sinograms.shape[1] != len(angles_deg):
+        raise ValueError(f"Sinograms have {sinograms.shape[1]} angles but orbit has {len(angles_deg)}")
+
+    first, second = opposing_pairs(angles_deg, tolerance_deg)
+    if method == 'auto':
+        method = 'xcorr' if len(first) else 'centroid'
+    if method == 'xcorr':
+        if not len(first):
+            raise ValueError("Orbit has no opposing views; use the 'centroid' method")
+        offset_bins = _xcorr_offset(sinograms, first, second, max_offset_bins)
+    else:
+        offset_bins = _centroid_offset(sinograms, angles_deg)
+
+    if precision_bins:
+        offset_bins = round(round(offset_bins / precision_bins) * precision_bins, 6)
+    offset_bins = float(offset_bins) or 0.0
+    return {
+        'offset_bins': offset_bins,
+        'offset_mm': None if detector_pixel_size_mm is None else offset_bins * detector_pixel_size_mm,
+        'method': method,
+        'n_pairs': int(len(first)),
+    }
+
+
+def _xcorr_offset(sinograms, first, second, max_offset_bins=None):
+    n_u = sinograms.shape[-1]
+    max_offset_bins = n_u / 4 if max_offset_bins is None else max_offset_bins
+    max_shift = min(int(np.ceil(2 * max_offset_bins)) + 1, n_u - 2)
+
+    # Zero padding to twice the detector keeps the correlation linear (no wrap-around)
+    n_fft = 2 * n_u
+    spectra = np.fft.rfft(sinograms[:, first, :], n_fft, axis=-1)
+    mirrored = np.fft.rfft(sinograms[:, second, ::-1], n_fft, axis=-1)
+    correlation = np.fft.irfft((np.conj(spectra) * mirrored).sum(axis=(0, 1)), n_fft)
+
+    # correlation[k]: mirrored views shifted by k bins (negative lags wrap to the end)
+    lags = np.arange(-max_shift, max_shift + 1)
+    values = correlation[lags % n_fft]
+    peak = int(np.argmax(values[1:-1])) + 1
+    below, centre, above = values[peak - 1:peak + 2]
+    curvature = below - 2 * centre + above
+    refinement = 0.5 * (below - above) / curvature if curvature < 0 else 0.0
+    return -(lags[peak] + refinement) / 2
+
+
+def centroid_sinusoid(views, angles_deg, probe_idx=None):
+    """
+    Least-squares fit of the count centroid of each view along u to
+    axis + a cos(theta) + b sin(theta), the path of the activity's center of
+    mass for a parallel-hole camera.
+    views: (angle, u) count profiles
+    probe_idx: head of each view; each head then gets its own axis term
+    Returns: (centroids, fitted, axes) - centroid and fitted path per view in
+        bins (NaN for views without counts) and the fitted axis of each head
+        (a single one without probe_idx)
+    """
+    views = np.asarray(views, dtype=np.float64)
+    counts = views.sum(axis=1)
+    valid = counts > 0
+    n_u = views.shape[1]
+    centroids = np.full(len(views), np.nan)
+    centroids[valid] = views[valid] @ np.arange(n_u) / counts[valid]
+    heads = np.zeros(len(views), dtype=np.intp) if probe_idx is None else \
+        np.unique(np.asarray(probe_idx), return_inverse=True)[1]
+    n_heads = heads.max() + 1
+    if valid.sum() < n_heads + 2:
+        raise ValueError("Too few views with counts to fit the centroid path")
+    theta = np.radians(np.asarray(angles_deg, dtype=np.float64))
+    design = np.column_stack([np.eye(n_heads)[heads], np.cos(theta), np.sin(theta)])
+    coefficients = np.linalg.lstsq(design[valid], centroids[valid], rcond=None)[0]
+    fitted = np.where(valid, design @ coefficients, np.nan)
+    return centroids, fitted, coefficients[:n_heads]
+
+
+def _centroid_offset(sinograms, angles_deg):
+    n_u = sinograms.shape[-1]
+    _, _, axes = centroid_sinusoid(sinograms.sum(axis=0, dtype=np.float64), angles_deg)
+    return axes[0] - (n_u - 1) / 2
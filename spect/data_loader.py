@@ -1,21 +1,50 @@
 import numpy as np
-import pandas as pd
 import os
+from .volume_format import VolumeFile, is_volume_file, write_volume
+from .geometry import ScanGeometry
+
+# Parsed orbit record: one row per acquisition angle
+ORBIT_DTYPE = np.dtype([
+    ('index', np.int64),
+    ('angle', np.float64),
+    ('radius', np.float64),
+    ('probe_idx', np.int64),
+])
+
+# Accepted spreadsheet headers for each orbit field (compared case-insensitively)
+ORBIT_COLUMN_ALIASES = {
+    'index': ('index', '采集角度索引'),
+    'angle': ('angle', '角度°', '角度'),
+    'radius': ('radius', '准直器前表面到旋转中心距离/mm'),
+    'probe_idx': ('probe_idx', '探头索引'),
+}
+
+ORBIT_CACHE_SUFFIX = ".orbit-cache.npz"
+ORBIT_CACHE_VERSION = 1
 
 class SPECTDataLoader:
-    def __init__(self):
-        self.proj_dim = (128, 128, 64)
-        self.recon_dim = (128, 128, 128)
+    def __init__(self, geometry=None):
+        """
+        geometry: ScanGeometry giving the expected raw projection / volume
+            dimensions (default: 128 x 128 detector, 64 angles, 128^3 volume)
+        """
+        self.geometry = geometry if geometry is not None else ScanGeometry()
+        self.proj_dim = self.geometry.proj_dim
+        self.recon_dim = self.geometry.recon_dim
         self.dtype = np.float32
 
     def load_projection(self, file_path):
         """
         Load projection data from binary file.
-        Expected size: 128 * 128 * 64 * 4 bytes
+        Expected size: prod(proj_dim) * 4 bytes (128 * 128 * 64 * 4 by default)
+        Chunked volume files (see save_volume_file) are detected by their magic;
+        the shape in their header must equal proj_dim (ValueError otherwise).
         Returns: numpy array of shape (128, 128, 64)
         """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
+        if is_volume_file(file_path):
+            return self._read_volume_file(file_path, self.proj_dim, "projection")
             
         try:
             data = np.fromfile(file_path, dtype=self.dtype)
@@ -23,7 +52,7 @@ class SPECTDataLoader:
             if data.size != expected_elements:
                 raise ValueError(f"File size mismatch. Expected {expected_elements} elements, got {data.size}")
             
-            # Reshape to (128, 128, 64)
+            # Reshape to proj_dim, (128, 128, 64) by default
             # Note: The report says "128*128*64", usually (u, v, angle)
             return data.reshape(self.proj_dim)
         except Exception as e:
@@ -34,25 +63,112 @@ class SPECTDataLoader:
         Load orbit data from Excel file.
         Returns: pandas DataFrame with standardized column names
         """
+        import pandas as pd
+        return pd.DataFrame(self.load_orbit_array(file_path))
+
+    def load_orbit_array(self, file_path, use_cache=True):
+        """
+        Load orbit data as a structured array (fields: index, angle, radius, probe_idx).
+        The parsed orbit is kept in a sidecar <file>.orbit-cache.npz keyed on the
+        Excel file's mtime and size; while it is valid, neither the Excel file is
+        parsed nor pandas/openpyxl imported.
+        Returns: numpy structured array of dtype ORBIT_DTYPE
+        """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
-            
+
+        stat = os.stat(file_path)
+        cache_path = file_path + ORBIT_CACHE_SUFFIX
+        if use_cache:
+            orbit = self._read_orbit_cache(cache_path, stat)
+            if orbit is not None:
+                return orbit
+
         try:
+            import pandas as pd
             df = pd.read_excel(file_path)
-            # Rename columns for easier access
-            df.columns = ['index', 'angle', 'radius', 'probe_idx']
-            return df
+            orbit = self._validate_orbit(df)
         except Exception as e:
             raise RuntimeError(f"Failed to load orbit data: {e}")
 
+        if use_cache:
+            self._write_orbit_cache(cache_path, stat, orbit)
+        return orbit
+
+    @staticmethod
+    def _validate_orbit(df):
+        """
+        Map spreadsheet columns to orbit fields by header and check their contents.
+        Returns: structured array of dtype ORBIT_DTYPE
+        """
+        headers = {str(col).strip().lower(): col for col in df.columns}
+        columns = {}
+        for field, aliases in ORBIT_COLUMN_ALIASES.items():
+            matches = [headers[a.lower()] for a in aliases if a.lower() in headers]
+            if not matches:
+                raise ValueError(f"Orbit column for '{field}' not found (columns: {list(df.columns)})")
+            columns[field] = matches[0]
+
+        if len(df) == 0:
+            raise ValueError("Orbit table is empty")
+
+        orbit = np.empty(len(df), dtype=ORBIT_DTYPE)
+        for field, col in columns.items():
+            values = np.asarray(df[col].values, dtype=np.float64)
+            if not np.all(np.isfinite(values)):
+                raise ValueError(f"Orbit column '{col}' has missing or non-numeric values")
+            if ORBIT_DTYPE[field].kind == 'i':
+                if not np.array_equal(values, np.round(values)):
+                    raise ValueError(f"Orbit column '{col}' must contain integers")
+                values = values.astype(np.int64)
+            orbit[field] = values
+
+        if not np.array_equal(np.sort(orbit['index']), np.arange(len(orbit))):
+            raise ValueError("Orbit indices must be 0..n-1 without gaps or duplicates")
+        if np.any(orbit['radius'] <= 0):
+            raise ValueError("Orbit radii must be positive")
+        return orbit
+
+    @staticmethod
+    def _read_orbit_cache(cache_path, stat):
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with np.load(cache_path) as cached:
+                if int(cached['version']) != ORBIT_CACHE_VERSION \
+                        or int(cached['source_mtime_ns']) != stat.st_mtime_ns \
+                        or int(cached['source_size']) != stat.st_size:
+                    return None
+                orbit = cached['orbit']
+        except Exception:
+            # Corrupt or unreadable cache: fall back to parsing the Excel file
+            return None
+        return orbit if orbit.dtype == ORBIT_DTYPE else None
+
+    @staticmethod
+    def _write_orbit_cache(cache_path, stat, orbit):
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+        try:
+            np.savez(tmp_path, orbit=orbit, version=ORBIT_CACHE_VERSION,
+                     source_mtime_ns=stat.st_mtime_ns, source_size=stat.st_size)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # Read-only data directory: caching is an optimisation only
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
     def load_volume(self, file_path):
         """
         Load reconstruction volume from binary file.
-        Expected size: 128 * 128 * 128 * 4 bytes
+        Expected size: prod(recon_dim) * 4 bytes (128 * 128 * 128 * 4 by default)
+        Chunked volume files (see save_volume_file) are detected by their magic;
+        the shape in their header must equal recon_dim (ValueError otherwise).
         Returns: numpy array of shape (128, 128, 128)
         """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
+        if is_volume_file(file_path):
+            return self._read_volume_file(file_path, self.recon_dim, "volume")
             
         try:
             data = np.fromfile(file_path, dtype=self.dtype)
@@ -64,6 +180,52 @@ class SPECTDataLoader:
         except Exception as e:
             raise RuntimeError(f"Failed to load volume data: {e}")
 
+    @staticmethod
+    def _read_volume_file(file_path, expected_shape, kind):
+        """
+        Read a chunked volume file, checking its header shape against the
+        loader's geometry first: a file written for another geometry would
+        otherwise be passed on with the wrong dimensions.
+        """
+        with VolumeFile(file_path) as vf:
+            if vf.shape != tuple(expected_shape):
+                raise ValueError(f"{file_path} holds a {kind} of shape {vf.shape}, "
+                                 f"geometry expects {tuple(expected_shape)}")
+            try:
+                return vf.read()
+            except Exception as e:
+                raise RuntimeError(f"Failed to load {kind} data: {e}")
+
+    def save_volume_file(self, file_path, volume, voxel_size_mm=3.3, orbit=None,
+                         provenance=None, chunk_depth=8, compression='zlib'):
+        """
+        Save a volume (or projection stack) as a self-describing chunked file.
+        The last axis is split into chunks of chunk_depth slices, each
+        compressed independently ('zlib' or 'none'); all-zero chunks take no space.
+        orbit: structured orbit array (see load_orbit_array) stored in the header
+        provenance: dict of free-form metadata stored in the header
+        """
+        write_volume(file_path, np.asarray(volume, dtype=self.dtype),
+                     chunk_depth=chunk_depth, compression=compression,
+                     voxel_size_mm=voxel_size_mm, orbit=orbit, provenance=provenance)
+
+    def open_volume_file(self, file_path):
+        """
+        Open a chunked volume file for random access (header, read_slice, read_slices).
+        Returns: VolumeFile (usable as a context manager)
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"File not found: {file_path}")
+        return VolumeFile(file_path)
+
+    def read_slice(self, file_path, index):
+        """
+        Read one slice of the last axis from a chunked volume file,
+        decoding only the chunk that holds it.
+        """
+        with self.open_volume_file(file_path) as vf:
+            return vf.read_slice(index)
+
 if __name__ == "__main__":
     # Basic self-test
     loader = SPECTDataLoader()
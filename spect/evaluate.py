@@ -1,7 +1,7 @@
 import numpy as np
-from skimage.metrics import structural_similarity as ssim
-from skimage.metrics import peak_signal_noise_ratio as psnr
-from scipy.ndimage import gaussian_filter
+
+# scikit-image and scipy.ndimage are imported inside the methods that use them,
+# so importing this module (e.g. to only compute RMSE) stays cheap.
 
 class Evaluator:
     @staticmethod
@@ -17,6 +17,8 @@ class Evaluator:
         Calculate Structural Similarity Index.
         img1, img2: 3D volumes
         """
+        from skimage.metrics import structural_similarity as ssim
+
         if data_range is None:
             data_range = max(img1.max(), img2.max()) - min(img1.min(), img2.min())
         
@@ -42,6 +44,8 @@ class Evaluator:
         Apply 3D Gaussian Filter.
         FWHM = 2.355 * sigma
         """
+        from scipy.ndimage import gaussian_filter
+
         sigma_mm = fwhm_mm / 2.355
         sigma_pixel = sigma_mm / pixel_size_mm
         
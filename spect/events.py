@@ -0,0 +1,97 @@
+import json
+import sys
+import threading
+import time
+
+
+class EventEmitter:
+    """
+    Progress events of a long-running computation.
+    Listeners are called with one dict per event: {'event': name,
+    'time': unix time, **fields}. Each listener can subscribe to a subset of
+    event names; producers check wants(name) before computing anything only
+    an event needs, so unobserved events cost nothing.
+    """
+    def __init__(self):
+        self._listeners = []
+
+    def subscribe(self, listener, events=None):
+        """
+        listener: callable(record)
+        events: event names to receive (default: all)
+        Returns: listener (for unsubscribe)
+        """
+        self._listeners.append((listener, None if events is None else frozenset(events)))
+        return listener
+
+    def unsubscribe(self, listener):
+        self._listeners = [(l, events) for l, events in self._listeners if l != listener]
+
+    def wants(self, event):
+        return any(events is None or event in events for _, events in self._listeners)
+
+    def emit(self, event, **fields):
+        if not self._listeners:
+            return
+        record = None
+        for listener, events in self._listeners:
+            if events is None or event in events:
+                if record is None:
+                    record = {'event': event, 'time': time.time(), **fields}
+                listener(record)
+
+
+class JsonLinesSink:
+    """
+    Listener writing each event as one JSON line, e.g. for a job scheduler
+    tailing the file. The file is opened in append mode, so several
+    processes can share it; static fields (e.g. study_id) are added to
+    every record.
+    """
+    def __init__(self, file_path, **static_fields):
+        self.file_path = file_path
+        self.static_fields = static_fields
+        self._file = open(file_path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps({**self.static_fields, **record}, default=float) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Events the console listener prints
+CONSOLE_EVENTS = ('volume_started', 'checkpoint_resumed', 'support_mask', 'slice_started', 'volume_finished')
+
+
+def console_listener(record, stream=None):
+    """
+    Human-readable progress lines for reconstruct_volume.
+    """
+    stream = stream or sys.stdout
+    event = record['event']
+    if event == 'volume_started':
+        message = f"Starting reconstruction of {record['n_slices']} slices..."
+    elif event == 'checkpoint_resumed':
+        message = f"Resuming from checkpoint: {record['n_done']}/{record['n_slices']} slices done"
+    elif event == 'support_mask':
+        message = f"Support mask: {record['coverage']:.1%} of the field of view"
+    elif event == 'slice_started':
+        if record['slice'] % 10:
+            return
+        message = f"Reconstructing slice {record['slice']}/{record['n_slices']}..."
+    elif event == 'volume_finished':
+        message = f"Reconstruction complete in {record['elapsed_s']:.2f} seconds."
+    else:
+        return
+    print(message, file=stream, flush=True)
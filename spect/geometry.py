@@ -0,0 +1,94 @@
+from .settings import SettingsMixin
+
+
+class ScanGeometry(SettingsMixin):
+    """
+    Acquisition and reconstruction geometry of a study.
+    Detector: n_bins (u) x n_rows (v) x n_angles, square bins of bin_size_mm.
+    Recon grid: recon_size x recon_size x n_slices, voxel_size_mm in-plane.
+
+    By default the recon grid matches the detector (recon_size = n_bins,
+    n_slices = n_rows) and covers the same field of view; a coarser or finer
+    grid (see with_recon_size) keeps the field of view and scales the voxel.
+    n_slices must divide n_rows; axial rows are then summed in groups.
+    """
+    def __init__(self, n_bins=128, n_rows=128, n_angles=64, bin_size_mm=3.3,
+                 recon_size=None, n_slices=None, voxel_size_mm=None):
+        self.n_bins = int(n_bins)
+        self.n_rows = int(n_rows)
+        self.n_angles = int(n_angles)
+        self.bin_size_mm = float(bin_size_mm)
+        self.recon_size = int(recon_size) if recon_size is not None else self.n_bins
+        self.n_slices = int(n_slices) if n_slices is not None else self.n_rows
+        if voxel_size_mm is None:
+            voxel_size_mm = self.bin_size_mm * self.n_bins / self.recon_size
+        self.voxel_size_mm = float(voxel_size_mm)
+
+        if min(self.n_bins, self.n_rows, self.n_angles, self.recon_size, self.n_slices) < 1:
+            raise ValueError("Geometry dimensions must be positive")
+        if self.n_rows % self.n_slices != 0:
+            raise ValueError(f"n_slices ({self.n_slices}) must divide n_rows ({self.n_rows})")
+
+    @classmethod
+    def from_projection_shape(cls, shape, bin_size_mm=3.3, **kwargs):
+        """
+        Geometry matching a (u, v, angle) projection array.
+        """
+        n_bins, n_rows, n_angles = shape
+        return cls(n_bins=n_bins, n_rows=n_rows, n_angles=n_angles, bin_size_mm=bin_size_mm, **kwargs)
+
+    @property
+    def proj_dim(self):
+        return (self.n_bins, self.n_rows, self.n_angles)
+
+    @property
+    def recon_dim(self):
+        return (self.recon_size, self.recon_size, self.n_slices)
+
+    @property
+    def axial_factor(self):
+        """
+        Number of detector rows summed into one recon slice.
+        """
+        return self.n_rows // self.n_slices
+
+    def with_recon_size(self, recon_size, n_slices=None):
+        """
+        Same detector, different recon grid covering the same field of view.
+        e.g. with_recon_size(64, 64) for a fast preview, with_recon_size(256) for high-res.
+        """
+        return ScanGeometry(self.n_bins, self.n_rows, self.n_angles, self.bin_size_mm,
+                            recon_size=recon_size,
+                            n_slices=n_slices if n_slices is not None else self.n_slices)
+
+    def system_matrix(self):
+        """
+        Returns: SystemMatrix projecting this recon grid onto this detector
+        """
+        from .system_matrix import SystemMatrix
+        return SystemMatrix(image_size=self.recon_size, detector_size=self.n_bins,
+                            pixel_size=self.voxel_size_mm, detector_pixel_size=self.bin_size_mm)
+
+    def bin_rows(self, projection_data):
+        """
+        Sum groups of axial_factor detector rows: (u, n_rows, angle) -> (u, n_slices, angle).
+        """
+        if self.axial_factor == 1:
+            return projection_data
+        u_dim, v_dim, n_angles = projection_data.shape
+        return projection_data.reshape(u_dim, self.n_slices, self.axial_factor, n_angles).sum(axis=2)
+
+    def to_dict(self):
+        return {
+            'n_bins': self.n_bins,
+            'n_rows': self.n_rows,
+            'n_angles': self.n_angles,
+            'bin_size_mm': self.bin_size_mm,
+            'recon_size': self.recon_size,
+            'n_slices': self.n_slices,
+            'voxel_size_mm': self.voxel_size_mm,
+        }
+
+    def __repr__(self):
+        return (f"ScanGeometry(detector={self.n_bins}x{self.n_rows}x{self.n_angles} @ {self.bin_size_mm}mm, "
+                f"recon={self.recon_size}^2x{self.n_slices} @ {self.voxel_size_mm:.4g}mm)")
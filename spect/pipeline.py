@@ -0,0 +1,406 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+from .data_loader import SPECTDataLoader
+from .reconstruction import OSEMReconstructor
+from .evaluate import Evaluator
+from .scatter import EnergyWindows
+from .preview_pack import PreviewPack
+from .sinogram import SinogramPreprocessor
+from .cor import estimate_cor
+from .qc import ProjectionQC
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """
+    SHA-256 of a file's contents.
+    """
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class StageCache:
+    """
+    Content-addressed store for stage outputs.
+    Each entry lives in cache_dir/<stage>/<key>/ with one .npy per array
+    output and a meta.json holding the remaining (JSON) outputs.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def make_key(stage, inputs):
+        """
+        Key of a stage run: hash of the stage name and its inputs
+        (parameters, input file digests and upstream stage keys).
+        """
+        payload = json.dumps({'stage': stage, 'inputs': inputs}, sort_keys=True, default=_to_json)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _entry_dir(self, stage, key):
+        return os.path.join(self.cache_dir, stage, key)
+
+    def load(self, stage, key):
+        """
+        Returns: dict of outputs, or None on a cache miss
+        """
+        entry_dir = self._entry_dir(stage, key)
+        meta_path = os.path.join(entry_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        outputs = dict(meta['values'])
+        for name in meta['arrays']:
+            outputs[name] = np.load(os.path.join(entry_dir, f"{name}.npy"))
+        return outputs
+
+    def save(self, stage, key, outputs):
+        entry_dir = self._entry_dir(stage, key)
+        tmp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        arrays = [name for name, value in outputs.items() if isinstance(value, np.ndarray)]
+        for name in arrays:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), outputs[name])
+        values = {name: value for name, value in outputs.items() if name not in arrays}
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump({'stage': stage, 'key': key, 'arrays': arrays, 'values': values},
+                      f, indent=2, default=_to_json)
+
+        # Publish atomically; if another process won the race keep its entry
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class Pipeline:
+    """
+    load -> [scatter] -> preprocess -> [qc] -> [cor] -> reconstruct -> filter -> preview, evaluate, with every stage cached on
+    disk under a hash of its inputs. Changing a downstream parameter (e.g.
+    fwhm_mm) reuses the cached upstream results, so only the stages whose
+    inputs changed are recomputed.
+    """
+    def __init__(self, cache_dir, n_subsets=4, n_iterations=10, fwhm_mm=10.0,
+                 pixel_size_mm=None, reconstructor=None, loader=None, geometry=None, energy_windows=None,
+                 preprocessor=None, cor=None, qc=None):
+        """
+        geometry: ScanGeometry for loader and reconstructor (taken from
+            reconstructor if that is given)
+        pixel_size_mm: voxel size used by the post-filter (default: geometry.voxel_size_mm)
+        energy_windows: EnergyWindows used for TEW scatter correction when a run
+            is given scatter window projections (default: Tc-99m windows)
+        preprocessor: SinogramPreprocessor turning the projections (and scatter
+            estimate) into the sinogram stack that is reconstructed, with its
+            detector corrections (default: none, layout conversion only)
+        cor: center of rotation of the studies: an offset in mm, 'auto' to
+            estimate it per study from the preprocessed sinograms
+            (spect.cor.estimate_cor, cached as the 'cor' stage) or None for the
+            reconstructor's cor_offset_mm
+        qc: ProjectionQC run on the preprocessed sinograms before reconstruction
+            (cached as the 'qc' stage); a strict one stops studies that fail
+        """
+        if isinstance(cor, str) and cor != 'auto':
+            raise ValueError(f"Unknown cor mode '{cor}', expected 'auto' or an offset in mm")
+        self.cache = StageCache(cache_dir)
+        if reconstructor is None:
+            reconstructor = OSEMReconstructor(n_subsets=n_subsets, n_iterations=n_iterations, geometry=geometry)
+        self.reconstructor = reconstructor
+        geometry = reconstructor.geometry or geometry
+        self.loader = loader or SPECTDataLoader(geometry)
+        self.fwhm_mm = fwhm_mm
+        self.energy_windows = energy_windows or EnergyWindows()
+        self.preprocessor = preprocessor or SinogramPreprocessor()
+        self.cor = cor
+        self.qc = qc
+        self.cor_offset_mm = reconstructor.cor_offset_mm if cor in (None, 'auto') else float(cor)
+        self.pixel_size_mm = pixel_size_mm if pixel_size_mm is not None else reconstructor.sm.pixel_size
+        # (stage, key, cache_hit) for every stage of the last run
+        self.stage_log = []
+
+    def _stage(self, stage, inputs, compute):
+        key = StageCache.make_key(stage, inputs)
+        outputs = self.cache.load(stage, key)
+        hit = outputs is not None
+        if not hit:
+            outputs = compute()
+            self.cache.save(stage, key, outputs)
+        self.stage_log.append((stage, key, hit))
+        return key, outputs
+
+    def run(self, projection_path, orbit_path, reference_path=None,
+            reference_filtered_path=None, checkpoint_dir=None, lower_path=None, upper_path=None,
+            cor_offset_mm=None):
+        """
+        Run (or reuse) every stage for one study.
+        lower_path, upper_path: projections of the scatter windows below and above
+            the photopeak; with both, the reconstruction is TEW scatter corrected
+        cor_offset_mm: center-of-rotation offset of this study (overrides the
+            pipeline's cor setting)
+        Returns: dict with 'recon', 'filtered', 'metrics', 'previews' ({'recon': PreviewPack,
+            'filtered': PreviewPack}), 'qc' (ProjectionQC report or None), 'cor_offset_mm'
+            (used by the projector) and 'keys' (stage -> key)
+        Raises ValueError, before reconstructing, if a strict QC fails.
+        """
+        self.stage_log = []
+        load_key, angles, probe_idx = self._run_load(projection_path, orbit_path)
+        scatter_key, scatter = self._run_scatter(lower_path, upper_path)
+        preprocess_key, sinograms, scatter = self._run_preprocess(load_key, scatter_key, scatter, projection_path)
+        qc_key, qc_report = self._run_qc(preprocess_key, angles, probe_idx, sinograms)
+        cor_key, cor_offset_mm = self._run_cor(preprocess_key, angles, sinograms, cor_offset_mm)
+        recon_key, recon = self._run_reconstruct(preprocess_key, angles, probe_idx, sinograms, scatter,
+                                                 checkpoint_dir, cor_offset_mm)
+        filter_key, filtered = self._run_filter(recon_key, recon)
+        preview_key, previews = self._run_preview(recon_key, filter_key, recon, filtered)
+        eval_key, metrics = self._run_evaluate(recon_key, filter_key, recon, filtered,
+                                               reference_path, reference_filtered_path)
+        return self._result(recon, filtered, metrics, previews, qc_report, cor_offset_mm,
+                            load_key, scatter_key, preprocess_key, qc_key, cor_key, recon_key, filter_key,
+                            preview_key, eval_key)
+
+    async def run_async(self, projection_path, orbit_path, reference_path=None,
+                        reference_filtered_path=None, checkpoint_dir=None, lower_path=None, upper_path=None,
+                        output_paths=None, cor_offset_mm=None):
+        """
+        run() with file I/O overlapped with computation: the reference volumes
+        are read while the reconstruction runs, the reconstruction is written
+        while it is filtered and the filtered volume while metrics are computed.
+        Stages run in executor threads, so the event loop stays free.
+        output_paths: optional {'recon': path, 'filtered': path} written as raw float32
+        Returns: same as run()
+        """
+        self.stage_log = []
+        output_paths = output_paths or {}
+        references = {path: asyncio.create_task(asyncio.to_thread(self.loader.load_volume, path))
+                      for path in (reference_path, reference_filtered_path) if path}
+        writes = []
+
+        def write(name, volume):
+            if output_paths.get(name):
+                writes.append(asyncio.create_task(asyncio.to_thread(volume.tofile, output_paths[name])))
+
+        try:
+            load_key, angles, probe_idx = await asyncio.to_thread(self._run_load, projection_path, orbit_path)
+            scatter_key, scatter = await asyncio.to_thread(self._run_scatter, lower_path, upper_path)
+            preprocess_key, sinograms, scatter = await asyncio.to_thread(self._run_preprocess, load_key, scatter_key,
+                                                                         scatter, projection_path)
+            qc_key, qc_report = await asyncio.to_thread(self._run_qc, preprocess_key, angles, probe_idx, sinograms)
+            cor_key, cor_offset_mm = await asyncio.to_thread(self._run_cor, preprocess_key, angles, sinograms,
+                                                             cor_offset_mm)
+            recon_key, recon = await asyncio.to_thread(self._run_reconstruct, preprocess_key, angles, probe_idx,
+                                                       sinograms, scatter, checkpoint_dir, cor_offset_mm)
+            write('recon', recon)
+            filter_key, filtered = await asyncio.to_thread(self._run_filter, recon_key, recon)
+            write('filtered', filtered)
+            preview_key, previews = await asyncio.to_thread(self._run_preview, recon_key, filter_key,
+                                                            recon, filtered)
+            loaded = dict(zip(references, await asyncio.gather(*references.values())))
+            eval_key, metrics = await asyncio.to_thread(self._run_evaluate, recon_key, filter_key, recon, filtered,
+                                                        reference_path, reference_filtered_path, loaded)
+            await asyncio.gather(*writes)
+        except BaseException:
+            for task in list(references.values()) + writes:
+                task.cancel()
+            raise
+        return self._result(recon, filtered, metrics, previews, qc_report, cor_offset_mm,
+                            load_key, scatter_key, preprocess_key, qc_key, cor_key, recon_key, filter_key,
+                            preview_key, eval_key)
+
+    def _run_load(self, projection_path, orbit_path):
+        # Load: only the digest and orbit are needed up front; the projection
+        # itself is read only if reconstruction has to run
+        def load():
+            orbit = self.loader.load_orbit_array(orbit_path)
+            return {'angles': orbit['angle'], 'probe_idx': orbit['probe_idx']}
+
+        load_key, loaded = self._stage('load', {
+            'projection_digest': file_digest(projection_path),
+            'orbit_digest': file_digest(orbit_path),
+            'fields': ['angles', 'probe_idx'],
+        }, load)
+        return load_key, loaded['angles'], loaded['probe_idx']
+
+    def _run_scatter(self, lower_path, upper_path):
+        if not (lower_path or upper_path):
+            return None, None
+        if not (lower_path and upper_path):
+            raise ValueError("TEW scatter correction needs both the lower and upper window projections")
+        scatter_key, scatter_out = self._stage('scatter', {
+            'lower_digest': file_digest(lower_path),
+            'upper_digest': file_digest(upper_path),
+            'energy_windows': self.energy_windows.to_dict(),
+        }, lambda: {'scatter': self.energy_windows.estimate(self.loader.load_projection(lower_path),
+                                                            self.loader.load_projection(upper_path))})
+        return scatter_key, scatter_out['scatter']
+
+    def _run_preprocess(self, load_key, scatter_key, scatter, projection_path):
+        # The projections (and scatter estimate) as one contiguous, corrected
+        # (slice, angle, u) sinogram stack
+        geometry = self.reconstructor.geometry
+
+        def preprocess():
+            outputs = {'sinograms': self.preprocessor.apply(self.loader.load_projection(projection_path), geometry)}
+            if scatter is not None:
+                outputs['scatter'] = self.preprocessor.apply(scatter, geometry)
+            return outputs
+
+        preprocess_key, preprocess_out = self._stage('preprocess', {
+            'load': load_key,
+            'scatter': scatter_key,
+            'preprocessor': self.preprocessor.key(),
+            'geometry': geometry.to_dict() if geometry else None,
+        }, preprocess)
+        return preprocess_key, preprocess_out['sinograms'], preprocess_out.get('scatter')
+
+    def _run_qc(self, preprocess_key, angles, probe_idx, sinograms):
+        if self.qc is None:
+            return None, None
+        settings = self.qc.to_dict()
+        settings.pop('strict')
+        qc_key, report = self._stage('qc', {
+            'preprocess': preprocess_key,
+            'angles': angles,
+            'probe_idx': probe_idx,
+            'qc': settings,
+        }, lambda: self.qc.check(sinograms, angles, probe_idx))
+        if self.qc.strict and not report['passed']:
+            raise ValueError("Projection QC failed: " + "; ".join(ProjectionQC.describe(report)))
+        return qc_key, report
+
+    def _run_cor(self, preprocess_key, angles, sinograms, cor_offset_mm=None):
+        # Center-of-rotation offset the projector uses for this study
+        if cor_offset_mm is not None:
+            return None, float(cor_offset_mm)
+        if self.cor != 'auto':
+            return None, self.cor_offset_mm
+        cor_key, cor_out = self._stage('cor', {
+            'preprocess': preprocess_key,
+            'angles': angles,
+        }, lambda: estimate_cor(sinograms, angles, detector_pixel_size_mm=self.reconstructor.sm.detector_pixel_size))
+        return cor_key, cor_out['offset_mm']
+
+    def _run_reconstruct(self, preprocess_key, angles, probe_idx, sinograms, scatter, checkpoint_dir, cor_offset_mm):
+        # The reconstructor is shared by the studies a pipeline runs (one at a time)
+        self.reconstructor.cor_offset_mm = cor_offset_mm
+        recon_key, recon_out = self._stage('reconstruct', {
+            'preprocess': preprocess_key,
+            'angles': angles,
+            'n_subsets': self.reconstructor.n_subsets,
+            'n_iterations': self.reconstructor.n_iterations,
+            'image_size': self.reconstructor.sm.image_size,
+            'detector_size': self.reconstructor.sm.detector_size,
+            'pixel_size': self.reconstructor.sm.pixel_size,
+            'detector_pixel_size': self.reconstructor.sm.detector_pixel_size,
+            'geometry': self.reconstructor.geometry.to_dict() if self.reconstructor.geometry else None,
+            'resolution_schedule': self.reconstructor.resolution_schedule,
+            'support': self.reconstructor.support_key(),
+            'subset_plan': self.reconstructor.subset_planner.key(),
+            'probe_idx': probe_idx,
+            'head_offsets_mm': self.reconstructor.head_offsets_mm,
+            'cor_offset_mm': cor_offset_mm,
+        }, lambda: {'volume': np.ascontiguousarray(self.reconstructor.reconstruct_sinograms(
+            sinograms, angles, checkpoint_dir=checkpoint_dir, probe_idx=probe_idx, scatter=scatter))})
+        if checkpoint_dir is not None:
+            shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        return recon_key, recon_out['volume']
+
+    def _run_filter(self, recon_key, recon):
+        filter_key, filter_out = self._stage('filter', {
+            'reconstruct': recon_key,
+            'fwhm_mm': self.fwhm_mm,
+            'pixel_size_mm': self.pixel_size_mm,
+        }, lambda: {'volume': Evaluator.apply_filter(recon, fwhm_mm=self.fwhm_mm, pixel_size_mm=self.pixel_size_mm)})
+        return filter_key, filter_out['volume']
+
+    def _run_preview(self, recon_key, filter_key, recon, filtered):
+        # Preview packs (MIPs, peak slices, thumbnails) of both volumes, built once
+        def preview():
+            outputs = {}
+            for name, volume in (('recon', recon), ('filtered', filtered)):
+                outputs.update({f"{name}_{k}": v for k, v in PreviewPack.from_volume(volume).to_arrays().items()})
+            return outputs
+
+        preview_key, preview_out = self._stage('preview', {
+            'reconstruct': recon_key,
+            'filter': filter_key,
+        }, preview)
+        return preview_key, {name: PreviewPack.from_arrays({k[len(name) + 1:]: v for k, v in preview_out.items()
+                                                            if k.startswith(f"{name}_")})
+                             for name in ('recon', 'filtered')}
+
+    def _run_evaluate(self, recon_key, filter_key, recon, filtered, reference_path, reference_filtered_path,
+                      references=None):
+        # references: volumes already read, by path (see run_async)
+        references = references or {}
+
+        def read(path):
+            volume = references.get(path)
+            return volume if volume is not None else self.loader.load_volume(path)
+
+        def evaluate():
+            metrics = {}
+            if reference_path:
+                ref_recon = read(reference_path)
+                metrics['rmse_recon'] = float(Evaluator.calculate_rmse(recon, ref_recon))
+                metrics['ssim_recon'] = float(Evaluator.calculate_ssim(recon, ref_recon))
+            if reference_filtered_path:
+                ref_filtered = read(reference_filtered_path)
+                metrics['rmse_filtered'] = float(Evaluator.calculate_rmse(filtered, ref_filtered))
+                metrics['ssim_filtered'] = float(Evaluator.calculate_ssim(filtered, ref_filtered))
+            return {'metrics': metrics}
+
+        eval_key, eval_out = self._stage('evaluate', {
+            'reconstruct': recon_key,
+            'filter': filter_key,
+            'reference_digest': file_digest(reference_path) if reference_path else None,
+            'reference_filtered_digest': file_digest(reference_filtered_path) if reference_filtered_path else None,
+        }, evaluate)
+        return eval_key, eval_out['metrics']
+
+    @staticmethod
+    def _result(recon, filtered, metrics, previews, qc_report, cor_offset_mm, load_key, scatter_key, preprocess_key,
+                qc_key, cor_key, recon_key, filter_key, preview_key, eval_key):
+        return {
+            'recon': recon,
+            'filtered': filtered,
+            'metrics': metrics,
+            'previews': previews,
+            'qc': qc_report,
+            'cor_offset_mm': cor_offset_mm,
+            'keys': {'load': load_key, 'scatter': scatter_key, 'preprocess': preprocess_key, 'qc': qc_key,
+                     'cor': cor_key, 'reconstruct': recon_key, 'filter': filter_key, 'preview': preview_key, 'evaluate': eval_key},
+        }
+
+    def parameters(self):
+        return {
+            'n_subsets': self.reconstructor.n_subsets,
+            'n_iterations': self.reconstructor.n_iterations,
+            'resolution_schedule': self.reconstructor.resolution_schedule,
+            'support': self.reconstructor.support_key(),
+            'subset_ordering': self.reconstructor.subset_planner.ordering,
+            'subset_seed': self.reconstructor.subset_planner.seed,
+            'energy_windows': self.energy_windows.to_dict(),
+            'preprocessor': self.preprocessor.key(),
+            'cor': self.cor if self.cor == 'auto' else self.cor_offset_mm,
+            'qc': None if self.qc is None else self.qc.to_dict(),
+            'fwhm_mm': self.fwhm_mm,
+            'pixel_size_mm': self.pixel_size_mm,
+        }
+
+    def close(self):
+        self.reconstructor.close()
@@ -0,0 +1,124 @@
+import numpy as np
+
+from .geometry import ScanGeometry
+from .reconstruction import OSEMReconstructor
+
+def bin_projection(projection_data, bin_factor=2, angle_step=1):
+    """
+    Downsample (u, v, angle) projections: sum bin_factor x bin_factor detector
+    pixels (counts are preserved) and keep every angle_step-th angle.
+    """
+    u_dim, v_dim, n_angles = projection_data.shape
+    if u_dim % bin_factor or v_dim % bin_factor:
+        raise ValueError(f"Detector {u_dim}x{v_dim} is not divisible by bin_factor {bin_factor}")
+    binned = projection_data[:, :, ::angle_step]
+    binned = binned.reshape(u_dim // bin_factor, bin_factor, v_dim // bin_factor, bin_factor, -1)
+    return binned.sum(axis=(1, 3), dtype=np.float32)
+
+
+def upsample_volume(volume, shape, scale=1.0):
+    """
+    Linearly interpolate a volume onto a finer grid covering the same extent,
+    multiplying by scale (the ratio of fine to coarse voxel content).
+    """
+    from scipy.ndimage import zoom
+
+    factors = [t / s for t, s in zip(shape, volume.shape)]
+    up = zoom(volume, factors, order=1, mode='nearest', grid_mode=True)
+    return (up * scale).astype(np.float32)
+
+
+class PreviewReconstructor:
+    """
+    Fast low-resolution reconstruction for a first look.
+    Projections are binned by bin_factor in u and v (and optionally thinned in
+    angle), reconstructed with the regular OSEMReconstructor on a grid
+    bin_factor times coarser with few subsets/iterations, and upsampled to the
+    full recon grid with count-consistent scaling. refine() continues with the
+    full-resolution reconstruction starting from the preview.
+    """
+    def __init__(self, geometry=None, bin_factor=2, angle_step=1, n_subsets=4, n_iterations=2):
+        self.geometry = geometry if geometry is not None else ScanGeometry()
+        self.bin_factor = bin_factor
+        self.angle_step = angle_step
+        g = self.geometry
+        if g.n_bins % bin_factor or g.n_rows % bin_factor or g.recon_size % bin_factor or g.n_slices % bin_factor:
+            raise ValueError(f"Geometry {g} is not divisible by bin_factor {bin_factor}")
+
+        # Binned detector; the coarse grid keeps the full grid's field of view
+        self.coarse_geometry = ScanGeometry(
+            n_bins=g.n_bins // bin_factor,
+            n_rows=g.n_rows // bin_factor,
+            n_angles=len(range(0, g.n_angles, angle_step)),
+            bin_size_mm=g.bin_size_mm * bin_factor,
+            recon_size=g.recon_size // bin_factor,
+            n_slices=g.n_slices // bin_factor,
+            voxel_size_mm=g.voxel_size_mm * bin_factor,
+        )
+        self.reconstructor = OSEMReconstructor(n_subsets=n_subsets, n_iterations=n_iterations,
+                                               geometry=self.coarse_geometry)
+
+    def voxel_scale(self):
+        """
+        Fine voxel content / coarse voxel content: in-plane area ratio times
+        the ratio of detector rows summed into one slice.
+        """
+        g, c = self.geometry, self.coarse_geometry
+        in_plane = (g.voxel_size_mm / c.voxel_size_mm) ** 2
+        axial = g.axial_factor / (c.axial_factor * self.bin_factor)
+        return in_plane * axial
+
+    def reconstruct(self, projection_data, orbit_angles, probe_idx=None):
+        """
+        probe_idx: head of each angle (see OSEMReconstructor.reconstruct_volume)
+        Returns: preview volume of shape geometry.recon_dim
+        """
+        orbit_angles = np.asarray(orbit_angles)
+        if probe_idx is not None:
+            probe_idx = np.asarray(probe_idx)[::self.angle_step]
+        binned = bin_projection(projection_data, self.bin_factor, self.angle_step)
+        coarse = self.reconstructor.reconstruct_volume(binned, orbit_angles[::self.angle_step], probe_idx=probe_idx)
+        return upsample_volume(coarse, self.geometry.recon_dim, self.voxel_scale())
+
+    @staticmethod
+    def refine(projection_data, orbit_angles, preview_volume, reconstructor, floor=1e-3, probe_idx=None):
+        """
+        Full reconstruction initialised from a preview volume.
+        OSEM updates are multiplicative, so voxels the preview set to zero would
+        stay zero; they are raised to floor * max first.
+        """
+        initial = np.maximum(preview_volume, floor * float(preview_volume.max()))
+        return reconstructor.reconstruct_volume(projection_data, orbit_angles, initial_volume=initial,
+                                                probe_idx=probe_idx)
+
+
+if __name__ == "__main__":
+    import argparse
+    import os
+    import time
+    from .data_loader import SPECTDataLoader
+
+    parser = argparse.ArgumentParser(description="Fast low-resolution preview reconstruction")
+    parser.add_argument("projection")
+    parser.add_argument("orbit")
+    parser.add_argument("output", help="Output .dat (raw float32) or .svol path")
+    parser.add_argument("--bin-factor", type=int, default=2)
+    parser.add_argument("--angle-step", type=int, default=1)
+    parser.add_argument("--n-subsets", type=int, default=4)
+    parser.add_argument("--n-iterations", type=int, default=2)
+    args = parser.parse_args()
+
+    loader = SPECTDataLoader()
+    proj = loader.load_projection(args.projection)
+    orbit = loader.load_orbit_array(args.orbit)
+    start_time = time.time()
+    preview = PreviewReconstructor(loader.geometry, args.bin_factor, args.angle_step,
+                                   args.n_subsets, args.n_iterations).reconstruct(proj, orbit['angle'],
+                                                                                  orbit['probe_idx'])
+    print(f"Preview ready in {time.time() - start_time:.2f} seconds.")
+    if os.path.splitext(args.output)[1] == ".svol":
+        loader.save_volume_file(args.output, preview, voxel_size_mm=loader.geometry.voxel_size_mm,
+                                provenance={'preview': vars(args)})
+    else:
+        preview.tofile(args.output)
+    print(f"Saved preview to {args.output}")
@@ -0,0 +1,124 @@
+import os
+import numpy as np
+
+AXES = ('x', 'y', 'z')
+# Peak slice across each axis, by its display name
+VIEWS = {'sagittal': 0, 'coronal': 1, 'axial': 2}
+
+
+def _thumbnail(image, size):
+    """
+    Block-average an image so its longer side is at most size pixels.
+    """
+    factor = max(1, int(np.ceil(max(image.shape) / size)))
+    if factor == 1:
+        return image.astype(np.float32)
+    h, w = (image.shape[0] // factor) * factor, (image.shape[1] // factor) * factor
+    blocks = image[:h, :w].reshape(h // factor, factor, w // factor, factor)
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+
+class PreviewPack:
+    """
+    Precomputed views of an (x, y, z) volume for viewers and reports:
+    - mips[a]: maximum-intensity projection along axis a
+    - slice_max[a]: maximum of every slice across axis a
+    - peak_index[a]: the slice across axis a with the highest maximum
+      (argmax of slice_max[a])
+    - peak_slices / thumbnails: the sagittal, coronal and axial slices at the
+      peak indices, at full resolution and block-averaged to thumbnail_size
+    Built in a single pass over z-slabs of the volume (memory-mapped volumes
+    are read once) and stored as one compressed .npz.
+    """
+    def __init__(self, mips, slice_max, peak_slices, thumbnails, stats):
+        self.mips = mips
+        self.slice_max = slice_max
+        self.peak_slices = peak_slices
+        self.thumbnails = thumbnails
+        self.stats = stats
+
+    @property
+    def peak_index(self):
+        return tuple(int(np.argmax(m)) for m in self.slice_max)
+
+    @classmethod
+    def from_volume(cls, volume, thumbnail_size=64, slab=16):
+        """
+        volume: (x, y, z) array (or memmap)
+        slab: z-slices reduced at a time
+        """
+        n_x, n_y, n_z = volume.shape
+        mip_z = np.full((n_x, n_y), -np.inf, dtype=np.float32)
+        mip_x = np.empty((n_y, n_z), dtype=np.float32)
+        mip_y = np.empty((n_x, n_z), dtype=np.float32)
+        total = 0.0
+        v_min = np.inf
+        for start in range(0, n_z, slab):
+            block = np.asarray(volume[:, :, start:start + slab], dtype=np.float32)
+            np.maximum(mip_z, block.max(axis=2), out=mip_z)
+            mip_x[:, start:start + slab] = block.max(axis=0)
+            mip_y[:, start:start + slab] = block.max(axis=1)
+            total += float(block.sum(dtype=np.float64))
+            v_min = min(v_min, float(block.min()))
+
+        # Slice maxima follow from the MIPs without touching the volume again
+        slice_max = [mip_y.max(axis=1), mip_x.max(axis=1), mip_x.max(axis=0)]
+        peak = [int(np.argmax(m)) for m in slice_max]
+        peak_slices = {
+            'sagittal': np.array(volume[peak[0], :, :], dtype=np.float32),
+            'coronal': np.array(volume[:, peak[1], :], dtype=np.float32),
+            'axial': np.array(volume[:, :, peak[2]], dtype=np.float32),
+        }
+        thumbnails = {view: _thumbnail(image, thumbnail_size) for view, image in peak_slices.items()}
+        stats = {'shape': [n_x, n_y, n_z], 'max': float(mip_z.max()), 'min': v_min, 'sum': total}
+        return cls([mip_x, mip_y, mip_z], slice_max, peak_slices, thumbnails, stats)
+
+    def slice_at_peak(self, view):
+        """
+        Full-resolution 'sagittal', 'coronal' or 'axial' slice at the peak index.
+        """
+        return self.peak_slices[view]
+
+    def to_arrays(self):
+        """
+        Flat name -> array dict (for .npz files and stage caches).
+        """
+        arrays = {}
+        for a, axis in enumerate(AXES):
+            arrays[f"mip_{axis}"] = self.mips[a]
+            arrays[f"slice_max_{axis}"] = self.slice_max[a]
+        for view in VIEWS:
+            arrays[f"slice_{view}"] = self.peak_slices[view]
+            arrays[f"thumb_{view}"] = self.thumbnails[view]
+        arrays['stats'] = np.array([*self.stats['shape'], self.stats['max'], self.stats['min'], self.stats['sum']],
+                                   dtype=np.float64)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        stats = arrays['stats']
+        return cls(
+            [np.asarray(arrays[f"mip_{axis}"]) for axis in AXES],
+            [np.asarray(arrays[f"slice_max_{axis}"]) for axis in AXES],
+            {view: np.asarray(arrays[f"slice_{view}"]) for view in VIEWS},
+            {view: np.asarray(arrays[f"thumb_{view}"]) for view in VIEWS},
+            {'shape': [int(n) for n in stats[:3]], 'max': float(stats[3]), 'min': float(stats[4]),
+             'sum': float(stats[5])},
+        )
+
+    def save(self, file_path):
+        with open(file_path, "wb") as f:
+            np.savez_compressed(f, **self.to_arrays())
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path) as arrays:
+            return cls.from_arrays(dict(arrays))
+
+
+def preview_path(volume_path):
+    """
+    Preview pack stored next to a volume: MyRecon.dat -> MyRecon.preview.npz
+    """
+    base, _ = os.path.splitext(volume_path)
+    return f"{base}.preview.npz"
@@ -0,0 +1,209 @@
+import numpy as np
+
+from .cor import centroid_sinusoid
+from .settings import SettingsMixin
+
+# Per-angle lists of flagged views in a QC report, with their descriptions
+CHECKS = {
+    'missing_frames': "missing or empty frames",
+    'count_jumps': "count jumps between neighbouring views",
+    'axial_motion': "axial centroid shifts",
+    'lateral_motion': "transaxial centroid off its sinusoid",
+    'discontinuities': "views inconsistent with their angular neighbour",
+}
+
+
+class ProjectionQC(SettingsMixin):
+    """
+    Pre-reconstruction checks of a study's projections for missing frames
+    and patient motion. Each check is one or two passes over the whole
+    (slice, angle, u) sinogram stack, so a 128 x 64 x 128 study is checked
+    in milliseconds:
+    - counts: total counts per view. For parallel projections they are
+      (apart from attenuation and decay) the same for every angle, so views
+      below missing_fraction x the median are missing frames, and two views
+      next to each other in angle whose counts differ by more than count_jump
+      (relative) are both flagged as a count jump.
+    - axial centroid: count-weighted mean sinogram row of each view; a patient
+      moving along the axis shifts it. Views further than axial_shift_rows
+      from the median are flagged.
+    - transaxial centroid: follows axis + a cos(theta) + b sin(theta) (per
+      head with probe_idx, see spect.cor.centroid_sinusoid); in-plane motion
+      leaves views more than lateral_residual_bins off the fitted path.
+    - neighbour consistency: 1 - correlation of each view with the next view
+      in angle; a view pair whose dissimilarity exceeds discontinuity_factor x
+      the median (and min_dissimilarity) marks a sudden change, e.g. motion
+      or a frame acquired out of order.
+    With strict=True a Pipeline refuses to reconstruct studies that fail.
+    """
+    def __init__(self, missing_fraction=0.5, count_jump=0.15, axial_shift_rows=1.0,
+                 lateral_residual_bins=1.0, discontinuity_factor=4.0, min_dissimilarity=0.02, strict=True):
+        self.missing_fraction = float(missing_fraction)
+        self.count_jump = float(count_jump)
+        self.axial_shift_rows = float(axial_shift_rows)
+        self.lateral_residual_bins = float(lateral_residual_bins)
+        self.discontinuity_factor = float(discontinuity_factor)
+        self.min_dissimilarity = float(min_dissimilarity)
+        self.strict = bool(strict)
+
+    def check(self, sinograms, angles_deg, probe_idx=None):
+        """
+        sinograms: (slice, angle, u) stack (see to_sinograms / SinogramPreprocessor)
+        angles_deg: orbit angle of each view
+        probe_idx: head of each view (optional)
+        Returns: report dict with
+            'passed': no view flagged by any check
+            per view: 'counts', 'axial_centroid', 'lateral_centroid',
+                'lateral_residual', 'dissimilarity' (to the next view in angle,
+                NaN for the last one) as arrays
+            flagged view indices: one list per CHECKS entry
+            summary: 'count_cv', 'max_axial_shift', 'lateral_rms', 'median_dissimilarity'
+        """
+        sinograms = np.asarray(sinograms)
+        if sinograms.ndim != 3:
+            raise ValueError(f"Expected a (slice, angle, u) sinogram stack, got shape {sinograms.shape}")
+        n_slices, n_angles, n_u = sinograms.shape
+        if n_angles != len(angles_deg):
+            raise ValueError(f"Sinograms have {n_angles} angles but orbit has {len(angles_deg)}")
+        angles = np.mod(np.asarray(angles_deg, dtype=np.float64), 360.0)
+
+        # Pass 1: axial (slice, angle) and transaxial (angle, u) profiles
+        axial = sinograms.sum(axis=2, dtype=np.float64)
+        lateral = sinograms.sum(axis=0, dtype=np.float64)
+        counts = lateral.sum(axis=1)
+
+        median_counts = np.median(counts)
+        missing = counts <= self.missing_fraction * median_counts
+        present = ~missing
+
+        # Angular neighbours: views sorted by angle, wrapping around full orbits
+        order = np.argsort(angles)
+        gaps = np.diff(angles[order], append=angles[order[0]] + 360.0)
+        step = np.median(gaps)
+        adjacent = gaps <= 1.5 * step
+        following = np.where(adjacent, np.roll(order, -1), -1)
+        next_view = np.full(n_angles, -1)
+        next_view[order] = following
+        # Views with a present neighbour next in angle
+        pairs = np.nonzero((next_view >= 0) & present)[0]
+        pairs = pairs[present[next_view[pairs]]]
+        partner = next_view[pairs]
+
+        # Count jumps between neighbours (both views of a jump are flagged)
+        count_jumps = np.zeros(n_angles, dtype=bool)
+        jumps = np.abs(counts[partner] / counts[pairs] - 1) > self.count_jump
+        count_jumps[pairs[jumps]] = count_jumps[partner[jumps]] = True
+
+        # Axial centroid
+        axial_centroid = np.full(n_angles, np.nan)
+        axial_centroid[present] = np.arange(n_slices) @ axial[:, present] / counts[present]
+        axial_shift = axial_centroid - np.nanmedian(axial_centroid) if present.any() else axial_centroid
+        with np.errstate(invalid='ignore'):
+            axial_motion = np.abs(axial_shift) > self.axial_shift_rows
+
+        # Transaxial centroid against its sinusoid
+        lateral_centroid = np.full(n_angles, np.nan)
+        lateral_residual = np.full(n_angles, np.nan)
+        if present.sum() >= 4:
+            lateral_centroid, fitted, _ = centroid_sinusoid(np.where(present[:, None], lateral, 0), angles,
+                                                            probe_idx)
+            lateral_residual = lateral_centroid - fitted
+        with np.errstate(invalid='ignore'):
+            lateral_motion = np.abs(lateral_residual) > self.lateral_residual_bins
+
+        # Pass 2: correlation of each view with the next one in angle
+        views = sinograms.transpose(1, 0, 2).reshape(n_angles, -1).astype(np.float64)
+        views -= views.mean(axis=1, keepdims=True)
+        norms = np.sqrt(np.einsum('ij,ij->i', views, views))
+        dissimilarity = np.full(n_angles, np.nan)
+        denominator = norms[pairs] * norms[partner]
+        dissimilarity[pairs] = 1 - np.einsum('ij,ij->i', views[pairs], views[partner]) / \
+            np.where(denominator > 0, denominator, 1)
+        median_dissimilarity = float(np.median(dissimilarity[pairs])) if len(pairs) else 0.0
+        threshold = max(self.discontinuity_factor * median_dissimilarity, self.min_dissimilarity)
+        discontinuous = np.zeros(n_angles, dtype=bool)
+        jumps = dissimilarity[pairs] > threshold
+        discontinuous[pairs[jumps]] = discontinuous[partner[jumps]] = True
+
+        flagged = {
+            'missing_frames': missing,
+            'count_jumps': count_jumps,
+            'axial_motion': axial_motion,
+            'lateral_motion': lateral_motion,
+            'discontinuities': discontinuous,
+        }
+        report = {name: np.nonzero(mask)[0].tolist() for name, mask in flagged.items()}
+        report.update({
+            'passed': not any(mask.any() for mask in flagged.values()),
+            'counts': counts,
+            'axial_centroid': axial_centroid,
+            'lateral_centroid': lateral_centroid,
+            'lateral_residual': lateral_residual,
+            'dissimilarity': dissimilarity,
+            'count_cv': float(counts[present].std() / counts[present].mean()) if present.any() else 0.0,
+            'max_axial_shift': float(np.nanmax(np.abs(axial_shift))) if present.any() else 0.0,
+            'lateral_rms': float(np.sqrt(np.nanmean(lateral_residual ** 2)))
+            if np.isfinite(lateral_residual).any() else 0.0,
+            'median_dissimilarity': median_dissimilarity,
+        })
+        return report
+
+    @staticmethod
+    def describe(report):
+        """
+        One line per failed check, e.g. "missing or empty frames: views [12, 13]".
+        """
+        return [f"{description}: views {report[name]}" for name, description in CHECKS.items() if report[name]]
+
+    @staticmethod
+    def summary(report):
+        """
+        JSON-friendly part of a report: the flags and summary values, without
+        the per-view arrays.
+        """
+        return {name: value for name, value in report.items() if not isinstance(value, np.ndarray)}
+
+    def to_dict(self):
+        return {
+            'missing_fraction': self.missing_fraction,
+            'count_jump': self.count_jump,
+            'axial_shift_rows': self.axial_shift_rows,
+            'lateral_residual_bins': self.lateral_residual_bins,
+            'discontinuity_factor': self.discontinuity_factor,
+            'min_dissimilarity': self.min_dissimilarity,
+            'strict': self.strict,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import os
+    import sys
+    import time
+
+    from .data_loader import SPECTDataLoader
+    from .sinogram import to_sinograms
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Check projections for missing frames and patient motion")
+    parser.add_argument("--projection", default=os.path.join(base_dir, "data", "input", "Proj.dat"))
+    parser.add_argument("--orbit", default=os.path.join(base_dir, "data", "input", "orbit.xlsx"))
+    parser.add_argument("--json", help="also write the report summary to this file")
+    args = parser.parse_args()
+
+    loader = SPECTDataLoader()
+    orbit = loader.load_orbit_array(args.orbit)
+    sinograms = to_sinograms(loader.load_projection(args.projection))
+    start = time.perf_counter()
+    report = ProjectionQC().check(sinograms, orbit['angle'], orbit['probe_idx'])
+    elapsed = time.perf_counter() - start
+    print(f"QC {'passed' if report['passed'] else 'FAILED'} in {elapsed * 1000:.1f} ms "
+          f"(count CV {report['count_cv']:.3f}, max axial shift {report['max_axial_shift']:.2f} rows, "
+          f"transaxial RMS {report['lateral_rms']:.2f} bins)")
+    for line in ProjectionQC.describe(report):
+        print(f"  {line}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(ProjectionQC.summary(report), f, indent=2)
+    sys.exit(0 if report['passed'] else 1)
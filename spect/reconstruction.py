@@ -1,65 +1,397 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from .system_matrix import SystemMatrix
+from .system_matrix import LRUCache, SystemMatrix, SystemMatrixCache, csr_row_block
+from .checkpoint import ReconCheckpoint
+from .subsets import SubsetPlanner
+from .events import CONSOLE_EVENTS, EventEmitter, console_listener
+from .sinogram import to_sinograms
 import time
 
+def _resample_image(image, size):
+    """
+    Linearly interpolate a square image onto a size x size grid covering the
+    same extent, rescaled so the total counts are unchanged.
+    """
+    from scipy.ndimage import zoom
+
+    factor = size / image.shape[0]
+    resampled = zoom(image, factor, order=1, mode='nearest', grid_mode=True)
+    return (resampled / factor ** 2).astype(np.float32)
+
+
 class OSEMReconstructor:
-    def __init__(self, n_subsets=8, n_iterations=4):
+    SUPPORTS = ('fov', 'body')
+
+    def __init__(self, n_subsets=8, n_iterations=4, matrix_cache=None, geometry=None,
+                 resolution_schedule=None, support=None, support_threshold=0.05, support_margin=3,
+                 subset_ordering='sequential', subset_seed=None, head_offsets_mm=None, head_workers=1,
+                 cor_offset_mm=0.0, max_subset_systems=4, verbose=True):
+        """
+        geometry: ScanGeometry describing detector and recon grid. Without it the
+            recon grid is the default 128 x 128 SystemMatrix (or matrix_cache's)
+            and every detector row becomes one slice.
+        matrix_cache: SystemMatrixCache to share matrices; built for geometry if omitted
+        resolution_schedule: coarse-to-fine levels [(image_size, n_iterations), ...]
+            run before the full grid, e.g. [(32, 2), (64, 3)]. Their iterations
+            count towards n_iterations; the remaining ones run on the full grid.
+        support: restrict full-grid updates to a support mask, dropping the other
+            pixels (columns) from the projector:
+            'fov'  - pixels seen from every angle (the inscribed field of view)
+            'body' - a quick reconstruction of all slices summed, thresholded at
+                     support_threshold * max and dilated by support_margin pixels
+            or a boolean (image_size, image_size) array.
+            Pixels outside the mask are 0 in the result.
+        subset_ordering: order the subsets are visited in ('sequential',
+            'bit_reversal', 'max_separation' or 'random', redrawn every iteration from subset_seed),
+            see SubsetPlanner
+        head_offsets_mm: {probe_idx: lateral detector offset in mm} for multi-head
+            systems (e.g. each head's center-of-rotation offset); applied to the
+            angles acquired by that head when probe_idx is passed
+        cor_offset_mm: lateral position of the projected rotation axis relative
+            to the detector center, in mm (positive towards higher u bins), for
+            every angle; see spect.cor.estimate_cor
+        max_subset_systems: subset systems (subset matrices and sensitivity
+            images of one orbit, matrix and support) kept in memory; the least
+            recently used is dropped, so a reconstructor serving many studies
+            with per-study supports stays bounded (at least one per
+            resolution level is kept, as every slice visits all levels); the
+            cached 'fov' masks share the bound. The matrices themselves are
+            bounded by matrix_cache's max_matrices.
+        head_workers: with probe_idx, project each head's block of a subset in
+            its own thread (sparse products release the GIL)
+        verbose: print progress to stdout. Progress is published as events on
+            self.events (see reconstruct_volume); verbose subscribes a console listener.
+        """
         self.n_subsets = n_subsets
         self.n_iterations = n_iterations
-        self.sm = SystemMatrix()
+        self.subset_planner = SubsetPlanner(n_subsets, subset_ordering, subset_seed)
+        self.geometry = geometry
+        if matrix_cache is None:
+            sm = geometry.system_matrix() if geometry is not None else SystemMatrix()
+            matrix_cache = SystemMatrixCache(sm)
+        self.matrix_cache = matrix_cache
+        self.sm = matrix_cache.sm
+
+        self.resolution_schedule = [(int(size), int(n)) for size, n in (resolution_schedule or [])]
+        for size, n in self.resolution_schedule:
+            if not 0 < size < self.sm.image_size or n < 1:
+                raise ValueError(f"Invalid resolution level ({size}, {n}) for a {self.sm.image_size} grid")
+        if self.coarse_iterations >= n_iterations:
+            raise ValueError(f"Resolution schedule uses {self.coarse_iterations} of {n_iterations} iterations; "
+                             "at least one must run on the full grid")
+        if isinstance(support, str) and support not in self.SUPPORTS:
+            raise ValueError(f"Unknown support '{support}', expected one of {self.SUPPORTS} or a mask array")
+        if isinstance(support, np.ndarray) and support.shape != (self.sm.image_size, self.sm.image_size):
+            raise ValueError(f"Support mask shape {support.shape} does not match the "
+                             f"{self.sm.image_size} x {self.sm.image_size} grid")
+        self.support = support
+        self.support_threshold = support_threshold
+        self.support_margin = support_margin
+        self.head_offsets_mm = {int(p): float(v) for p, v in (head_offsets_mm or {}).items()}
+        self.cor_offset_mm = float(cor_offset_mm)
+        self.head_workers = head_workers
+        self._head_pool = None
+        self.events = EventEmitter()
+        if verbose:
+            self.events.subscribe(console_listener, CONSOLE_EVENTS)
+
+        # image_size -> SystemMatrixCache for the coarse levels
+        self._level_caches = {}
+        # (geometry key, subset plan, support digest) -> subset matrices and sensitivities
+        self._subset_systems = LRUCache(max(max_subset_systems, len(self.resolution_schedule) + 1))
+        # geometry key -> 'fov' support mask
+        self._fov_masks = LRUCache(self._subset_systems.maxsize)
+
+    @property
+    def coarse_iterations(self):
+        return sum(n for _, n in self.resolution_schedule)
+
+    def level_cache(self, size):
+        """
+        Matrix cache for a coarse level: same detector and field of view, size x size grid.
+        """
+        cache = self._level_caches.get(size)
+        if cache is None:
+            sm = SystemMatrix(image_size=size, detector_size=self.sm.detector_size,
+                              pixel_size=self.sm.pixel_size * self.sm.image_size / size,
+                              detector_pixel_size=self.sm.detector_pixel_size)
+            cache = SystemMatrixCache(sm, cache_dir=self.matrix_cache.cache_dir,
+                                      max_matrices=self.matrix_cache.max_matrices)
+            self._level_caches[size] = cache
+        return cache
+
+    def _matrix_layout(self, angles_deg, probe_idx=None):
+        """
+        Row block order and per-angle detector shifts of the matrices for an orbit.
+        Returns: (angle_order, bin_shift_mm or None)
+        """
+        angle_order = self.subset_planner.angle_order(len(angles_deg), probe_idx)
+        if not self.head_offsets_mm and not self.cor_offset_mm:
+            return angle_order, None
+        bin_shift = np.full(len(angles_deg), -self.cor_offset_mm)
+        if self.head_offsets_mm:
+            if probe_idx is None:
+                raise ValueError("head_offsets_mm needs the orbit's probe_idx")
+            bin_shift += [self.head_offsets_mm.get(int(p), 0.0) for p in probe_idx]
+        return angle_order, bin_shift
+
+    def matrix_key(self, angles_deg, probe_idx=None):
+        """
+        Key of the full-grid system matrix used for this orbit.
+        """
+        return self.sm.geometry_key(angles_deg, *self._matrix_layout(angles_deg, probe_idx))
+
+    def warm_matrices(self, angles_deg, probe_idx=None):
+        """
+        Compute (or load) every system matrix a reconstruction with this orbit
+        needs: the full grid and each coarse level, rows in subset order.
+        """
+        layout = self._matrix_layout(angles_deg, probe_idx)
+        self.matrix_cache.get(angles_deg, *layout)
+        for size, _ in self.resolution_schedule:
+            self.level_cache(size).get(angles_deg, *layout)
+
+    def support_key(self):
+        """
+        JSON-friendly identifier of the support setting (for cache and checkpoint keys).
+        """
+        if isinstance(self.support, np.ndarray):
+            return hashlib.sha1(np.packbits(self.support.astype(bool)).tobytes()).hexdigest()
+        if self.support is None:
+            return None
+        return f"{self.support}:{self.support_threshold}:{self.support_margin}"
+
+    def support_mask(self, projection_data, orbit_angles, probe_idx=None, scatter=None):
+        """
+        Support mask for a volume, shared by all of its slices.
+        projection_data: (u, slice, angle), already binned to the recon slices
+        scatter: scatter estimate binned like projection_data, or None
+        Returns: boolean (image_size, image_size) array, or None without support
+        """
+        if self.support is None:
+            return None
+        summed = projection_data.sum(axis=1).T
+        additive = None if scatter is None else scatter.sum(axis=1).T
+        return self._support_mask(summed, additive, orbit_angles, probe_idx)
+
+    def _support_mask(self, summed, additive, orbit_angles, probe_idx):
+        """
+        summed, additive: (angle, u) axial sums of the sinograms and of the scatter estimate
+        """
+        if self.support is None:
+            return None
+        if isinstance(self.support, np.ndarray):
+            return self.support.astype(bool)
+
+        n_x = self.sm.image_size
+        n_angles, n_bins = summed.shape
+        if self.support == 'fov':
+            # Depends only on the orbit: count the distinct angles (row blocks,
+            # in whatever order) that see each pixel
+            layout = self._matrix_layout(orbit_angles, probe_idx)
+            key = self.sm.geometry_key(orbit_angles, *layout)
+            mask = self._fov_masks.get(key)
+            if mask is None:
+                H_full = self.matrix_cache.get(orbit_angles, *layout)
+                H_coo = H_full.tocoo()
+                seen = np.unique(H_coo.row // n_bins * H_full.shape[1] + H_coo.col) % H_full.shape[1]
+                mask = (np.bincount(seen, minlength=n_x * n_x) == n_angles).reshape((n_x, n_x))
+                self._fov_masks[key] = mask
+            return mask
+
+        from scipy.ndimage import binary_dilation
+
+        # A couple of iterations on the axial sum outline the body in every slice
+        quick = self._osem(self.matrix_cache, orbit_angles, summed.flatten(),
+                           np.ones(n_x * n_x, dtype=np.float32), n_angles, n_bins, range(2),
+                           probe_idx=probe_idx, additive=None if additive is None else additive.flatten())
+        mask = (quick >= self.support_threshold * quick.max()).reshape((n_x, n_x))
+        if self.support_margin > 0:
+            mask = binary_dilation(mask, iterations=self.support_margin)
+        return mask
         
-    def reconstruct_slice(self, sinogram, angles_deg, initial_image=None):
+    def reconstruct_slice(self, sinogram, angles_deg, initial_image=None,
+                          start_iteration=0, iteration_callback=None, support_mask=None, probe_idx=None,
+                          scatter=None, likelihood_callback=None, ordered=False):
         """
         Reconstruct a single 2D slice using OSEM.
         sinogram: shape (n_angles, n_detector_bins) -> (64, 128)
         angles_deg: array of angles in degrees
+        start_iteration: first iteration to run (resuming from initial_image)
+        iteration_callback: called as callback(iteration, image) after each
+            full-resolution iteration
+        support_mask: boolean image; full-grid iterations only update (and only
+            project) pixels inside it. See support_mask().
+        probe_idx: head of each angle, for probe-aware subsets and head offsets
+        scatter: scatter estimate, shape of sinogram; added to the forward
+            projection (expected = H f + scatter) rather than subtracted from the data
+        likelihood_callback: called as callback(iteration, log_likelihood) after
+            each full-resolution iteration (see _osem)
+        ordered: the angles of sinogram (and scatter) are already in subset
+            order, subset_planner.angle_order (as reconstruct_sinograms passes them)
         """
         n_angles, n_bins = sinogram.shape
-        n_pixels = self.sm.image_size * self.sm.image_size
         
         # Flatten sinogram to (n_angles * n_bins)
         # Note: Our SystemMatrix produces rows ordered by angle: 
         # [Angle0_Bin0...Angle0_Bin127, Angle1_Bin0...]
-        # So we must flatten row-major (default in numpy)
-        measured_data = sinogram.flatten()
-        
-        # Compute full system matrix once
-        # (Optimisation: Could compute subset matrices on the fly to save memory, 
-        # but for 2D slice, memory is small enough)
-        H_full = self.sm.compute_matrix(angles_deg)
-        
-        # Prepare Subsets
-        subset_indices = []
-        for s in range(self.n_subsets):
-            # Select every n_subsets-th angle
-            # Indices into the rows of H. 
-            # H has (n_angles * n_bins) rows.
-            # We need to select blocks of rows corresponding to specific angles.
-            
-            # Angles in this subset
-            angle_indices = np.arange(s, n_angles, self.n_subsets)
-            
-            # Row indices in H
-            # For each angle index 'a', rows are [a*128 : (a+1)*128]
-            rows = []
-            for a in angle_indices:
-                rows.extend(range(a * n_bins, (a + 1) * n_bins))
-            subset_indices.append(rows)
-            
+        # So we must flatten row-major (default in numpy); a contiguous sinogram
+        # (see reconstruct_sinograms) is read in place
+        measured_data = sinogram.ravel()
+        additive = None
+        if scatter is not None:
+            if scatter.shape != sinogram.shape:
+                raise ValueError(f"Scatter shape {scatter.shape} does not match sinogram {sinogram.shape}")
+            additive = scatter.ravel()
+
+        # Coarse-to-fine: the first iterations only recover low frequencies,
+        # so they run on coarser grids (much cheaper projectors) and the result
+        # is upsampled as the starting image of the next level
+        n_coarse = self.coarse_iterations
+        if start_iteration < n_coarse:
+            image = initial_image
+            for size, n_level_iterations in self.resolution_schedule:
+                level_image = (np.ones(size * size, dtype=np.float32) if image is None
+                               else _resample_image(image, size).flatten())
+                image = self._osem(self.level_cache(size), angles_deg, measured_data, level_image,
+                                   n_angles, n_bins, range(n_level_iterations),
+                                   probe_idx=probe_idx, additive=additive, ordered=ordered).reshape((size, size))
+            initial_image = _resample_image(image, self.sm.image_size)
+            start_iteration = n_coarse
+
         # Initialize Image
         if initial_image is None:
-            recon = np.ones(n_pixels, dtype=np.float32)
+            recon = np.ones(self.sm.image_size * self.sm.image_size, dtype=np.float32)
         else:
             recon = initial_image.flatten().astype(np.float32)
-            
-        epsilon = 1e-10
-        
+
+        iterations = range(start_iteration, self.n_iterations)
+        if support_mask is None:
+            # System matrix depends only on the orbit, so it is computed once and
+            # shared by every slice (and every study with the same orbit)
+            recon = self._osem(self.matrix_cache, angles_deg, measured_data, recon, n_angles, n_bins,
+                               iterations, iteration_callback, probe_idx=probe_idx, additive=additive,
+                               likelihood_callback=likelihood_callback, ordered=ordered)
+            return recon.reshape((self.sm.image_size, self.sm.image_size))
+
+        # Iterate on the pixels inside the support only; the rest stay 0
+        columns = np.flatnonzero(support_mask)
+        full = np.zeros_like(recon)
+
+        def expand(reduced):
+            full[columns] = reduced
+            return full
+
+        callback = None
+        if iteration_callback is not None:
+            callback = lambda it, reduced: iteration_callback(it, expand(reduced))
+        reduced = self._osem(self.matrix_cache, angles_deg, measured_data, recon[columns], n_angles, n_bins,
+                             iterations, callback, columns=columns, probe_idx=probe_idx, additive=additive,
+                             likelihood_callback=likelihood_callback, ordered=ordered)
+        return expand(reduced).reshape((self.sm.image_size, self.sm.image_size))
+
+    def reconstruct_batch(self, sinograms, angles_deg, support_mask=None, probe_idx=None, scatter=None):
+        """
+        Reconstruct a batch of sinograms of the same slice geometry at once
+        (e.g. noise realizations). The images are the columns of one array,
+        so each subset update is a single sparse x dense product for the
+        whole batch instead of one sparse x vector product per image.
+        sinograms: (k, n_angles, n_bins)
+        support_mask, probe_idx: see reconstruct_slice
+        scatter: (n_angles, n_bins) shared by all sinograms, or (k, n_angles, n_bins)
+        Returns: (k, image_size, image_size), equal to reconstruct_slice on each
+        """
+        n_batch, n_angles, n_bins = sinograms.shape
+        n_x = self.sm.image_size
+        if scatter is not None and scatter.shape not in (sinograms.shape, sinograms.shape[1:]):
+            raise ValueError(f"Scatter shape {scatter.shape} does not match sinograms {sinograms.shape}")
+        # Angles in subset order once for every level: (k, rows) -> (rows, k),
+        # one column per sinogram
+        angle_order = self.subset_planner.angle_order(n_angles, probe_idx)
+        measured_data = np.ascontiguousarray(sinograms[:, angle_order].reshape(n_batch, -1).T, dtype=np.float32)
+        additive = None
+        if scatter is not None:
+            additive = scatter[..., angle_order, :].reshape(-1, n_angles * n_bins).T.astype(np.float32)
+            if scatter.ndim == 2:
+                additive = additive[:, 0]
+
+        recon = np.ones((n_x * n_x, n_batch), dtype=np.float32)
+        if self.resolution_schedule:
+            images = None
+            for size, n_level_iterations in self.resolution_schedule:
+                level_images = (np.ones((size * size, n_batch), dtype=np.float32) if images is None
+                                else np.stack([_resample_image(image, size).flatten() for image in images], axis=1))
+                level_images = self._osem(self.level_cache(size), angles_deg, measured_data, level_images,
+                                          n_angles, n_bins, range(n_level_iterations),
+                                          probe_idx=probe_idx, additive=additive, ordered=True)
+                images = level_images.T.reshape((n_batch, size, size))
+            recon = np.stack([_resample_image(image, n_x).flatten() for image in images], axis=1)
+
+        iterations = range(self.coarse_iterations, self.n_iterations)
+        if support_mask is None:
+            recon = self._osem(self.matrix_cache, angles_deg, measured_data, recon, n_angles, n_bins,
+                               iterations, probe_idx=probe_idx, additive=additive, ordered=True)
+        else:
+            columns = np.flatnonzero(support_mask)
+            reduced = self._osem(self.matrix_cache, angles_deg, measured_data, recon[columns], n_angles, n_bins,
+                                 iterations, columns=columns, probe_idx=probe_idx, additive=additive,
+                                 ordered=True)
+            recon = np.zeros_like(recon)
+            recon[columns] = reduced
+        return np.ascontiguousarray(recon.T).reshape((n_batch, n_x, n_x))
+
+    def forward_project(self, image, angles_deg, probe_idx=None):
+        """
+        Project an image (or a stack of images) with the cached system matrix.
+        image: (image_size, image_size) or (k, image_size, image_size)
+        Returns: sinogram (n_angles, n_bins), or (k, n_angles, n_bins)
+        """
+        n_angles, n_bins = len(angles_deg), self.sm.detector_size
+        layout = self._matrix_layout(angles_deg, probe_idx)
+        H_ordered = self.matrix_cache.get(angles_deg, *layout)
+        # Rows of the cached matrix are in subset order; put them back in angle order
+        row_order, _ = self.subset_planner.plan_rows(n_angles, n_bins, probe_idx)
+        if image.ndim == 2:
+            sinogram = np.empty(n_angles * n_bins, dtype=np.float32)
+            sinogram[row_order] = H_ordered.dot(image.ravel())
+            return sinogram.reshape((n_angles, n_bins))
+        n_batch = image.shape[0]
+        sinograms = np.empty((n_angles * n_bins, n_batch), dtype=np.float32)
+        sinograms[row_order] = H_ordered.dot(image.reshape(n_batch, -1).T)
+        return np.ascontiguousarray(sinograms.T).reshape((n_batch, n_angles, n_bins))
+
+    def _subset_system(self, matrix_cache, angles_deg, n_angles, n_bins, columns=None, probe_idx=None):
+        """
+        Per-subset system matrices and sensitivity images for an orbit.
+        They depend only on the matrix and the orbit, so they are built once
+        and reused by every slice.
+        columns: keep only these pixels (support-restricted reconstruction)
+        probe_idx: head of each angle; subsets are then grouped head by head
+        Returns: (row_order, boundaries, subset_matrices, sensitivity_images,
+            head_matrices) where head_matrices[s] lists (start, stop, matrix)
+            for each head's rows within subset s (None without probe_idx)
+        """
+        layout = self._matrix_layout(angles_deg, probe_idx)
+        key = (matrix_cache.sm.geometry_key(angles_deg, *layout), self.subset_planner.key(),
+               None if columns is None else hashlib.sha1(columns.tobytes()).hexdigest())
+        system = self._subset_systems.get(key)
+        if system is not None:
+            return system
+        # H is built with its rows already in subset order, so every subset
+        # matrix is a view of a contiguous row block (no per-subset copies);
+        # only the measured data has to be permuted to match
+        row_order, boundaries = self.subset_planner.plan_rows(n_angles, n_bins, probe_idx)
+        H_ordered = matrix_cache.get(angles_deg, *layout)
+        if columns is not None:
+            H_ordered = H_ordered[:, columns]
+
         # Precompute sensitivity images (normalization terms) for each subset
         sensitivity_images = []
         subset_matrices = []
         
-        for s in range(self.n_subsets):
-            H_sub = H_full[subset_indices[s], :]
+        for start, stop in zip(boundaries[:-1], boundaries[1:]):
+            H_sub = csr_row_block(H_ordered, start, stop)
             subset_matrices.append(H_sub)
             
             # Backproject ones
@@ -67,71 +399,276 @@ class OSEMReconstructor:
             sens = H_sub.transpose().dot(ones_sub)
             sensitivity_images.append(sens)
 
+        head_matrices = None
+        if probe_idx is not None:
+            head_matrices = [
+                [(lo - start, hi - start, csr_row_block(H_ordered, lo, hi)) for lo, hi in blocks]
+                for start, blocks in zip(boundaries[:-1],
+                                         self.subset_planner.head_blocks(n_angles, n_bins, probe_idx))
+            ]
+
+        system = (row_order, boundaries, subset_matrices, sensitivity_images, head_matrices)
+        self._subset_systems[key] = system
+        return system
+
+    def _project_heads(self, blocks, recon, ratio=None):
+        """
+        Forward project recon (ratio is None) or back project ratio through
+        each head's block of a subset, one head per thread.
+        """
+        if self._head_pool is None:
+            self._head_pool = ThreadPoolExecutor(max_workers=self.head_workers)
+        if ratio is None:
+            expected = np.empty((blocks[-1][1],) + recon.shape[1:], dtype=np.float32)
+
+            def forward(block):
+                lo, hi, H_head = block
+                expected[lo:hi] = H_head.dot(recon)
+
+            list(self._head_pool.map(forward, blocks))
+            return expected
+        parts = self._head_pool.map(lambda block: block[2].transpose().dot(ratio[block[0]:block[1]]), blocks)
+        return sum(parts)
+
+    def close(self):
+        """
+        Stop the per-head projection threads. The reconstructor stays usable;
+        a later multi-head reconstruction starts them again.
+        """
+        if self._head_pool is not None:
+            self._head_pool.shutdown(wait=True)
+            self._head_pool = None
+
+    def _osem(self, matrix_cache, angles_deg, measured_data, recon, n_angles, n_bins,
+              iterations, iteration_callback=None, columns=None, probe_idx=None, additive=None,
+              likelihood_callback=None, ordered=False):
+        """
+        Run OSEM iterations on a flattened image with the system matrix of matrix_cache.
+        recon and measured_data may also hold a batch of images / sinograms as
+        columns, (n_pixels, k) and (n_rows, k): every projection is then one
+        sparse-dense product for the whole batch.
+        columns: pixels recon holds, if it is restricted to a support
+        probe_idx: head of each angle (probe-aware subsets, per-head projection)
+        additive: background counts per measured bin (e.g. scatter) added to
+            every forward projection
+        likelihood_callback: called as callback(iteration, log_likelihood) with the
+            Poisson log-likelihood sum(y log(Hf) - Hf) (constant terms dropped),
+            accumulated over the subsets from the forward projections the updates
+            compute anyway; not computed without a callback
+        ordered: measured_data and additive are already in subset row order;
+            otherwise they are permuted here (one copy per call)
+        Returns: the updated image (recon is modified in place)
+        """
+        row_order, boundaries, subset_matrices, sensitivity_images, head_matrices = self._subset_system(
+            matrix_cache, angles_deg, n_angles, n_bins, columns, probe_idx)
+        per_head = head_matrices is not None and self.head_workers > 1
+        # Measured data in subset order, so each subset's data is a slice
+        if not ordered:
+            measured_data = measured_data[row_order]
+            if additive is not None:
+                additive = additive[row_order]
+        if additive is not None and recon.ndim == 2 and additive.ndim == 1:
+            additive = additive[:, None]
+        epsilon = 1e-10
+
         # OSEM Loop
-        for it in range(self.n_iterations):
-            for s in range(self.n_subsets):
+        for it in iterations:
+            log_likelihood = 0.0
+            for s in self.subset_planner.iteration_order(it):
                 H_sub = subset_matrices[s]
                 sens = sensitivity_images[s]
                 
                 # Get measured data for this subset
-                measured_sub = measured_data[subset_indices[s]]
+                measured_sub = measured_data[boundaries[s]:boundaries[s + 1]]
                 
                 # Forward project
-                expected_sub = H_sub.dot(recon)
+                if per_head:
+                    expected_sub = self._project_heads(head_matrices[s], recon)
+                else:
+                    expected_sub = H_sub.dot(recon)
+                if additive is not None:
+                    expected_sub += additive[boundaries[s]:boundaries[s + 1]]
                 
                 # Ratio
                 ratio = measured_sub / (expected_sub + epsilon)
+                if likelihood_callback is not None:
+                    log_likelihood += float(np.dot(measured_sub.ravel(), np.log(expected_sub.ravel() + epsilon))
+                                            - expected_sub.sum(dtype=np.float64))
                 
                 # Backproject Ratio
-                correction = H_sub.transpose().dot(ratio)
+                if per_head:
+                    correction = self._project_heads(head_matrices[s], recon, ratio)
+                else:
+                    correction = H_sub.transpose().dot(ratio)
                 
                 # Update
                 # recon = recon * (correction / (sens + epsilon))
                 # Handle division by zero in sens (if any pixel is not seen by any ray)
                 normalization = sens + epsilon
+                if recon.ndim == 2:
+                    normalization = normalization[:, None]
                 recon *= (correction / normalization)
                 
                 # Enforce non-negativity
                 recon[recon < 0] = 0
+
+            if iteration_callback is not None:
+                iteration_callback(it, recon)
+            if likelihood_callback is not None:
+                likelihood_callback(it, log_likelihood)
                 
-        return recon.reshape((self.sm.image_size, self.sm.image_size))
+        return recon
 
-    def reconstruct_volume(self, projection_data, orbit_angles):
+    def reconstruct_volume(self, projection_data, orbit_angles, checkpoint_dir=None, initial_volume=None,
+                           probe_idx=None, scatter=None):
         """
         Reconstruct full volume slice by slice.
         projection_data: (128, 128, 64) -> (u, v, angle)
         orbit_angles: (64,) array of angles
-        Returns: volume (128, 128, 128) -> (x, y, z)
+        probe_idx: (64,) head that acquired each angle (orbit 'probe_idx'); makes
+            subsets probe-aware and applies head_offsets_mm
+        scatter: scatter estimate in the photopeak window, shape of projection_data
+            (see EnergyWindows.estimate); modelled as an additive term of the
+            forward projection
+        initial_volume: starting estimate of shape recon_dim (e.g. an upsampled
+            preview); defaults to a uniform image
+        checkpoint_dir: if given, the volume is written to a memory-mapped file in
+            this directory and progress is recorded after every iteration, so an
+            interrupted run called again with the same directory resumes where it stopped
+        The projections are binned to the reconstruction slices and converted
+        into a contiguous sinogram stack once (see reconstruct_sinograms).
+        Returns: volume (128, 128, 128) -> (x, y, z), i.e. geometry.recon_dim
         """
         # Input shape check
         u_dim, v_dim, n_angles = projection_data.shape
         # projection_data: u (detector bin), v (axial slice), angle
+        if u_dim != self.sm.detector_size:
+            raise ValueError(f"Projection has {u_dim} detector bins, system matrix expects {self.sm.detector_size}")
+        if scatter is not None and scatter.shape != projection_data.shape:
+            raise ValueError(f"Scatter shape {scatter.shape} does not match projection {projection_data.shape}")
+        if self.geometry is not None:
+            if v_dim != self.geometry.n_rows:
+                raise ValueError(f"Projection has {v_dim} axial rows, geometry expects {self.geometry.n_rows}")
+            # Coarser axial grid: sum detector rows into slices
+            projection_data = self.geometry.bin_rows(projection_data)
+            if scatter is not None:
+                scatter = self.geometry.bin_rows(scatter)
+        return self.reconstruct_sinograms(to_sinograms(projection_data), orbit_angles, checkpoint_dir=checkpoint_dir,
+                                          initial_volume=initial_volume, probe_idx=probe_idx,
+                                          scatter=None if scatter is None else to_sinograms(scatter))
+
+    def reconstruct_sinograms(self, sinograms, orbit_angles, checkpoint_dir=None, initial_volume=None,
+                              probe_idx=None, scatter=None):
+        """
+        Reconstruct a volume from a (slice, angle, u) sinogram stack, e.g. from
+        to_sinograms or SinogramPreprocessor.apply. The stack is put in subset
+        angle order once (a single copy); slices are then read as sinograms[z]
+        without copies.
+        scatter: scatter estimate, same layout as sinograms
+        Other arguments as for reconstruct_volume.
+        Progress is published on self.events: volume_started, checkpoint_resumed,
+        support_mask, slice_started, iteration_finished (with the log-likelihood),
+        slice_finished (with elapsed time and ETA) and volume_finished.
+        Returns: volume (x, y, slice)
+        """
+        v_dim, n_angles, u_dim = sinograms.shape
+        if u_dim != self.sm.detector_size:
+            raise ValueError(f"Sinograms have {u_dim} detector bins, system matrix expects {self.sm.detector_size}")
+        if n_angles != len(orbit_angles):
+            raise ValueError(f"Projection has {n_angles} angles but orbit has {len(orbit_angles)}")
+        if probe_idx is not None and len(probe_idx) != n_angles:
+            raise ValueError(f"Orbit has {len(probe_idx)} probe indices for {n_angles} angles")
+        if scatter is not None and scatter.shape != sinograms.shape:
+            raise ValueError(f"Scatter shape {scatter.shape} does not match sinograms {sinograms.shape}")
+        if self.geometry is not None and v_dim != self.geometry.n_slices:
+            raise ValueError(f"Sinograms have {v_dim} slices, geometry expects {self.geometry.n_slices}")
+        n_x = self.sm.image_size
+        if initial_volume is not None and initial_volume.shape != (n_x, n_x, v_dim):
+            raise ValueError(f"Initial volume shape {initial_volume.shape} does not match {(n_x, n_x, v_dim)}")
         
-        volume = np.zeros((u_dim, u_dim, v_dim), dtype=np.float32)
+        checkpoint = None
+        if checkpoint_dir is None:
+            volume = np.zeros((n_x, n_x, v_dim), dtype=np.float32)
+        else:
+            run_key = ReconCheckpoint.make_run_key(
+                sinograms, orbit_angles,
+                n_subsets=self.n_subsets, n_iterations=self.n_iterations,
+                subset_plan=self.subset_planner.key(),
+                image_size=self.sm.image_size, pixel_size=self.sm.pixel_size,
+                detector_pixel_size=self.sm.detector_pixel_size,
+                resolution_schedule=self.resolution_schedule,
+                support=self.support_key(),
+                probe_idx=None if probe_idx is None else np.asarray(probe_idx).tolist(),
+                head_offsets_mm=self.head_offsets_mm,
+                cor_offset_mm=self.cor_offset_mm,
+                scatter=None if scatter is None else
+                hashlib.sha1(np.ascontiguousarray(scatter, dtype=np.float32).tobytes()).hexdigest(),
+                initial_volume=None if initial_volume is None else
+                hashlib.sha1(np.ascontiguousarray(initial_volume).tobytes()).hexdigest())
+            checkpoint = ReconCheckpoint(checkpoint_dir, (n_x, n_x, v_dim), run_key)
+            volume = checkpoint.open()
+            if checkpoint.completed:
+                self.events.emit('checkpoint_resumed', n_done=len(checkpoint.completed), n_slices=v_dim)
         
-        print(f"Starting reconstruction of {v_dim} slices...", flush=True)
+        support_mask = self._support_mask(sinograms.sum(axis=0), None if scatter is None else scatter.sum(axis=0),
+                                          orbit_angles, probe_idx)
+        if support_mask is not None:
+            self.events.emit('support_mask', coverage=float(support_mask.mean()))
+
+        # Angles in subset order once for the whole stack, so every slice and
+        # resolution level reads its data as contiguous subset blocks
+        angle_order = self.subset_planner.angle_order(n_angles, probe_idx)
+        sinograms = sinograms[:, angle_order]
+        if scatter is not None:
+            scatter = scatter[:, angle_order]
+
+        self.events.emit('volume_started', n_slices=v_dim, n_subsets=self.n_subsets, n_iterations=self.n_iterations)
         start_time = time.time()
+        todo = [z for z in range(v_dim) if checkpoint is None or not checkpoint.is_done(z)]
         
-        for z in range(v_dim):
-            if z % 10 == 0:
-                print(f"Reconstructing slice {z}/{v_dim}...", flush=True)
+        for n_done, z in enumerate(todo):
+            self.events.emit('slice_started', slice=z, n_slices=v_dim)
+            slice_start = time.time()
+            likelihood_callback = None
+            if self.events.wants('iteration_finished'):
+                likelihood_callback = lambda it, value, z=z: self.events.emit(
+                    'iteration_finished', slice=z, iteration=it, log_likelihood=value,
+                    elapsed_s=time.time() - slice_start)
                 
-            # Extract sinogram for slice z
-            # shape: (u, angle) -> (128, 64)
-            sinogram_slice = projection_data[:, z, :]
-            
-            # Transpose to (angle, bin) for my reconstruct_slice method
-            sinogram_slice = sinogram_slice.T # Now (64, 128)
+            # Sinogram of slice z: (angle, bin) -> (64, 128), a view of the stack
+            sinogram_slice = sinograms[z]
+            scatter_slice = None if scatter is None else scatter[z]
             
-            recon_slice = self.reconstruct_slice(sinogram_slice, orbit_angles)
+            initial_image = None if initial_volume is None else initial_volume[:, :, z]
+            if checkpoint is None:
+                recon_slice = self.reconstruct_slice(sinogram_slice, orbit_angles, initial_image=initial_image,
+                                                     support_mask=support_mask, probe_idx=probe_idx,
+                                                     scatter=scatter_slice, likelihood_callback=likelihood_callback,
+                                                     ordered=True)
+            else:
+                start_iteration, resumed_image = checkpoint.resume_state(z)
+                if resumed_image is not None:
+                    initial_image = resumed_image
+                recon_slice = self.reconstruct_slice(
+                    sinogram_slice, orbit_angles,
+                    initial_image=initial_image, start_iteration=start_iteration,
+                    iteration_callback=lambda it, image, z=z: checkpoint.save_iteration(z, it, image),
+                    support_mask=support_mask, probe_idx=probe_idx, scatter=scatter_slice,
+                    likelihood_callback=likelihood_callback, ordered=True)
             
             # Store
             # Standard orientation: usually z is the axial axis.
             # We map z index of projection to z index of volume.
             volume[:, :, z] = recon_slice
+            if checkpoint is not None:
+                checkpoint.mark_slice_done(z)
+            if self.events.wants('slice_finished'):
+                now = time.time()
+                self.events.emit('slice_finished', slice=z, n_slices=v_dim, n_done=n_done + 1, n_todo=len(todo),
+                                 slice_s=now - slice_start, elapsed_s=now - start_time,
+                                 eta_s=(now - start_time) / (n_done + 1) * (len(todo) - n_done - 1))
             
-        end_time = time.time()
-        print(f"Reconstruction complete in {end_time - start_time:.2f} seconds.")
+        self.events.emit('volume_finished', n_slices=v_dim, elapsed_s=time.time() - start_time)
         
         # Rotate volume if necessary to match reference orientation
         # (Will check orientation in Evaluation step)
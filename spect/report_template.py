@@ -0,0 +1,110 @@
+import os
+import threading
+import warnings
+
+# Environment variable naming the report font file (e.g. a .ttf/.ttc on Linux)
+FONT_ENV = "SPECT_REPORT_FONT"
+
+# Chinese TrueType fonts probed in order when no font is configured.
+# (Fonts with PostScript outlines, e.g. Noto CJK .otf/.ttc, are not
+# supported by ReportLab.)
+FONT_CANDIDATES = [
+    ("SimHei", "C:\\Windows\\Fonts\\simhei.ttf"),
+    ("MsYaHei", "C:\\Windows\\Fonts\\msyh.ttf"),
+    ("SimSun", "C:\\Windows\\Fonts\\simsun.ttc"),
+    ("WenQuanYiZenHei", "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc"),
+    ("WenQuanYiMicroHei", "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc"),
+    ("DroidSansFallback", "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf"),
+    ("ArialUnicode", "/Library/Fonts/Arial Unicode.ttf"),
+]
+
+# Built-in font used when no Chinese font is found (no CJK glyphs)
+FALLBACK_FONT = "Helvetica"
+
+
+def resolve_font(font_path=None):
+    """
+    Font used for the reports, without loading it:
+    font_path, else $SPECT_REPORT_FONT, else the first FONT_CANDIDATES
+    entry that exists, else FALLBACK_FONT.
+    Returns: (font name, font path or None for the fallback)
+    """
+    font_path = font_path or os.environ.get(FONT_ENV)
+    if font_path:
+        if not os.path.exists(font_path):
+            raise FileNotFoundError(f"Report font not found: {font_path}")
+        return os.path.splitext(os.path.basename(font_path))[0].replace(" ", ""), font_path
+    for font_name, candidate in FONT_CANDIDATES:
+        if os.path.exists(candidate):
+            return font_name, candidate
+    return FALLBACK_FONT, None
+
+
+class ReportTemplate:
+    """
+    Fonts, paragraph styles and table style of the PDF reports.
+    Parsing a CJK TrueType font takes far longer than laying out a report,
+    so templates are built once per font and process: use
+    ReportTemplate.get(), which registers the font with ReportLab on first
+    use and returns the same template (and parsed font) afterwards.
+    """
+    _templates = {}
+    _lock = threading.Lock()
+
+    def __init__(self, font_name, font_path):
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY
+        from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+        from reportlab.platypus import TableStyle
+
+        self.font_name = font_name
+        self.font_path = font_path
+        if font_path is not None:
+            self._register(font_name, font_path)
+        elif font_name == FALLBACK_FONT:
+            warnings.warn(f"No Chinese font found; reports use {FALLBACK_FONT}. "
+                          f"Set {FONT_ENV} to a TrueType font with CJK glyphs.")
+
+        font = self.font_name
+        sample = getSampleStyleSheet()
+        normal = ParagraphStyle(name='NormalCN', parent=sample['Normal'], fontName=font, fontSize=10.5, leading=16, alignment=TA_JUSTIFY, spaceAfter=8)
+        self.styles = {
+            'title': ParagraphStyle(name='TitleCN', parent=sample['Title'], fontName=font, fontSize=20, leading=24, spaceAfter=24, alignment=TA_CENTER),
+            'h1': ParagraphStyle(name='H1CN', parent=sample['Heading1'], fontName=font, fontSize=16, leading=20, spaceBefore=18, spaceAfter=12),
+            'h2': ParagraphStyle(name='H2CN', parent=sample['Heading2'], fontName=font, fontSize=13, leading=16, spaceBefore=12, spaceAfter=6),
+            'normal': normal,
+            'date': ParagraphStyle(name='Date', parent=normal, alignment=TA_CENTER),
+            'code': ParagraphStyle(name='CodeCN', parent=sample['Code'], fontName='Courier', fontSize=8, leading=10, spaceAfter=6, leftIndent=20),
+            'caption': ParagraphStyle(name='CaptionCN', parent=sample['Normal'], fontName=font, fontSize=9, leading=12, alignment=TA_CENTER, textColor=colors.grey),
+        }
+        self.table_style = TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), font),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('PADDING', (0, 0), (-1, -1), 6),
+        ])
+
+    @staticmethod
+    def _register(font_name, font_path):
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        if font_name in pdfmetrics.getRegisteredFontNames():
+            return
+        # .ttc collections hold several faces; use the first
+        subfont = {'subfontIndex': 0} if font_path.lower().endswith(".ttc") else {}
+        pdfmetrics.registerFont(TTFont(font_name, font_path, **subfont))
+
+    @classmethod
+    def get(cls, font_path=None):
+        """
+        Shared template of the font chosen by resolve_font(font_path).
+        """
+        font_name, resolved_path = resolve_font(font_path)
+        with cls._lock:
+            template = cls._templates.get(resolved_path)
+            if template is None:
+                template = cls._templates[resolved_path] = cls(font_name, resolved_path)
+            return template
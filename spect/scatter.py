@@ -0,0 +1,66 @@
+import numpy as np
+
+from .settings import SettingsMixin
+
+
+class EnergyWindows(SettingsMixin):
+    """
+    Triple-energy-window (TEW) scatter estimation.
+    Scatter in the photopeak window is estimated from two narrow windows on
+    either side of it as the trapezoid
+        S = (C_lower / W_lower + C_upper / W_upper) * W_peak / 2
+    per projection bin, where C are counts and W window widths in keV.
+    The default widths are for Tc-99m: a 20% (28 keV) photopeak window and
+    3 keV sub-windows.
+    smooth_fwhm_bins: the sub-windows are narrow and noisy, so the estimate is
+        smoothed in-plane (u, v) with a Gaussian of this FWHM (0 disables)
+    """
+    def __init__(self, peak_width_kev=28.0, lower_width_kev=3.0, upper_width_kev=3.0, smooth_fwhm_bins=2.0):
+        self.peak_width_kev = float(peak_width_kev)
+        self.lower_width_kev = float(lower_width_kev)
+        self.upper_width_kev = float(upper_width_kev)
+        self.smooth_fwhm_bins = float(smooth_fwhm_bins)
+        if min(self.peak_width_kev, self.lower_width_kev, self.upper_width_kev) <= 0:
+            raise ValueError("Energy window widths must be positive")
+
+    def estimate(self, lower, upper, peak=None):
+        """
+        TEW scatter estimate for whole projection stacks at once.
+        lower, upper: sub-window projections, (u, v, angle)
+        peak: photopeak projections; if given the estimate is clipped to them
+        Returns: float32 scatter estimate, same shape
+        """
+        lower = np.asarray(lower, dtype=np.float32)
+        upper = np.asarray(upper, dtype=np.float32)
+        if lower.shape != upper.shape:
+            raise ValueError(f"Window shapes differ: {lower.shape} vs {upper.shape}")
+
+        # Two scaled slab passes, written into one output buffer
+        scatter = np.multiply(lower, np.float32(self.peak_width_kev / (2 * self.lower_width_kev)))
+        scatter += upper * np.float32(self.peak_width_kev / (2 * self.upper_width_kev))
+
+        if self.smooth_fwhm_bins > 0:
+            from scipy.ndimage import gaussian_filter
+
+            sigma = self.smooth_fwhm_bins / (2 * np.sqrt(2 * np.log(2)))
+            # Smooth each projection only; angles stay independent
+            scatter = gaussian_filter(scatter, sigma=(sigma, sigma, 0), mode='nearest')
+
+        if peak is not None:
+            peak = np.asarray(peak, dtype=np.float32)
+            if peak.shape != scatter.shape:
+                raise ValueError(f"Photopeak shape {peak.shape} does not match windows {scatter.shape}")
+            np.minimum(scatter, peak, out=scatter)
+        return scatter
+
+    def to_dict(self):
+        return {
+            'peak_width_kev': self.peak_width_kev,
+            'lower_width_kev': self.lower_width_kev,
+            'upper_width_kev': self.upper_width_kev,
+            'smooth_fwhm_bins': self.smooth_fwhm_bins,
+        }
+
+    def __repr__(self):
+        return (f"EnergyWindows(peak={self.peak_width_kev}keV, lower={self.lower_width_kev}keV, "
+                f"upper={self.upper_width_kev}keV, smooth={self.smooth_fwhm_bins} bins)")
@@ -0,0 +1,339 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from .batch import Study, close_pipelines, run_study
+from .geometry import ScanGeometry
+from .preview_pack import preview_path
+from .scatter import EnergyWindows
+from .qc import ProjectionQC
+
+# Parameters a job may set, passed on to run_study
+JOB_PARAMETERS = (
+    'n_subsets', 'n_iterations', 'fwhm_mm', 'pixel_size_mm', 'output_format', 'geometry',
+    'resolution_schedule', 'support', 'subset_ordering', 'subset_seed', 'head_offsets_mm',
+    'energy_windows', 'cor', 'qc',
+)
+METRICS = ('rmse_recon', 'ssim_recon', 'rmse_filtered', 'ssim_filtered')
+ACTIVE = ('queued', 'running')
+# Study ids name the job's output directory under output_dir
+STUDY_ID = re.compile(r"^[A-Za-z0-9_.-]+$")
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+
+def check_study_id(study_id):
+    """
+    Reject study ids that are not a single plain path component, so a job
+    cannot write (or clear checkpoints) outside the service's output_dir.
+    """
+    if not isinstance(study_id, str) or not STUDY_ID.match(study_id) or '..' in study_id or \
+            os.sep in study_id or (os.altsep and os.altsep in study_id):
+        raise ValueError(f"Invalid study_id {study_id!r}: use letters, digits, '_', '-' and '.' only")
+    return study_id
+
+
+class ReconstructionService:
+    """
+    Long-running reconstruction daemon.
+    Jobs (one study each) are queued and run one at a time by a worker
+    thread with run_study, so the per-configuration pipelines, system
+    matrices and subset systems stay in memory between jobs: a study whose
+    orbit has been seen before only pays for its iterations.
+    serve() exposes the queue over HTTP on localhost (see ServiceHandler).
+    Finished job records are kept for polling up to max_finished_jobs (the
+    oldest are dropped first) and, with job_ttl_s, for at most that many
+    seconds after they finish; their outputs stay on disk.
+    """
+    def __init__(self, output_dir, cache_dir=None, checkpoint=True, max_finished_jobs=1000, job_ttl_s=None,
+                 **defaults):
+        """
+        output_dir: results go to output_dir/<study_id>/ as with BatchRunner
+        cache_dir: system matrix cache directory (default: memory only)
+        max_finished_jobs: finished job records kept (None: all)
+        job_ttl_s: seconds a finished job record is kept (None: no limit)
+        defaults: job parameters used when a job does not set them
+        """
+        unknown = set(defaults) - set(JOB_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown job parameters: {sorted(unknown)}")
+        self.output_dir = output_dir
+        self.cache_dir = cache_dir
+        self.checkpoint = checkpoint
+        self.defaults = defaults
+        self.max_finished_jobs = max_finished_jobs
+        self.job_ttl_s = job_ttl_s
+        self.jobs = {}
+        self._closed = False
+        self._queue = queue.Queue()
+        self._done = threading.Condition()
+        self._worker = threading.Thread(target=self._run_jobs, daemon=True)
+        self._worker.start()
+        self._server = None
+
+    def submit(self, request):
+        """
+        Queue a job.
+        request: dict with 'projection' and 'orbit' paths, optional 'study_id',
+            'reference', 'reference_filtered', 'scatter_lower', 'scatter_upper',
+            'cor_offset_mm' and 'parameters' (see JOB_PARAMETERS)
+        Returns: the job record
+        """
+        if not request.get('projection') or not request.get('orbit'):
+            raise ValueError("A job needs 'projection' and 'orbit'")
+        parameters = dict(self.defaults, **(request.get('parameters') or {}))
+        unknown = set(parameters) - set(JOB_PARAMETERS)
+        if unknown:
+            raise ValueError(f"Unknown job parameters: {sorted(unknown)}")
+        kwargs = self._run_kwargs(parameters)
+        if self._closed:
+            raise RuntimeError("The service has been shut down")
+        job_id = uuid.uuid4().hex[:12]
+        study = Study(check_study_id(request.get('study_id') or job_id), request['projection'], request['orbit'],
+                      request.get('reference'), request.get('reference_filtered'),
+                      request.get('scatter_lower'), request.get('scatter_upper'), request.get('cor_offset_mm'))
+        job = {
+            'job_id': job_id,
+            'study': study.to_dict(),
+            'parameters': parameters,
+            'status': 'queued',
+            'submitted': time.time(),
+        }
+        with self._done:
+            self._prune_jobs()
+            self.jobs[job_id] = job
+            self._queue.put((job, study, kwargs))
+            return dict(job)
+
+    def _prune_jobs(self):
+        # Called with self._done held; jobs is in submission order
+        finished = [job for job in self.jobs.values() if job['status'] not in ACTIVE]
+        if self.job_ttl_s is not None:
+            expired = time.time() - self.job_ttl_s
+            for job in [job for job in finished if job['finished'] < expired]:
+                del self.jobs[job['job_id']]
+                finished.remove(job)
+        if self.max_finished_jobs is not None and len(finished) > self.max_finished_jobs:
+            finished.sort(key=lambda job: job['finished'])
+            for job in finished[:len(finished) - self.max_finished_jobs]:
+                del self.jobs[job['job_id']]
+
+    @staticmethod
+    def _run_kwargs(parameters):
+        # JSON values -> run_study arguments
+        kwargs = dict(parameters)
+        if isinstance(kwargs.get('geometry'), dict):
+            kwargs['geometry'] = ScanGeometry(**kwargs['geometry'])
+        if isinstance(kwargs.get('energy_windows'), dict):
+            kwargs['energy_windows'] = EnergyWindows(**kwargs['energy_windows'])
+        if isinstance(kwargs.get('qc'), dict):
+            kwargs['qc'] = ProjectionQC(**kwargs['qc'])
+        if kwargs.get('head_offsets_mm'):
+            kwargs['head_offsets_mm'] = {int(p): float(v) for p, v in kwargs['head_offsets_mm'].items()}
+        return kwargs
+
+    def _run_jobs(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            job, study, kwargs = item
+            with self._done:
+                if self._closed:
+                    job.update({'status': 'cancelled', 'finished': time.time()})
+                    self._done.notify_all()
+                    continue
+                job['status'] = 'running'
+            row = run_study(study, self.output_dir, cache_dir=self.cache_dir, checkpoint=self.checkpoint, **kwargs)
+            extension = kwargs.get('output_format', 'dat')
+            recon_path = os.path.join(row['output_dir'], f"MyRecon.{extension}")
+            filtered_path = os.path.join(row['output_dir'], f"MyFiltered.{extension}")
+            with self._done:
+                job.update({
+                    'status': row['status'],
+                    'finished': time.time(),
+                    'elapsed_s': row['elapsed_s'],
+                    'output_dir': row['output_dir'],
+                    'outputs': {
+                        'recon': recon_path,
+                        'filtered': filtered_path,
+                        'metrics': os.path.join(row['output_dir'], "metrics.json"),
+                        'recon_preview': preview_path(recon_path),
+                        'filtered_preview': preview_path(filtered_path),
+                    } if row['status'] == 'ok' else {},
+                    'metrics': {name: row[name] for name in METRICS if name in row},
+                })
+                if 'error' in row:
+                    job['error'] = row['error']
+                self._prune_jobs()
+                self._done.notify_all()
+
+    def job(self, job_id):
+        """
+        Returns: a copy of the job record, or None for an unknown id
+        """
+        with self._done:
+            job = self.jobs.get(job_id)
+            return None if job is None else dict(job)
+
+    def list_jobs(self):
+        with self._done:
+            return [dict(job) for job in self.jobs.values()]
+
+    def wait(self, job_id, timeout=None):
+        """
+        Block until the job has finished (or timeout seconds have passed).
+        Returns: the job record, or None once it has been pruned
+        """
+        with self._done:
+            self._done.wait_for(lambda: self.jobs.get(job_id, {}).get('status') not in ACTIVE, timeout)
+            job = self.jobs.get(job_id)
+            return None if job is None else dict(job)
+
+    def status(self):
+        return {'status': 'ok', 'queued': self._queue.qsize(), 'jobs': len(self.jobs)}
+
+    def serve(self, host='127.0.0.1', port=8765, background=False):
+        """
+        Serve the HTTP API. port=0 picks a free port (see address).
+        background: serve from a daemon thread and return immediately
+        """
+        self._server = ThreadingHTTPServer((host, port), ServiceHandler)
+        self._server.service = self
+        if background:
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        else:
+            self._server.serve_forever()
+
+    @property
+    def address(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def shutdown(self):
+        """
+        Stop serving, cancel the queued jobs, wait for the running one and
+        close the cached pipelines (releasing their threads and matrices).
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        with self._done:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+        close_pipelines()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """
+    HTTP API of a ReconstructionService:
+        GET  /health        queue length and job count
+        GET  /jobs          all job records
+        GET  /jobs/<id>     one job record
+        POST /jobs          submit a job (JSON body, see submit); with
+                            "wait": true the response is sent when it finishes
+    POST requests must be sent as application/json (415 otherwise) and may
+    only come from the service's own origin (403 for a foreign Origin), so a
+    web page open in the operator's browser cannot queue jobs with a simple
+    cross-site form or text/plain request.
+    """
+    def _send(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/health":
+            return self._send(200, service.status())
+        if self.path == "/jobs":
+            return self._send(200, service.list_jobs())
+        if self.path.startswith("/jobs/"):
+            job = service.job(self.path[len("/jobs/"):])
+            if job is not None:
+                return self._send(200, job)
+        self._send(404, {'error': f"Not found: {self.path}"})
+
+    def _foreign_origin(self):
+        origin = self.headers.get("Origin")
+        if origin is None:
+            return False
+        parts = urlsplit(origin)
+        try:
+            port = parts.port
+        except ValueError:
+            return True
+        return parts.scheme != "http" or parts.hostname not in LOOPBACK_HOSTS + (self.server.server_address[0],) or \
+            port != self.server.server_address[1]
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path != "/jobs":
+            return self._send(404, {'error': f"Not found: {self.path}"})
+        if self._foreign_origin():
+            return self._send(403, {'error': f"Cross-origin requests are not allowed: {self.headers['Origin']}"})
+        if self.headers.get_content_type() != "application/json":
+            return self._send(415, {'error': "Jobs must be submitted as application/json"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            job = service.submit(request)
+        except (ValueError, TypeError) as e:
+            # Includes malformed JSON and bad parameter values
+            return self._send(400, {'error': str(e)})
+        if request.get('wait'):
+            return self._send(200, service.wait(job['job_id']))
+        self._send(202, job)
+
+    def log_message(self, format, *args):
+        print(f"[service] {self.address_string()} {format % args}", flush=True)
+
+
+def submit_job(url, request, wait=True, timeout=None):
+    """
+    Client helper: submit a job to a running service.
+    Returns: the job record (final if wait)
+    """
+    from urllib.request import Request, urlopen
+
+    body = json.dumps(dict(request, wait=wait)).encode()
+    req = Request(f"{url}/jobs", data=body, headers={"Content-Type": "application/json"})
+    with urlopen(req, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reconstruction service keeping system matrices warm between studies")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output-dir", default=os.path.join("outputs", "service"))
+    parser.add_argument("--cache-dir", default=None, help="System matrix cache directory")
+    parser.add_argument("--n-subsets", type=int, default=4)
+    parser.add_argument("--n-iterations", type=int, default=10)
+    parser.add_argument("--fwhm", type=float, default=10.0, help="Post-filter FWHM in mm")
+    parser.add_argument("--max-finished-jobs", type=int, default=1000, help="Finished job records kept for polling")
+    parser.add_argument("--job-ttl", type=float, default=None,
+                        help="Seconds a finished job record is kept for polling (default: no limit)")
+    args = parser.parse_args()
+
+    service = ReconstructionService(args.output_dir, cache_dir=args.cache_dir,
+                                    max_finished_jobs=args.max_finished_jobs, job_ttl_s=args.job_ttl,
+                                    n_subsets=args.n_subsets, n_iterations=args.n_iterations, fwhm_mm=args.fwhm)
+    print(f"Serving on http://{args.host}:{args.port} (results in {args.output_dir})", flush=True)
+    try:
+        service.serve(args.host, args.port)
+    except KeyboardInterrupt:
+        service.shutdown()
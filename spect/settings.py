@@ -0,0 +1,24 @@
+from abc import ABC, abstractmethod
+
+
+class SettingsMixin(ABC):
+    """
+    Base for settings objects described by to_dict() (ScanGeometry,
+    EnergyWindows, ProjectionQC). Equality, hashing and the default repr
+    are all derived from to_dict(), the same dict the stage-cache keys and
+    JSON parameters are built from, so they cannot disagree with them.
+    Subclasses must list every setting in to_dict() and may override
+    __repr__ with a more readable form.
+    """
+    @abstractmethod
+    def to_dict(self):
+        """JSON-serializable dict of every setting."""
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.to_dict() == other.to_dict()
+
+    def __hash__(self):
+        return hash(tuple(sorted(self.to_dict().items())))
+
+    def __repr__(self):
+        return f"{type(self).__name__}(" + ", ".join(f"{k}={v}" for k, v in self.to_dict().items()) + ")"
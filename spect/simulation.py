@@ -0,0 +1,89 @@
+import numpy as np
+
+# (center x, center y, semi-axis x, semi-axis y, value), lengths in fractions of
+# the half field of view; values add up where ellipses overlap
+DEFAULT_ELLIPSES = (
+    (0.0, 0.0, 0.5, 0.4, 1.0),        # body
+    (-0.2, -0.05, 0.08, 0.08, 3.0),   # hot lesion
+    (0.2, 0.1, 0.1, 0.08, -0.8),      # cold region
+)
+
+
+def ellipse_phantom(size, ellipses=DEFAULT_ELLIPSES):
+    """
+    Activity phantom made of ellipses on a size x size grid (rows are y).
+    Returns: float32 (size, size) image
+    """
+    coords = (np.arange(size) + 0.5) / size * 2 - 1
+    y, x = np.meshgrid(coords, coords, indexing='ij')
+    phantom = np.zeros((size, size), dtype=np.float32)
+    for cx, cy, ax, ay, value in ellipses:
+        phantom[((x - cx) / ax) ** 2 + ((y - cy) / ay) ** 2 < 1] += value
+    return phantom
+
+
+class PoissonSimulator:
+    """
+    Monte-Carlo noise studies of a reconstructor.
+    A phantom is forward projected once with the reconstructor's cached system
+    matrix; noise realizations are drawn from that sinogram in one vectorized
+    Poisson call per batch and reconstructed together with
+    OSEMReconstructor.reconstruct_batch. Per-pixel mean and variance are
+    accumulated batch by batch, so memory is bounded by batch_size.
+    """
+    def __init__(self, reconstructor, angles_deg, probe_idx=None, seed=None):
+        self.reconstructor = reconstructor
+        self.angles_deg = np.asarray(angles_deg)
+        self.probe_idx = probe_idx
+        self.rng = np.random.default_rng(seed)
+
+    def project(self, phantom, total_counts=None):
+        """
+        Noiseless sinogram (n_angles, n_bins) of phantom, scaled to
+        total_counts if given.
+        """
+        sinogram = self.reconstructor.forward_project(phantom, self.angles_deg, self.probe_idx)
+        if total_counts is not None:
+            sinogram *= np.float32(total_counts / sinogram.sum())
+        return sinogram
+
+    def realize(self, sinogram, n_realizations):
+        """
+        Returns: (n_realizations, n_angles, n_bins) float32 Poisson realizations
+        """
+        return self.rng.poisson(sinogram, size=(n_realizations,) + sinogram.shape).astype(np.float32)
+
+    def run(self, phantom, n_realizations, total_counts=None, batch_size=64, support_mask=None):
+        """
+        Reconstruct n_realizations noisy copies of phantom's sinogram.
+        Returns: dict with per-pixel 'mean', 'variance' and 'bias' images,
+            'truth' (phantom in the units of the reconstruction, i.e. scaled like
+            the sinogram) and 'sinogram' (the noiseless data)
+        """
+        sinogram = self.project(phantom)
+        scale = 1.0 if total_counts is None else total_counts / float(sinogram.sum())
+        sinogram *= np.float32(scale)
+        mean = np.zeros(phantom.shape, dtype=np.float64)
+        m2 = np.zeros(phantom.shape, dtype=np.float64)
+        n_done = 0
+        while n_done < n_realizations:
+            n_batch = min(batch_size, n_realizations - n_done)
+            images = self.reconstructor.reconstruct_batch(self.realize(sinogram, n_batch), self.angles_deg,
+                                                          support_mask=support_mask, probe_idx=self.probe_idx)
+            # Merge the batch's moments into the running ones (Chan et al.)
+            batch_mean = images.mean(axis=0, dtype=np.float64)
+            delta = batch_mean - mean
+            n_total = n_done + n_batch
+            mean += delta * (n_batch / n_total)
+            m2 += ((images - batch_mean) ** 2).sum(axis=0) + delta ** 2 * (n_done * n_batch / n_total)
+            n_done = n_total
+
+        truth = phantom * scale
+        return {
+            'mean': mean.astype(np.float32),
+            'variance': (m2 / max(n_done - 1, 1)).astype(np.float32),
+            'bias': (mean - truth).astype(np.float32),
+            'truth': truth.astype(np.float32),
+            'sinogram': sinogram,
+            'n_realizations': n_done,
+        }
@@ -0,0 +1,127 @@
+import hashlib
+import numpy as np
+
+
+def to_sinograms(projection_data):
+    """
+    (u, v, angle) projections -> contiguous float32 (v, angle, u) sinogram
+    stack in one copy, so sinograms[z] is slice z's (angle, u) sinogram.
+    """
+    return np.ascontiguousarray(np.asarray(projection_data).transpose(1, 2, 0), dtype=np.float32)
+
+
+def _array_key(array):
+    return None if array is None else hashlib.sha1(np.ascontiguousarray(array).tobytes()).hexdigest()
+
+
+class SinogramPreprocessor:
+    """
+    Converts (u, v, angle) projections into the contiguous (v, angle, u)
+    sinogram stack the reconstruction reads, applying optional detector
+    corrections to the whole stack at once (each is a few array passes, not
+    a loop over slices or angles):
+    - uniformity: (u, v) flood / energy normalization map; counts are divided
+      by it (pixels with a non-positive value are treated as dead)
+    - dead_pixels: boolean (u, v) mask of dead detector pixels; they are
+      replaced by linear interpolation along u between the nearest live
+      pixels of the same row, in every angle
+    - cor_shift_bins: shift of every row along u in (fractional) bins, with
+      linear interpolation, e.g. to move a measured center of rotation onto
+      the detector center
+    Row binning to the reconstruction slices (geometry.axial_factor) happens
+    last, after the per-pixel corrections.
+    """
+    def __init__(self, uniformity=None, dead_pixels=None, cor_shift_bins=0.0):
+        self.uniformity = None if uniformity is None else np.asarray(uniformity, dtype=np.float32)
+        self.dead_pixels = None if dead_pixels is None else np.asarray(dead_pixels, dtype=bool)
+        if self.uniformity is not None and self.dead_pixels is not None and \
+                self.uniformity.shape != self.dead_pixels.shape:
+            raise ValueError(f"Uniformity map {self.uniformity.shape} and dead pixel mask "
+                             f"{self.dead_pixels.shape} differ in shape")
+        self.cor_shift_bins = float(cor_shift_bins)
+
+    def apply(self, projection_data, geometry=None):
+        """
+        projection_data: (u, v, angle) counts (or a scatter estimate of that shape)
+        geometry: ScanGeometry whose axial_factor detector rows are summed per slice
+        Returns: contiguous float32 (slice, angle, u) sinograms
+        """
+        u_dim, v_dim, _ = projection_data.shape
+        for name, detector_map in (('Uniformity map', self.uniformity), ('Dead pixel mask', self.dead_pixels)):
+            if detector_map is not None and detector_map.shape != (u_dim, v_dim):
+                raise ValueError(f"{name} shape {detector_map.shape} does not match detector {(u_dim, v_dim)}")
+
+        sinograms = to_sinograms(projection_data)
+        dead = self.dead_pixels
+        if self.uniformity is not None:
+            invalid = self.uniformity <= 0
+            dead = invalid if dead is None else dead | invalid
+            # Normalize first, so dead pixels are filled from normalized neighbours
+            gain = np.where(invalid, 1.0, self.uniformity).T
+            sinograms /= gain[:, None, :]
+        if dead is not None and dead.any():
+            self._interpolate_dead(sinograms, dead.T)
+        if self.cor_shift_bins:
+            sinograms = self._shift(sinograms, self.cor_shift_bins)
+
+        if geometry is not None and geometry.axial_factor > 1:
+            n_slices, n_angles = geometry.n_slices, sinograms.shape[1]
+            sinograms = sinograms.reshape(n_slices, geometry.axial_factor, n_angles, u_dim).sum(axis=1)
+        return sinograms
+
+    @staticmethod
+    def _interpolate_dead(sinograms, dead):
+        """
+        dead: (v, u) mask. Replaces the dead bins of every (v, angle) row in place.
+        """
+        n_u = dead.shape[1]
+        index = np.arange(n_u)
+        # Nearest live pixel at or left / right of each position (-1 / n_u: none)
+        left = np.maximum.accumulate(np.where(dead, -1, index), axis=1)
+        right = np.minimum.accumulate(np.where(dead, n_u, index)[:, ::-1], axis=1)[:, ::-1]
+
+        rows, cols = np.nonzero(dead)
+        lo, hi = left[rows, cols], right[rows, cols]
+        has_lo, has_hi = lo >= 0, hi < n_u
+        # Between two live pixels: linear weights; at an edge: copy the one neighbour
+        weight_hi = np.where(has_lo & has_hi, (cols - lo) / np.maximum(hi - lo, 1), (~has_lo).astype(np.float64))
+        lo = np.where(has_lo, lo, np.minimum(hi, n_u - 1))
+        hi = np.where(has_hi, hi, np.maximum(lo, 0))
+        weight_hi = weight_hi.astype(np.float32)[:, None]
+
+        values = (1 - weight_hi) * sinograms[rows, :, lo] + weight_hi * sinograms[rows, :, hi]
+        # Rows without any live pixel read nothing
+        values[~(has_lo | has_hi)] = 0
+        sinograms[rows, :, cols] = values
+
+    @staticmethod
+    def _shift(sinograms, shift_bins):
+        """
+        out[..., j] = in[..., j - shift_bins], linearly interpolated; bins
+        shifted in from outside the detector are 0.
+        """
+        n_u = sinograms.shape[-1]
+        source = np.arange(n_u) - shift_bins
+        lower = np.floor(source).astype(np.intp)
+        frac = (source - lower).astype(np.float32)
+        w_lower = np.where((lower >= 0) & (lower < n_u), 1 - frac, 0).astype(np.float32)
+        w_upper = np.where((lower + 1 >= 0) & (lower + 1 < n_u), frac, 0).astype(np.float32)
+        shifted = sinograms[..., np.clip(lower, 0, n_u - 1)] * w_lower
+        shifted += sinograms[..., np.clip(lower + 1, 0, n_u - 1)] * w_upper
+        return shifted
+
+    def key(self):
+        """
+        JSON-friendly identifier of the corrections (for cache keys).
+        """
+        return {
+            'uniformity': _array_key(self.uniformity),
+            'dead_pixels': _array_key(None if self.dead_pixels is None else np.packbits(self.dead_pixels)),
+            'dead_pixels_shape': None if self.dead_pixels is None else list(self.dead_pixels.shape),
+            'cor_shift_bins': self.cor_shift_bins,
+        }
+
+    def __repr__(self):
+        return (f"SinogramPreprocessor(uniformity={self.uniformity is not None}, "
+                f"dead_pixels={0 if self.dead_pixels is None else int(self.dead_pixels.sum())}, "
+                f"cor_shift_bins={self.cor_shift_bins})")
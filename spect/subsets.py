@@ -0,0 +1,155 @@
+import numpy as np
+
+ORDERINGS = ('sequential', 'bit_reversal', 'max_separation', 'random')
+
+
+def _bit_reversal_order(n):
+    """
+    0..n-1 in bit-reversed order (for n not a power of two, indices of the
+    next power of two that fall outside 0..n-1 are skipped).
+    """
+    n_bits = max(1, int(np.ceil(np.log2(n))))
+    order = [int(format(i, f"0{n_bits}b")[::-1], 2) for i in range(1 << n_bits)]
+    return np.array([i for i in order if i < n], dtype=np.intp)
+
+
+def _max_separation_order(n):
+    """
+    Greedy order: each next subset is the one farthest in angle from every
+    subset already visited (ties go to the one farthest from the last visited,
+    then to the lowest index). With round-robin
+    subsets, subset s is offset by s angle steps and the offsets wrap around
+    after n subsets, so distances are measured on a circle of n.
+    """
+    phases = np.arange(n)
+    order = [0]
+    min_dist = np.full(n, np.inf)
+    for _ in range(n - 1):
+        d = np.abs(phases - order[-1])
+        d = np.minimum(d, n - d)
+        min_dist = np.minimum(min_dist, d)
+        min_dist[order] = -1
+        order.append(int(np.argmax(min_dist * n + d)))
+    return np.array(order, dtype=np.intp)
+
+
+class SubsetPlanner:
+    """
+    Splits an orbit into OSEM subsets and chooses the order they are visited in.
+    Angles are dealt round-robin (subset s gets angles s, s + n_subsets, ...),
+    so each subset spans the whole orbit and, when n_subsets does not divide
+    n_angles, subset sizes differ by at most one angle.
+    Probe-aware plans (probe_idx given) deal each head's angles in turn, so
+    every subset gets a balanced share of every head, and order the angles of
+    a subset head by head: each head is then a contiguous block of rows that
+    can be projected independently (see head_blocks).
+    ordering:
+        'sequential'     - subsets 0, 1, 2, ... (the classic OSEM order)
+        'bit_reversal'   - subsets in bit-reversed index order
+        'max_separation' - each subset as far in angle as possible from those
+                           already visited
+        'random'         - a fresh random permutation every iteration, drawn
+                           from seed (see iteration_order)
+    """
+    def __init__(self, n_subsets, ordering='sequential', seed=None):
+        if ordering not in ORDERINGS:
+            raise ValueError(f"Unknown subset ordering '{ordering}', expected one of {ORDERINGS}")
+        if n_subsets < 1:
+            raise ValueError("n_subsets must be >= 1")
+        self.n_subsets = int(n_subsets)
+        self.ordering = ordering
+        self.seed = seed
+
+    def key(self):
+        """
+        Identifier of the plan (for cache and checkpoint keys).
+        """
+        seed = f":{self.seed}" if self.ordering == 'random' else ""
+        return f"{self.n_subsets}:{self.ordering}{seed}"
+
+    def subset_order(self):
+        """
+        Returns: subset indices in the order they are planned (and, except for
+            'random', visited in every iteration)
+        """
+        if self.ordering == 'sequential':
+            return np.arange(self.n_subsets)
+        if self.ordering == 'bit_reversal':
+            return _bit_reversal_order(self.n_subsets)
+        if self.ordering == 'random':
+            # Planned in index order; the visiting order changes per iteration
+            return np.arange(self.n_subsets)
+        return _max_separation_order(self.n_subsets)
+
+    def iteration_order(self, iteration):
+        """
+        Order the planned subsets (the entries of plan) are visited in during
+        the given iteration. Only 'random' differs from 0, 1, 2, ...: the k-th
+        permutation drawn from np.random.default_rng(seed), so a given
+        iteration always gets the same order (resumed runs match) while the
+        subset matrices and the data layout stay the same for all iterations.
+        """
+        if self.ordering != 'random':
+            return np.arange(self.n_subsets)
+        rng = np.random.default_rng(self.seed)
+        for _ in range(iteration):
+            rng.permutation(self.n_subsets)
+        return rng.permutation(self.n_subsets)
+
+    def plan(self, n_angles, probe_idx=None):
+        """
+        probe_idx: head of each angle (orbit 'probe_idx' column), or None
+        Returns: list of angle index arrays, one per subset, in subset_order
+        """
+        if self.n_subsets > n_angles:
+            raise ValueError(f"Cannot split {n_angles} angles into {self.n_subsets} subsets")
+        if probe_idx is None:
+            heads = [np.arange(n_angles)]
+        else:
+            probe_idx = np.asarray(probe_idx)
+            if len(probe_idx) != n_angles:
+                raise ValueError(f"probe_idx has {len(probe_idx)} entries for {n_angles} angles")
+            heads = [np.flatnonzero(probe_idx == p) for p in np.unique(probe_idx)]
+        # Each head continues dealing where the previous one stopped, which keeps
+        # the subset sizes within one angle of each other overall
+        offsets = np.concatenate([[0], np.cumsum([len(head) for head in heads])[:-1]]) % self.n_subsets
+        return [np.concatenate([head[(s - offset) % self.n_subsets::self.n_subsets]
+                                for head, offset in zip(heads, offsets)])
+                for s in self.subset_order()]
+
+    def angle_order(self, n_angles, probe_idx=None):
+        """
+        Returns: all angle indices, subset by subset in visiting order
+        """
+        return np.concatenate(self.plan(n_angles, probe_idx))
+
+    def plan_rows(self, n_angles, n_bins, probe_idx=None):
+        """
+        Rows of an angle-major system matrix (rows a*n_bins .. (a+1)*n_bins - 1
+        belong to angle a), regrouped subset by subset.
+        Returns: (row_order, boundaries) such that subset k (in visiting order)
+            is rows row_order[boundaries[k]:boundaries[k + 1]]
+        """
+        subsets = self.plan(n_angles, probe_idx)
+        angle_order = np.concatenate(subsets)
+        row_order = (angle_order[:, None] * n_bins + np.arange(n_bins)).ravel()
+        boundaries = np.concatenate([[0], np.cumsum([len(a) for a in subsets])]) * n_bins
+        return row_order, boundaries
+
+    def head_blocks(self, n_angles, n_bins, probe_idx):
+        """
+        Row ranges of each head within each subset of a probe-aware plan.
+        Returns: per subset (visiting order), a list of (start, stop) row
+            positions in the subset-ordered matrix, one per head present
+        """
+        probe_idx = np.asarray(probe_idx)
+        blocks = []
+        start = 0
+        for angles in self.plan(n_angles, probe_idx):
+            # Angles of a subset are grouped by head, so each head is one run
+            heads = probe_idx[angles]
+            cuts = np.flatnonzero(heads[1:] != heads[:-1]) + 1
+            edges = np.concatenate([[0], cuts, [len(angles)]]) * n_bins + start
+            blocks.append(list(zip(edges[:-1], edges[1:])))
+            start += len(angles) * n_bins
+        return blocks
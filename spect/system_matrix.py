@@ -1,68 +1,67 @@
+import hashlib
+import os
+from collections import OrderedDict
 import numpy as np
-from scipy.sparse import lil_matrix, csr_matrix
+from scipy.sparse import csr_matrix, load_npz, save_npz
 
 class SystemMatrix:
-    def __init__(self, image_size=128, detector_size=128, pixel_size=3.3):
+    def __init__(self, image_size=128, detector_size=128, pixel_size=3.3,
+                 detector_pixel_size=None, oversample=None):
+        """
+        image_size: recon grid is image_size x image_size pixels of pixel_size mm
+        detector_size: number of detector bins of detector_pixel_size mm
+            (defaults to pixel_size)
+        oversample: each pixel is sampled at oversample x oversample sub-pixel
+            points. Defaults to ceil(pixel_size / detector_pixel_size), so that a
+            grid coarser than the detector still spreads every pixel over all
+            the bins it covers.
+        """
         self.image_size = image_size
         self.detector_size = detector_size
         self.pixel_size = pixel_size
+        self.detector_pixel_size = detector_pixel_size if detector_pixel_size is not None else pixel_size
+        if oversample is None:
+            oversample = max(1, int(np.ceil(self.pixel_size / self.detector_pixel_size - 1e-6)))
+        self.oversample = oversample
         self.center_image = (image_size - 1) / 2.0
         self.center_detector = (detector_size - 1) / 2.0
 
-    def compute_matrix(self, angles_deg):
+    def compute_matrix(self, angles_deg, angle_order=None, bin_shift_mm=None):
         """
         Compute the system matrix H for a set of angles.
         H maps image (N*N) -> projections (M*A)
         Rows: A (angles) * M (detector bins)
         Cols: N * N (pixels)
+        angle_order: order of the per-angle row blocks (default: angle order).
+            With the angles of OSEM subset 0 first, then subset 1, ..., every
+            subset is a contiguous block of rows (see csr_row_block).
+        bin_shift_mm: per-angle lateral detector shift in mm (e.g. the
+            center-of-rotation offset of the head that acquired each angle)
         """
         n_angles = len(angles_deg)
+        block_position = np.arange(n_angles)
+        if angle_order is not None:
+            block_position[np.asarray(angle_order)] = np.arange(n_angles)
+        if bin_shift_mm is None:
+            bin_shift_mm = np.zeros(n_angles)
         n_pixels = self.image_size * self.image_size
         n_bins = self.detector_size * n_angles
         
-        H = lil_matrix((n_bins, n_pixels), dtype=np.float32)
-        
         # Precompute coordinates for all pixels
         # Image coordinates: x (col), y (row). Center at (0,0)
-        # Using meshgrid
         y_indices, x_indices = np.indices((self.image_size, self.image_size))
         
         # Flatten
         x_flat = (x_indices.flatten() - self.center_image) * self.pixel_size
         y_flat = (self.center_image - y_indices.flatten()) * self.pixel_size # y points up
+        pixels = np.arange(n_pixels)
+
+        # Sub-pixel sample offsets (a single centered sample when oversample == 1)
+        k = self.oversample
+        offsets = ((np.arange(k) + 0.5) / k - 0.5) * self.pixel_size
+        sample_weight = 1.0 / (k * k)
         
-        for i, angle in enumerate(angles_deg):
-            theta = np.radians(angle)
-            cos_t = np.cos(theta)
-            sin_t = np.sin(theta)
-            
-            # Radon transform: t = x * cos(theta) + y * sin(theta)
-            # This projects (x,y) onto the detector axis rotated by theta
-            t_positions = x_flat * cos_t + y_flat * sin_t
-            
-            # Convert physical position t to detector bin index
-            # Bin 0 is at -center * pixel_size
-            # index = (t / pixel_size) + center_detector
-            bin_indices_float = (t_positions / self.pixel_size) + self.center_detector
-            
-            # Linear Interpolation (distribute value to adjacent bins)
-            bin_lower = np.floor(bin_indices_float).astype(int)
-            bin_upper = bin_lower + 1
-            weight_upper = bin_indices_float - bin_lower
-            weight_lower = 1.0 - weight_upper
-            
-            # Valid bins
-            valid_mask = (bin_lower >= 0) & (bin_upper < self.detector_size)
-            
-            # Current projection row offset
-            row_offset = i * self.detector_size
-            
-            # We can vectorize the assignment to sparse matrix row-by-row or loop
-            # Since lil_matrix is slow with random access, but we are filling it systematically
-            # Actually, constructing COO format vectors directly is faster
-            pass
-            
-        # Re-implement using COO construction for speed
+        # COO construction: collect per-angle index/weight arrays, concatenate once
         rows = []
         cols = []
         data = []
@@ -71,44 +70,159 @@ class SystemMatrix:
             theta = np.radians(angle)
             cos_t = np.cos(theta)
             sin_t = np.sin(theta)
+            row_offset = block_position[i] * self.detector_size
             
-            t_positions = x_flat * cos_t + y_flat * sin_t
-            bin_indices_float = (t_positions / self.pixel_size) + self.center_detector
-            
-            bin_lower = np.floor(bin_indices_float).astype(int)
-            weight_upper = bin_indices_float - bin_lower
-            weight_lower = 1.0 - weight_upper
-            
-            # Filter valid
-            valid_lower = (bin_lower >= 0) & (bin_lower < self.detector_size)
-            valid_upper = ((bin_lower + 1) >= 0) & ((bin_lower + 1) < self.detector_size)
-            
-            # Row index in H (projection bin index)
-            # Base row for this angle is i * self.detector_size
-            
-            # Add lower bin contributions
-            current_pixels = np.where(valid_lower)[0]
-            if len(current_pixels) > 0:
-                current_bins = bin_lower[current_pixels] + i * self.detector_size
-                current_weights = weight_lower[current_pixels]
-                
-                rows.extend(current_bins)
-                cols.extend(current_pixels)
-                data.extend(current_weights)
-                
-            # Add upper bin contributions
-            current_pixels_upper = np.where(valid_upper)[0]
-            if len(current_pixels_upper) > 0:
-                current_bins = (bin_lower[current_pixels_upper] + 1) + i * self.detector_size
-                current_weights = weight_upper[current_pixels_upper]
-                
-                rows.extend(current_bins)
-                cols.extend(current_pixels_upper)
-                data.extend(current_weights)
-                
-        H = csr_matrix((data, (rows, cols)), shape=(n_bins, n_pixels), dtype=np.float32)
+            for dx in offsets:
+                for dy in offsets:
+                    # Radon transform: t = x * cos(theta) + y * sin(theta)
+                    # This projects (x,y) onto the detector axis rotated by theta
+                    t_positions = (x_flat + dx) * cos_t + (y_flat + dy) * sin_t
+                    
+                    # Convert physical position t to detector bin index
+                    # Bin 0 is at -center * detector_pixel_size
+                    bin_indices_float = ((t_positions - bin_shift_mm[i]) / self.detector_pixel_size) + self.center_detector
+                    
+                    # Linear Interpolation (distribute value to adjacent bins)
+                    bin_lower = np.floor(bin_indices_float).astype(int)
+                    weight_upper = bin_indices_float - bin_lower
+                    weight_lower = 1.0 - weight_upper
+                    
+                    # Add lower bin contributions
+                    valid_lower = (bin_lower >= 0) & (bin_lower < self.detector_size)
+                    rows.append(bin_lower[valid_lower] + row_offset)
+                    cols.append(pixels[valid_lower])
+                    data.append(weight_lower[valid_lower] * sample_weight)
+                    
+                    # Add upper bin contributions
+                    valid_upper = (bin_lower + 1 >= 0) & (bin_lower + 1 < self.detector_size)
+                    rows.append(bin_lower[valid_upper] + 1 + row_offset)
+                    cols.append(pixels[valid_upper])
+                    data.append(weight_upper[valid_upper] * sample_weight)
+        
+        # Duplicate (row, col) entries from different sub-pixel samples are summed
+        H = csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                       shape=(n_bins, n_pixels), dtype=np.float32)
         return H
 
+    def geometry_key(self, angles_deg, angle_order=None, bin_shift_mm=None):
+        """
+        Hash identifying the matrix produced for these angles (row block order
+        and detector shifts).
+        Studies with identical orbits and geometry share the same key.
+        """
+        h = hashlib.sha1()
+        h.update(f"{self.image_size}:{self.detector_size}:{self.pixel_size!r}:"
+                 f"{self.detector_pixel_size!r}:{self.oversample}".encode())
+        h.update(np.ascontiguousarray(angles_deg, dtype=np.float64).tobytes())
+        if angle_order is not None and np.any(np.asarray(angle_order) != np.arange(len(angles_deg))):
+            h.update(b"order:" + np.ascontiguousarray(angle_order, dtype=np.int64).tobytes())
+        if bin_shift_mm is not None and np.any(np.asarray(bin_shift_mm) != 0):
+            h.update(b"shift:" + np.ascontiguousarray(bin_shift_mm, dtype=np.float64).tobytes())
+        return h.hexdigest()
+
+
+class LRUCache:
+    """
+    Dict-like store holding at most maxsize entries; storing one more
+    evicts the least recently used. Long-running processes (batch workers,
+    the service) reuse one reconstructor for many studies, so per-study
+    entries must not accumulate.
+    on_evict: called with each evicted value, e.g. to release its resources
+    """
+    def __init__(self, maxsize, on_evict=None):
+        if maxsize < 1:
+            raise ValueError(f"LRU cache size must be at least 1, got {maxsize}")
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def __setitem__(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            _, evicted = self._entries.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(evicted)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def values(self):
+        return list(self._entries.values())
+
+    def clear(self):
+        self._entries.clear()
+
+
+def csr_row_block(H, start, stop):
+    """
+    Rows start..stop-1 of a CSR matrix as a view: the block shares H's data
+    and indices arrays instead of copying them as H[start:stop] would.
+    """
+    lo, hi = H.indptr[start], H.indptr[stop]
+    # The (data, indices, indptr) constructor prunes views of larger arrays
+    # into copies, so the arrays are attached to an empty block instead
+    block = csr_matrix((stop - start, H.shape[1]), dtype=H.dtype)
+    block.data = H.data[lo:hi]
+    block.indices = H.indices[lo:hi]
+    block.indptr = H.indptr[start:stop + 1] - lo
+    return block
+
+
+class SystemMatrixCache:
+    """
+    Memoizes system matrices by orbit (and detector shift), keeping the
+    max_matrices most recently used in memory.
+    With cache_dir set, matrices are also persisted as .npz files so that
+    other processes (batch workers) reuse them instead of recomputing.
+    """
+    def __init__(self, system_matrix=None, cache_dir=None, max_matrices=4):
+        self.sm = system_matrix if system_matrix is not None else SystemMatrix()
+        self.cache_dir = cache_dir
+        self.max_matrices = max_matrices
+        self._matrices = LRUCache(max_matrices)
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"H_{key}.npz")
+
+    def get(self, angles_deg, angle_order=None, bin_shift_mm=None):
+        """
+        Return the system matrix for angles_deg (rows in angle_order, detector
+        shifted by bin_shift_mm, see SystemMatrix.compute_matrix), computing it
+        at most once.
+        """
+        key = self.sm.geometry_key(angles_deg, angle_order, bin_shift_mm)
+        H = self._matrices.get(key)
+        if H is not None:
+            return H
+
+        if self.cache_dir is not None and os.path.exists(self.path_for(key)):
+            H = load_npz(self.path_for(key)).tocsr()
+        else:
+            H = self.sm.compute_matrix(angles_deg, angle_order, bin_shift_mm)
+            if self.cache_dir is not None:
+                self._save(key, H)
+
+        self._matrices[key] = H
+        return H
+
+    def _save(self, key, H):
+        # Write to a temporary file first so concurrent readers never see
+        # a partially written matrix.
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self.path_for(key)}.{os.getpid()}.tmp.npz"
+        save_npz(tmp_path, H)
+        os.replace(tmp_path, self.path_for(key))
+
 if __name__ == "__main__":
     # Basic Test
     sm = SystemMatrix()
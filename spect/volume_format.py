@@ -0,0 +1,255 @@
+import json
+import os
+import struct
+import time
+import zlib
+import numpy as np
+
+# File layout (little endian):
+#   prefix  : MAGIC (8 bytes) | version (uint32) | reserved (uint32)
+#             | header offset (uint64) | header length (uint64)
+#   chunks  : chunk 0, chunk 1, ... each holding `chunk_depth` slices of the
+#             last axis, stored slice-major (depth, *shape[:-1]) so a slice is
+#             contiguous after decoding
+#   header  : UTF-8 JSON with shape, dtype, voxel size, orbit, provenance and
+#             the chunk table [[offset, nbytes], ...]
+# The header is written last so chunks can be streamed; the prefix is patched
+# with its location at close. A chunk with nbytes == 0 is all zeros.
+MAGIC = b"SPECTVOL"
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct("<8sIIQQ")
+
+COMPRESSIONS = ('none', 'zlib')
+
+
+def is_volume_file(file_path):
+    """
+    True if file_path starts with the chunked volume magic.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _shuffle(raw, itemsize):
+    # Group the i-th byte of every element together; float data whose high
+    # bytes repeat compresses far better this way
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, itemsize).T.tobytes()
+
+
+def _unshuffle(raw, itemsize):
+    return np.frombuffer(raw, dtype=np.uint8).reshape(itemsize, -1).T.tobytes()
+
+
+def _orbit_to_json(orbit):
+    if orbit is None:
+        return None
+    if isinstance(orbit, np.ndarray) and orbit.dtype.names:
+        return {name: orbit[name].tolist() for name in orbit.dtype.names}
+    return {name: np.asarray(values).tolist() for name, values in dict(orbit).items()}
+
+
+class VolumeWriter:
+    """
+    Streams slices of the last axis into a chunked volume file.
+    Use write_volume() for whole arrays.
+    """
+    def __init__(self, file_path, shape, dtype=np.float32, chunk_depth=8,
+                 compression='zlib', level=1, shuffle=True,
+                 voxel_size_mm=None, orbit=None, provenance=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}', expected one of {COMPRESSIONS}")
+        if chunk_depth < 1:
+            raise ValueError("chunk_depth must be >= 1")
+
+        self.file_path = file_path
+        self.shape = tuple(int(d) for d in shape)
+        self.dtype = np.dtype(dtype)
+        self.chunk_depth = int(chunk_depth)
+        self.compression = compression
+        self.level = level
+        self.shuffle = bool(shuffle) and compression != 'none'
+        self.header = {
+            'format_version': FORMAT_VERSION,
+            'shape': list(self.shape),
+            'dtype': self.dtype.str,
+            'chunk_depth': self.chunk_depth,
+            'compression': compression,
+            'shuffle': self.shuffle,
+            'voxel_size_mm': voxel_size_mm,
+            'orbit': _orbit_to_json(orbit),
+            'provenance': dict(provenance or {}),
+        }
+        self.header['provenance'].setdefault('created', time.strftime("%Y-%m-%dT%H:%M:%S"))
+
+        self._chunks = []
+        self._pending = []
+        self._n_written = 0
+        self._file = open(file_path, 'wb')
+        self._file.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, 0, 0, 0))
+
+    def write_slices(self, slices):
+        """
+        Append slices; `slices` has shape (*shape[:-1], k).
+        """
+        slices = np.asarray(slices, dtype=self.dtype)
+        if slices.shape[:-1] != self.shape[:-1]:
+            raise ValueError(f"Slice shape {slices.shape[:-1]} does not match volume {self.shape[:-1]}")
+        if self._n_written + slices.shape[-1] > self.shape[-1]:
+            raise ValueError("More slices written than the volume holds")
+
+        for k in range(slices.shape[-1]):
+            self._pending.append(slices[..., k])
+            if len(self._pending) == self.chunk_depth:
+                self._flush_chunk()
+        self._n_written += slices.shape[-1]
+
+    def _flush_chunk(self):
+        chunk = np.ascontiguousarray(np.stack(self._pending, axis=0))
+        self._pending = []
+        offset = self._file.tell()
+        if not chunk.any():
+            self._chunks.append([offset, 0])
+            return
+
+        raw = chunk.tobytes()
+        if self.shuffle:
+            raw = _shuffle(raw, self.dtype.itemsize)
+        if self.compression == 'zlib':
+            raw = zlib.compress(raw, self.level)
+        self._file.write(raw)
+        self._chunks.append([offset, len(raw)])
+
+    def close(self):
+        if self._file is None:
+            return
+        if self._pending:
+            self._flush_chunk()
+        if self._n_written != self.shape[-1]:
+            self._file.close()
+            self._file = None
+            os.remove(self.file_path)
+            raise ValueError(f"Volume incomplete: {self._n_written}/{self.shape[-1]} slices written")
+
+        self.header['chunks'] = self._chunks
+        header_bytes = json.dumps(self.header).encode('utf-8')
+        header_offset = self._file.tell()
+        self._file.write(header_bytes)
+        self._file.seek(0)
+        self._file.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, 0, header_offset, len(header_bytes)))
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self.file_path)
+
+
+def write_volume(file_path, volume, **kwargs):
+    """
+    Write a whole volume (last axis chunked) to a chunked volume file.
+    kwargs: chunk_depth, compression, level, shuffle, voxel_size_mm, orbit, provenance
+    """
+    with VolumeWriter(file_path, volume.shape, dtype=volume.dtype, **kwargs) as writer:
+        writer.write_slices(volume)
+
+
+class VolumeFile:
+    """
+    Random-access reader for chunked volume files.
+    Reading a slice decodes only the chunk that holds it.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        try:
+            magic, version, _, header_offset, header_len = _PREFIX.unpack(self._file.read(_PREFIX.size))
+            if magic != MAGIC:
+                raise ValueError(f"Not a chunked volume file: {file_path}")
+            if version > FORMAT_VERSION:
+                raise ValueError(f"Unsupported volume format version {version}")
+            if header_offset == 0:
+                raise ValueError(f"Volume file was not closed properly: {file_path}")
+            self._file.seek(header_offset)
+            self.header = json.loads(self._file.read(header_len).decode('utf-8'))
+        except Exception:
+            self._file.close()
+            raise
+
+        self.shape = tuple(self.header['shape'])
+        self.dtype = np.dtype(self.header['dtype'])
+        self.chunk_depth = self.header['chunk_depth']
+        self._chunk_shape = self.shape[:-1]
+
+    @property
+    def voxel_size_mm(self):
+        return self.header.get('voxel_size_mm')
+
+    @property
+    def orbit(self):
+        return self.header.get('orbit')
+
+    @property
+    def provenance(self):
+        return self.header.get('provenance', {})
+
+    def _read_chunk(self, c):
+        offset, nbytes = self.header['chunks'][c]
+        depth = min(self.chunk_depth, self.shape[-1] - c * self.chunk_depth)
+        if nbytes == 0:
+            return np.zeros((depth,) + self._chunk_shape, dtype=self.dtype)
+        self._file.seek(offset)
+        raw = self._file.read(nbytes)
+        if self.header['compression'] == 'zlib':
+            raw = zlib.decompress(raw)
+        if self.header['shuffle']:
+            raw = _unshuffle(raw, self.dtype.itemsize)
+        return np.frombuffer(raw, dtype=self.dtype).reshape((depth,) + self._chunk_shape)
+
+    def read_slice(self, index):
+        """
+        Returns: slice `index` of the last axis, shape shape[:-1]
+        """
+        n = self.shape[-1]
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError(f"Slice {index} out of range for {n} slices")
+        return self._read_chunk(index // self.chunk_depth)[index % self.chunk_depth].copy()
+
+    def read_slices(self, start, stop):
+        """
+        Returns: slices start..stop-1 of the last axis, shape (*shape[:-1], stop - start)
+        """
+        start, stop, _ = slice(start, stop).indices(self.shape[-1])
+        out = np.empty(self._chunk_shape + (max(stop - start, 0),), dtype=self.dtype)
+        for c in range(start // self.chunk_depth, (stop - 1) // self.chunk_depth + 1 if stop > start else 0):
+            chunk = self._read_chunk(c)
+            z0 = c * self.chunk_depth
+            lo, hi = max(start, z0), min(stop, z0 + chunk.shape[0])
+            out[..., lo - start:hi - start] = np.moveaxis(chunk[lo - z0:hi - z0], 0, -1)
+        return out
+
+    def read(self):
+        """
+        Returns: the whole volume
+        """
+        return self.read_slices(0, self.shape[-1])
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
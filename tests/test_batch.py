@@ -0,0 +1,149 @@
+import unittest
+import numpy as np
+import os
+import sys
+import csv
+import json
+import shutil
+import tempfile
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect import BatchRunner, SystemMatrix, SystemMatrixCache, load_manifest
+from spect import batch
+from spect.batch import run_study
+from spect.geometry import ScanGeometry
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.orbit_path = os.path.join(base_dir, "data", "input", "orbit.xlsx")
+
+        # Synthetic projection: a uniform cylinder seen from every angle
+        proj = np.zeros((128, 128, 64), dtype=np.float32)
+        proj[54:74, 40:88, :] = 5.0
+        proj.tofile(os.path.join(self.tmp_dir, "Proj.dat"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_manifest(self, rows):
+        path = os.path.join(self.tmp_dir, "manifest.csv")
+        with open(path, "w", newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def test_load_manifest(self):
+        path = self.write_manifest([
+            {'study_id': 'a', 'projection': 'Proj.dat', 'orbit': self.orbit_path},
+        ])
+        studies = load_manifest(path)
+        self.assertEqual(len(studies), 1)
+        self.assertEqual(studies[0].projection, os.path.join(self.tmp_dir, "Proj.dat"))
+        self.assertIsNone(studies[0].reference)
+
+        dup = self.write_manifest([
+            {'study_id': 'a', 'projection': 'Proj.dat', 'orbit': self.orbit_path},
+            {'study_id': 'a', 'projection': 'Proj.dat', 'orbit': self.orbit_path},
+        ])
+        with self.assertRaises(ValueError):
+            load_manifest(dup)
+
+        # Optional per-study center-of-rotation offset
+        cor = self.write_manifest([
+            {'study_id': 'a', 'projection': 'Proj.dat', 'orbit': self.orbit_path, 'cor_offset_mm': '1.5'},
+            {'study_id': 'b', 'projection': 'Proj.dat', 'orbit': self.orbit_path, 'cor_offset_mm': ''},
+        ])
+        self.assertEqual([study.cor_offset_mm for study in load_manifest(cor)], [1.5, None])
+
+    def test_matrix_cache_persists(self):
+        cache_dir = os.path.join(self.tmp_dir, "cache")
+        angles = np.linspace(0, 180, 16, endpoint=False)
+        sm = SystemMatrix(image_size=32, detector_size=32)
+        H = SystemMatrixCache(sm, cache_dir=cache_dir).get(angles)
+
+        # A fresh cache (e.g. in another process) loads the same matrix from disk
+        fresh = SystemMatrixCache(SystemMatrix(image_size=32, detector_size=32), cache_dir=cache_dir)
+        self.assertTrue(os.path.exists(fresh.path_for(sm.geometry_key(angles))))
+        self.assertEqual((fresh.get(angles) != H).nnz, 0)
+
+        # A different orbit gets a different key
+        self.assertNotEqual(sm.geometry_key(angles), sm.geometry_key(angles + 1.0))
+
+    def test_auto_cor_is_not_prewarmed(self):
+        studies = load_manifest(self.write_manifest([
+            {'study_id': 'a', 'projection': 'Proj.dat', 'orbit': self.orbit_path, 'cor_offset_mm': ''},
+            {'study_id': 'b', 'projection': 'Proj.dat', 'orbit': self.orbit_path, 'cor_offset_mm': '1.5'},
+        ]))
+        runner = BatchRunner(os.path.join(self.tmp_dir, "out"), n_workers=1, cor='auto')
+        # Only the study with a known offset has a matrix to compute up front
+        self.assertEqual(list(runner.warm_matrix_cache(studies).values()), [['b']])
+
+    def test_worker_reconstructors_are_shared(self):
+        geometry = ScanGeometry(n_bins=32, n_rows=32, n_angles=16)
+        cache_dir = os.path.join(self.tmp_dir, "cache")
+        stage_dir = os.path.join(self.tmp_dir, "stages")
+        self.addCleanup(batch.close_pipelines)
+
+        # Settings downstream of the reconstruction reuse the same reconstructor
+        a = batch._get_pipeline(stage_dir, cache_dir, 4, 2, 5.0, 3.3, geometry)
+        b = batch._get_pipeline(stage_dir, cache_dir, 4, 2, 8.0, 3.3, geometry, cor=1.5, qc=False)
+        self.assertIsNot(a, b)
+        self.assertIs(a.reconstructor, b.reconstructor)
+        self.assertEqual(a.cor_offset_mm, 0.0)
+        self.assertEqual(b.cor_offset_mm, 1.5)
+
+        # Other reconstruction parameters share the matrix cache only
+        c = batch._get_pipeline(stage_dir, cache_dir, 8, 2, 5.0, 3.3, geometry)
+        self.assertIsNot(c.reconstructor, a.reconstructor)
+        self.assertIs(c.reconstructor.matrix_cache, a.reconstructor.matrix_cache)
+
+        # The cache is bounded and closes what it evicts
+        closed = []
+        a.reconstructor.close = lambda: closed.append(a.reconstructor)
+        for n_iterations in range(3, 3 + batch.MAX_WORKER_RECONSTRUCTORS):
+            batch._get_pipeline(stage_dir, cache_dir, 4, n_iterations, 5.0, 3.3, geometry)
+        self.assertEqual(len(batch._worker_reconstructors), batch.MAX_WORKER_RECONSTRUCTORS)
+        self.assertEqual(closed, [a.reconstructor])
+
+    def test_run_batch(self):
+        path = self.write_manifest([
+            {'study_id': 'a', 'projection': 'Proj.dat', 'orbit': self.orbit_path},
+            {'study_id': 'b', 'projection': 'Proj.dat', 'orbit': self.orbit_path},
+            {'study_id': 'missing', 'projection': 'Nope.dat', 'orbit': self.orbit_path},
+        ])
+        output_dir = os.path.join(self.tmp_dir, "out")
+        runner = BatchRunner(output_dir, n_workers=1, n_subsets=4, n_iterations=1,
+                             subset_ordering='random', subset_seed=3)
+        rows = runner.run(load_manifest(path))
+
+        self.assertEqual([r['status'] for r in rows], ['ok', 'ok', 'failed'])
+        # Both studies share one orbit, so only one matrix was cached
+        self.assertEqual(len(os.listdir(runner.cache_dir)), 1)
+
+        recon = np.fromfile(os.path.join(output_dir, "a", "MyRecon.dat"), dtype=np.float32)
+        self.assertEqual(recon.size, 128 ** 3)
+        with open(os.path.join(output_dir, "a", "metrics.json")) as f:
+            parameters = json.load(f)['parameters']
+        self.assertEqual(parameters['n_iterations'], 1)
+        self.assertEqual((parameters['subset_ordering'], parameters['subset_seed']), ('random', 3))
+        with open(os.path.join(output_dir, "summary.csv")) as f:
+            self.assertEqual(len(list(csv.DictReader(f))), 3)
+
+    def test_svol_outputs(self):
+        study = load_manifest(self.write_manifest([
+            {'study_id': 'a', 'projection': 'Proj.dat', 'orbit': self.orbit_path},
+        ]))[0]
+        output_dir = os.path.join(self.tmp_dir, "out")
+        row = run_study(study, output_dir, n_subsets=4, n_iterations=1, checkpoint=False, output_format='svol')
+        self.assertEqual(row['status'], 'ok', row.get('error'))
+        self.assertEqual(sorted(os.listdir(os.path.join(output_dir, "a"))),
+                         ['MyFiltered.preview.npz', 'MyFiltered.svol', 'MyRecon.preview.npz', 'MyRecon.svol',
+                          'metrics.json'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import numpy as np
+import os
+import sys
+import shutil
+import tempfile
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect import OSEMReconstructor, Pipeline, ScanGeometry, SPECTDataLoader, SystemMatrixCache
+from spect.cor import estimate_cor, opposing_pairs
+
+class TestCorEstimation(unittest.TestCase):
+    def setUp(self):
+        self.geometry = ScanGeometry(n_bins=64, n_rows=4, n_angles=64, bin_size_mm=2.0, recon_size=64)
+        self.image = np.zeros((4, 64, 64), dtype=np.float32)
+        self.image[:, 20:30, 35:45] = 1.0
+        self.image[:, 40:44, 18:26] = 3.0
+
+    def project(self, angles, cor_offset_mm):
+        reconstructor = OSEMReconstructor(geometry=self.geometry, cor_offset_mm=cor_offset_mm, verbose=False)
+        return reconstructor.forward_project(self.image, angles)
+
+    def test_opposing_pairs(self):
+        first, second = opposing_pairs(np.arange(8) * 45.0)
+        np.testing.assert_array_equal(first, [0, 1, 2, 3])
+        np.testing.assert_array_equal(second, [4, 5, 6, 7])
+        self.assertEqual(len(opposing_pairs(np.arange(8) * 22.5)[0]), 0)
+
+    def test_xcorr_recovers_offset(self):
+        angles = np.arange(64) * 5.625
+        for offset_bins in (0.0, 3.0, -5.3):
+            estimate = estimate_cor(self.project(angles, 2.0 * offset_bins), angles, detector_pixel_size_mm=2.0)
+            self.assertEqual(estimate['method'], 'xcorr')
+            self.assertEqual(estimate['n_pairs'], 32)
+            self.assertAlmostEqual(estimate['offset_bins'], offset_bins, delta=0.05)
+            self.assertAlmostEqual(estimate['offset_mm'], 2.0 * offset_bins, delta=0.1)
+
+    def test_half_orbit_uses_centroid(self):
+        # 180 degree orbit: no opposing views
+        angles = 45 + np.arange(32) * 5.625
+        sinograms = self.project(angles, -7.0)
+        estimate = estimate_cor(sinograms, angles)
+        self.assertEqual(estimate['method'], 'centroid')
+        self.assertAlmostEqual(estimate['offset_bins'], -3.5, delta=0.05)
+        self.assertIsNone(estimate['offset_mm'])
+        with self.assertRaises(ValueError):
+            estimate_cor(sinograms, angles, method='xcorr')
+
+    def test_projector_honors_offset(self):
+        angles = np.arange(8) * 45.0
+        centered = self.project(angles, 0.0)
+        shifted = self.project(angles, 2 * 2.0)
+        np.testing.assert_allclose(shifted[..., 2:], centered[..., :-2], atol=1e-5)
+
+    def test_per_offset_matrices_bounded(self):
+        # Every estimated offset needs its own matrix; only the most recent stay in memory
+        cache = SystemMatrixCache(self.geometry.system_matrix(), max_matrices=2)
+        reconstructor = OSEMReconstructor(n_subsets=4, n_iterations=2, matrix_cache=cache, geometry=self.geometry,
+                                          resolution_schedule=[(32, 1)], support='fov', verbose=False)
+        angles = np.arange(16) * 22.5
+        for offset_mm in (0.0, 2.0, 4.0, 6.0):
+            reconstructor.cor_offset_mm = offset_mm
+            reconstructor.reconstruct_sinograms(self.project(angles, offset_mm), angles)
+            self.assertLessEqual(len(cache._matrices), 2)
+            self.assertLessEqual(len(reconstructor.level_cache(32)._matrices), 2)
+            self.assertLessEqual(len(reconstructor._fov_masks), reconstructor._subset_systems.maxsize)
+
+class TestPipelineCor(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.orbit_path = os.path.join(base_dir, "data", "input", "orbit.xlsx")
+        self.geometry = ScanGeometry(n_bins=32, n_rows=2, n_angles=64, bin_size_mm=4.0, recon_size=32)
+        angles = SPECTDataLoader().load_orbit_array(self.orbit_path)['angle']
+        image = np.zeros((2, 32, 32), dtype=np.float32)
+        image[:, 10:16, 18:22] = 10.0
+        reconstructor = OSEMReconstructor(geometry=self.geometry, cor_offset_mm=6.0, verbose=False)
+        # (slice, angle, u) -> (u, v, angle) projection file
+        self.proj_path = os.path.join(self.tmp_dir, "Proj.dat")
+        np.ascontiguousarray(reconstructor.forward_project(image, angles).transpose(2, 0, 1)).tofile(self.proj_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_auto_cor_stage(self):
+        def run(**kwargs):
+            reconstructor = OSEMReconstructor(n_subsets=4, n_iterations=1, geometry=self.geometry, verbose=False)
+            pipeline = Pipeline(os.path.join(self.tmp_dir, "cache"), reconstructor=reconstructor, cor='auto')
+            result = pipeline.run(self.proj_path, self.orbit_path, **kwargs)
+            return result, {stage: hit for stage, _, hit in pipeline.stage_log}
+
+        result, hits = run()
+        self.assertEqual(hits['cor'], False)
+        self.assertAlmostEqual(result['cor_offset_mm'], 6.0, delta=0.2)
+        again, hits = run()
+        self.assertTrue(all(hits.values()))
+        self.assertEqual(again['cor_offset_mm'], result['cor_offset_mm'])
+
+        # A study's own offset skips the estimate
+        manual, hits = run(cor_offset_mm=0.0)
+        self.assertNotIn('cor', hits)
+        self.assertFalse(hits['reconstruct'])
+        self.assertEqual(manual['cor_offset_mm'], 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,9 @@ import unittest
 import numpy as np
 import os
 import sys
+import shutil
+import tempfile
+import pandas as pd
 
 # 添加项目根目录到路径，以便导入模块
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -32,6 +35,51 @@ class TestSPECTDataLoader(unittest.TestCase):
         print(f"\nOrbit Data: Angle Range=[{df['angle'].min()}, {df['angle'].max()}]")
         print(f"Orbit Data: Radius Range=[{df['radius'].min()}, {df['radius'].max()}]")
 
+    def test_load_orbit_array_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            orbit_path = os.path.join(tmp_dir, "orbit.xlsx")
+            shutil.copy(self.orbit_path, orbit_path)
+
+            orbit = self.loader.load_orbit_array(orbit_path)
+            self.assertEqual(len(orbit), 64)
+            self.assertTrue(os.path.exists(orbit_path + ".orbit-cache.npz"))
+            np.testing.assert_array_equal(orbit['angle'], self.loader.load_orbit(orbit_path)['angle'].values)
+
+            # A valid cache is used without touching the Excel parser
+            original_read_excel = pd.read_excel
+            pd.read_excel = None
+            try:
+                cached = self.loader.load_orbit_array(orbit_path)
+            finally:
+                pd.read_excel = original_read_excel
+            np.testing.assert_array_equal(cached, orbit)
+
+            # Replacing the Excel file invalidates the cache
+            df = pd.read_excel(orbit_path)
+            df.iloc[:, 1] += 1.0
+            df.to_excel(orbit_path, index=False)
+            updated = self.loader.load_orbit_array(orbit_path)
+            np.testing.assert_allclose(updated['angle'], orbit['angle'] + 1.0)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_load_orbit_schema(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            bad_path = os.path.join(tmp_dir, "bad.xlsx")
+            pd.DataFrame({'index': [0, 1], 'angle': [0.0, 90.0], 'probe_idx': [1, 1]}).to_excel(bad_path, index=False)
+            with self.assertRaises(RuntimeError):
+                self.loader.load_orbit_array(bad_path)
+
+            bad_path = os.path.join(tmp_dir, "negative_radius.xlsx")
+            pd.DataFrame({'index': [0, 1], 'angle': [0.0, 90.0], 'radius': [200.0, -1.0],
+                          'probe_idx': [1, 2]}).to_excel(bad_path, index=False)
+            with self.assertRaises(RuntimeError):
+                self.loader.load_orbit_array(bad_path)
+        finally:
+            shutil.rmtree(tmp_dir)
+
     def test_load_volume(self):
         data = self.loader.load_volume(self.recon_path)
         self.assertEqual(data.shape, (128, 128, 128))
@@ -0,0 +1,83 @@
+import unittest
+import numpy as np
+import os
+import sys
+import io
+import json
+import shutil
+import tempfile
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect import OSEMReconstructor, ScanGeometry
+from spect.events import EventEmitter, JsonLinesSink, console_listener
+
+class TestEventEmitter(unittest.TestCase):
+    def test_subscriptions(self):
+        events = EventEmitter()
+        self.assertFalse(events.wants('slice_finished'))
+        events.emit('slice_finished', slice=0)
+
+        received, filtered = [], []
+        events.subscribe(received.append)
+        listener = events.subscribe(filtered.append, ['slice_finished'])
+        self.assertTrue(events.wants('iteration_finished'))
+        events.emit('slice_started', slice=1)
+        events.emit('slice_finished', slice=1)
+        self.assertEqual([r['event'] for r in received], ['slice_started', 'slice_finished'])
+        self.assertEqual([r['event'] for r in filtered], ['slice_finished'])
+        self.assertIn('time', filtered[0])
+
+        events.unsubscribe(listener)
+        events.unsubscribe(received.append)
+        self.assertFalse(events.wants('slice_finished'))
+
+    def test_console_listener(self):
+        stream = io.StringIO()
+        console_listener({'event': 'slice_started', 'slice': 10, 'n_slices': 64}, stream)
+        console_listener({'event': 'slice_started', 'slice': 11, 'n_slices': 64}, stream)
+        console_listener({'event': 'volume_finished', 'elapsed_s': 1.5}, stream)
+        self.assertEqual(stream.getvalue(), "Reconstructing slice 10/64...\nReconstruction complete in 1.50 seconds.\n")
+
+
+class TestReconstructionEvents(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.geometry = ScanGeometry(n_bins=32, n_rows=3, n_angles=16)
+        self.angles = np.linspace(0, 360, 16, endpoint=False)
+        phantom = np.zeros((32, 32), dtype=np.float32)
+        phantom[10:22, 12:20] = 1.0
+        sinogram = self.geometry.system_matrix().compute_matrix(self.angles).dot(phantom.flatten())
+        self.proj = np.repeat(sinogram.reshape((16, 32)).T[:, None, :], 3, axis=1).astype(np.float32)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_progress_events(self):
+        recon = OSEMReconstructor(n_subsets=4, n_iterations=3, geometry=self.geometry, verbose=False)
+        path = os.path.join(self.tmp_dir, "events.jsonl")
+        with JsonLinesSink(path, study_id='s1') as sink:
+            recon.events.subscribe(sink)
+            volume = recon.reconstruct_volume(self.proj, self.angles)
+        records = [json.loads(line) for line in open(path)]
+        self.assertTrue(all(r['study_id'] == 's1' for r in records))
+        names = [r['event'] for r in records]
+        self.assertEqual(names[0], 'volume_started')
+        self.assertEqual(names[-1], 'volume_finished')
+        self.assertEqual(names.count('slice_finished'), 3)
+        self.assertEqual(names.count('iteration_finished'), 9)
+
+        # OSEM increases the likelihood; the ETA counts down to zero
+        likelihood = [r['log_likelihood'] for r in records if r['event'] == 'iteration_finished' and r['slice'] == 0]
+        self.assertTrue(np.all(np.diff(likelihood) > 0))
+        finished = [r for r in records if r['event'] == 'slice_finished']
+        self.assertEqual([r['n_done'] for r in finished], [1, 2, 3])
+        self.assertEqual(finished[-1]['eta_s'], 0)
+
+        # Listening does not change the result
+        quiet = OSEMReconstructor(n_subsets=4, n_iterations=3, geometry=self.geometry, verbose=False)
+        np.testing.assert_array_equal(quiet.reconstruct_volume(self.proj, self.angles), volume)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import numpy as np
+import os
+import sys
+import shutil
+import tempfile
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect import OSEMReconstructor, ScanGeometry, SPECTDataLoader, SystemMatrix
+
+class TestGeometry(unittest.TestCase):
+    def setUp(self):
+        # Small detector: 64 bins x 8 rows x 32 angles
+        self.geometry = ScanGeometry(n_bins=64, n_rows=8, n_angles=32, bin_size_mm=3.3)
+        self.angles = np.linspace(0, 180, 32, endpoint=False)
+
+        phantom = np.zeros((64, 64), dtype=np.float32)
+        phantom[24:40, 20:36] = 5.0
+        self.phantom = phantom
+        sinogram = SystemMatrix(image_size=64, detector_size=64).compute_matrix(self.angles).dot(phantom.flatten())
+        # (u, v, angle): the same slice on every row
+        self.proj = np.repeat(sinogram.reshape(32, 64).T[:, None, :], 8, axis=1).astype(np.float32)
+
+    def test_defaults_and_resizing(self):
+        default = ScanGeometry()
+        self.assertEqual(default.proj_dim, (128, 128, 64))
+        self.assertEqual(default.recon_dim, (128, 128, 128))
+
+        preview = default.with_recon_size(64, n_slices=64)
+        self.assertEqual(preview.recon_dim, (64, 64, 64))
+        self.assertAlmostEqual(preview.voxel_size_mm, 6.6)
+        self.assertEqual(preview.axial_factor, 2)
+        self.assertAlmostEqual(default.with_recon_size(256).voxel_size_mm, 1.65)
+
+        with self.assertRaises(ValueError):
+            ScanGeometry(n_rows=128, n_slices=48)
+
+    def test_coarse_reconstruction(self):
+        coarse = self.geometry.with_recon_size(32, n_slices=4)
+        recon = OSEMReconstructor(n_subsets=4, n_iterations=4, geometry=coarse)
+        volume = recon.reconstruct_volume(self.proj, self.angles)
+        self.assertEqual(volume.shape, (32, 32, 4))
+
+        # Each coarse voxel holds 2x2 fine pixels and 2 detector rows
+        self.assertAlmostEqual(volume[:, :, 0].sum(), 2 * self.phantom.sum(), delta=0.1 * 2 * self.phantom.sum())
+        center = volume[12:20, 10:18, 0].mean()
+        self.assertGreater(center, 10 * volume[:4, :4, 0].mean())
+
+    def test_fine_reconstruction(self):
+        fine = self.geometry.with_recon_size(128)
+        recon = OSEMReconstructor(n_subsets=4, n_iterations=2, geometry=fine)
+        # Axial rows must match the geometry
+        with self.assertRaises(ValueError):
+            recon.reconstruct_volume(self.proj[:, :2, :], self.angles)
+        volume = recon.reconstruct_volume(self.proj, self.angles)
+        self.assertEqual(volume.shape, (128, 128, 8))
+        self.assertAlmostEqual(volume[:, :, 0].sum(), self.phantom.sum(), delta=0.1 * self.phantom.sum())
+
+    def test_loader_uses_geometry(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "Proj.dat")
+            self.proj.tofile(path)
+            loader = SPECTDataLoader(self.geometry)
+            np.testing.assert_array_equal(loader.load_projection(path), self.proj)
+            with self.assertRaises(RuntimeError):
+                SPECTDataLoader().load_projection(path)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+if __name__ == "__main__":
+    unittest.main()
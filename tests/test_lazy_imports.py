@@ -0,0 +1,48 @@
+import unittest
+import json
+import os
+import subprocess
+import sys
+
+# 项目根目录（tests 的父目录）
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['pandas', 'openpyxl', 'skimage', 'scipy.sparse', 'scipy.ndimage']
+
+def loaded_modules(code):
+    """
+    Run code in a fresh interpreter and return which heavy modules it imported.
+    """
+    script = (
+        f"import sys, json\n{code}\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    output = subprocess.check_output([sys.executable, "-c", script], cwd=BASE_DIR, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+class TestLazyImports(unittest.TestCase):
+    def test_import_package_is_light(self):
+        self.assertEqual(loaded_modules("import spect"), [])
+
+    def test_loader_does_not_need_pandas(self):
+        self.assertEqual(loaded_modules("from spect import SPECTDataLoader\nSPECTDataLoader()"), [])
+
+    def test_evaluator_defers_skimage(self):
+        code = (
+            "import numpy as np\n"
+            "from spect import Evaluator\n"
+            "Evaluator.calculate_rmse(np.zeros(4), np.ones(4))"
+        )
+        self.assertEqual(loaded_modules(code), [])
+        self.assertIn('skimage', loaded_modules(
+            code + "\nEvaluator.calculate_ssim(np.random.rand(16, 16), np.random.rand(16, 16))"))
+
+    def test_public_names_resolve(self):
+        import spect
+        for name in spect.__all__:
+            self.assertTrue(hasattr(spect, name), name)
+        with self.assertRaises(AttributeError):
+            spect.does_not_exist
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+import numpy as np
+import os
+import sys
+import shutil
+import tempfile
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect import OSEMReconstructor, Pipeline, StageCache
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.orbit_path = os.path.join(base_dir, "data", "input", "orbit.xlsx")
+        self.proj_path = os.path.join(self.tmp_dir, "Proj.dat")
+        proj = np.zeros((128, 128, 64), dtype=np.float32)
+        proj[54:74, 40:88, :] = 5.0
+        proj.tofile(self.proj_path)
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+        # Share one reconstructor so the system matrix is only computed once
+        self.reconstructor = OSEMReconstructor(n_subsets=4, n_iterations=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_pipeline(self, fwhm_mm=10.0):
+        pipeline = Pipeline(self.cache_dir, fwhm_mm=fwhm_mm, reconstructor=self.reconstructor)
+        result = pipeline.run(self.proj_path, self.orbit_path, reference_path=self.proj_path.replace("Proj", "Ref"))
+        return result, {stage: hit for stage, _, hit in pipeline.stage_log}
+
+    def test_downstream_change_reuses_upstream(self):
+        # Reference volume for the evaluate stage
+        np.ones((128, 128, 128), dtype=np.float32).tofile(os.path.join(self.tmp_dir, "Ref.dat"))
+
+        first, hits = self.run_pipeline()
+        self.assertFalse(any(hits.values()))
+        self.assertIn('rmse_recon', first['metrics'])
+
+        again, hits = self.run_pipeline()
+        self.assertTrue(all(hits.values()))
+        np.testing.assert_array_equal(again['filtered'], first['filtered'])
+        self.assertEqual(again['metrics'], first['metrics'])
+
+        # Only the filter (and the evaluation that depends on it) rerun
+        refiltered, hits = self.run_pipeline(fwhm_mm=6.0)
+        self.assertEqual(hits, {'load': True, 'preprocess': True, 'reconstruct': True, 'filter': False,
+                                'preview': False, 'evaluate': False})
+        np.testing.assert_array_equal(refiltered['recon'], first['recon'])
+        self.assertFalse(np.array_equal(refiltered['filtered'], first['filtered']))
+
+    def test_run_async_matches_run(self):
+        ref_path = os.path.join(self.tmp_dir, "Ref.dat")
+        np.ones((128, 128, 128), dtype=np.float32).tofile(ref_path)
+        outputs = {'recon': os.path.join(self.tmp_dir, "MyRecon.dat"),
+                   'filtered': os.path.join(self.tmp_dir, "MyFiltered.dat")}
+        pipeline = Pipeline(self.cache_dir, reconstructor=self.reconstructor)
+        result = asyncio.run(pipeline.run_async(self.proj_path, self.orbit_path, reference_path=ref_path,
+                                                reference_filtered_path=ref_path, output_paths=outputs))
+        self.assertFalse(any(hit for _, _, hit in pipeline.stage_log))
+        self.assertEqual(set(result['metrics']), {'rmse_recon', 'ssim_recon', 'rmse_filtered', 'ssim_filtered'})
+        np.testing.assert_array_equal(np.fromfile(outputs['recon'], dtype=np.float32), result['recon'].ravel())
+        np.testing.assert_array_equal(np.fromfile(outputs['filtered'], dtype=np.float32), result['filtered'].ravel())
+
+        # Same stages and keys as the synchronous run, which now hits the cache
+        again = pipeline.run(self.proj_path, self.orbit_path, reference_path=ref_path,
+                             reference_filtered_path=ref_path)
+        self.assertTrue(all(hit for _, _, hit in pipeline.stage_log))
+        self.assertEqual(again['keys'], result['keys'])
+        self.assertEqual(again['metrics'], result['metrics'])
+
+    def test_key_depends_on_inputs(self):
+        key = StageCache.make_key('reconstruct', {'n_subsets': 4, 'angles': np.arange(3.0)})
+        self.assertEqual(key, StageCache.make_key('reconstruct', {'angles': np.arange(3.0), 'n_subsets': 4}))
+        self.assertNotEqual(key, StageCache.make_key('reconstruct', {'n_subsets': 8, 'angles': np.arange(3.0)}))
+        self.assertNotEqual(key, StageCache.make_key('filter', {'n_subsets': 4, 'angles': np.arange(3.0)}))
+
+if __name__ == "__main__":
+    unittest.main()
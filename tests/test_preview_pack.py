@@ -0,0 +1,49 @@
+import unittest
+import numpy as np
+import os
+import sys
+import shutil
+import tempfile
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect.preview_pack import PreviewPack, preview_path
+
+class TestPreviewPack(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.volume = rng.uniform(0, 1, (40, 36, 50)).astype(np.float32)
+        self.volume[7, 20, 33] = 5.0
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_matches_direct_reductions(self):
+        pack = PreviewPack.from_volume(self.volume, thumbnail_size=16, slab=16)
+        for axis in range(3):
+            np.testing.assert_array_equal(pack.mips[axis], self.volume.max(axis=axis))
+        np.testing.assert_array_equal(pack.slice_max[0], self.volume.max(axis=(1, 2)))
+        np.testing.assert_array_equal(pack.slice_max[1], self.volume.max(axis=(0, 2)))
+        np.testing.assert_array_equal(pack.slice_max[2], self.volume.max(axis=(0, 1)))
+        self.assertEqual(pack.peak_index, (7, 20, 33))
+        np.testing.assert_array_equal(pack.slice_at_peak('coronal'), self.volume[:, 20, :])
+        np.testing.assert_array_equal(pack.slice_at_peak('axial'), self.volume[:, :, 33])
+        self.assertLessEqual(max(pack.thumbnails['sagittal'].shape), 16)
+        self.assertAlmostEqual(pack.stats['sum'], float(self.volume.sum(dtype=np.float64)), places=2)
+        self.assertEqual(pack.stats['max'], 5.0)
+
+    def test_save_load(self):
+        pack = PreviewPack.from_volume(self.volume)
+        path = preview_path(os.path.join(self.tmp_dir, "MyRecon.dat"))
+        self.assertTrue(path.endswith("MyRecon.preview.npz"))
+        pack.save(path)
+        loaded = PreviewPack.load(path)
+        self.assertEqual(loaded.peak_index, pack.peak_index)
+        self.assertEqual(loaded.stats, pack.stats)
+        np.testing.assert_array_equal(loaded.mips[2], pack.mips[2])
+        np.testing.assert_array_equal(loaded.thumbnails['axial'], pack.thumbnails['axial'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import numpy as np
+import os
+import sys
+import shutil
+import tempfile
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect import OSEMReconstructor, Pipeline, ProjectionQC, ScanGeometry, SPECTDataLoader
+
+def phantom(n_slices, size):
+    z, y, x = np.mgrid[:n_slices, :size, :size]
+    volume = (((x - 0.56 * size) / (0.22 * size)) ** 2 + ((y - 0.47 * size) / (0.16 * size)) ** 2 +
+              ((z - n_slices / 2) / (0.3 * n_slices)) ** 2 < 1).astype(np.float32)
+    volume += 4 * ((((x - 0.44 * size) / 4) ** 2 + ((y - 0.53 * size) / 4) ** 2 +
+                    ((z - 0.55 * n_slices) / 3) ** 2) < 1)
+    return volume
+
+class TestProjectionQC(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        geometry = ScanGeometry(n_bins=64, n_rows=32, n_angles=64, bin_size_mm=4.0, recon_size=64)
+        cls.reconstructor = OSEMReconstructor(geometry=geometry, verbose=False)
+        cls.angles = np.arange(64) * 5.625
+        cls.volume = phantom(32, 64)
+        cls.clean = cls.reconstructor.forward_project(cls.volume, cls.angles)
+
+    def noisy(self, sinograms, total_counts=2e6):
+        rng = np.random.default_rng(0)
+        return rng.poisson(sinograms * total_counts / self.clean.sum()).astype(np.float32)
+
+    def moved(self, shift, axis):
+        # Patient moves before view 40
+        sinograms = self.clean.copy()
+        sinograms[:, 40:] = self.reconstructor.forward_project(np.roll(self.volume, shift, axis=axis),
+                                                               self.angles)[:, 40:]
+        return self.noisy(sinograms)
+
+    def test_consistent_study_passes(self):
+        for total_counts in (2e5, 2e7):
+            report = ProjectionQC().check(self.noisy(self.clean, total_counts), self.angles)
+            self.assertTrue(report['passed'], ProjectionQC.describe(report))
+        self.assertEqual(report['counts'].shape, (64,))
+        self.assertLess(report['lateral_rms'], 0.1)
+
+    def test_missing_frame(self):
+        sinograms = self.noisy(self.clean)
+        sinograms[:, 20] = 0
+        sinograms[:, 50] *= 0.7
+        report = ProjectionQC().check(sinograms, self.angles)
+        self.assertFalse(report['passed'])
+        self.assertEqual(report['missing_frames'], [20])
+        self.assertEqual(report['count_jumps'], [49, 50, 51])
+        self.assertTrue(np.isnan(report['axial_centroid'][20]))
+
+    def test_axial_motion(self):
+        report = ProjectionQC().check(self.moved(2, axis=0), self.angles)
+        self.assertEqual(report['axial_motion'], list(range(40, 64)))
+        self.assertIn(39, report['discontinuities'])
+        self.assertIn(40, report['discontinuities'])
+        self.assertEqual(report['missing_frames'], [])
+
+    def test_lateral_motion(self):
+        report = ProjectionQC().check(self.moved(3, axis=2), self.angles)
+        self.assertFalse(report['passed'])
+        self.assertTrue(report['lateral_motion'])
+        self.assertEqual(report['axial_motion'], [])
+
+    def test_summary_and_settings(self):
+        report = ProjectionQC().check(self.noisy(self.clean), self.angles)
+        summary = ProjectionQC.summary(report)
+        self.assertNotIn('counts', summary)
+        self.assertIn('count_cv', summary)
+        self.assertEqual(ProjectionQC(count_jump=0.2), ProjectionQC(count_jump=0.2))
+        self.assertNotEqual(ProjectionQC(count_jump=0.2), ProjectionQC())
+
+class TestPipelineQC(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.orbit_path = os.path.join(base_dir, "data", "input", "orbit.xlsx")
+        self.geometry = ScanGeometry(n_bins=32, n_rows=8, n_angles=64, bin_size_mm=4.0, recon_size=32)
+        angles = SPECTDataLoader().load_orbit_array(self.orbit_path)['angle']
+        sinograms = OSEMReconstructor(geometry=self.geometry, verbose=False).forward_project(phantom(8, 32), angles)
+        self.good_path = os.path.join(self.tmp_dir, "Good.dat")
+        self.bad_path = os.path.join(self.tmp_dir, "Bad.dat")
+        # (slice, angle, u) -> (u, v, angle) projection files
+        np.ascontiguousarray(sinograms.transpose(2, 0, 1)).tofile(self.good_path)
+        sinograms[:, 10] = 0
+        np.ascontiguousarray(sinograms.transpose(2, 0, 1)).tofile(self.bad_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def pipeline(self, strict):
+        reconstructor = OSEMReconstructor(n_subsets=4, n_iterations=1, geometry=self.geometry, verbose=False)
+        return Pipeline(os.path.join(self.tmp_dir, "cache"), reconstructor=reconstructor,
+                        qc=ProjectionQC(strict=strict))
+
+    def test_strict_qc_stops_before_reconstruction(self):
+        pipeline = self.pipeline(strict=True)
+        result = pipeline.run(self.good_path, self.orbit_path)
+        self.assertTrue(result['qc']['passed'])
+
+        with self.assertRaisesRegex(ValueError, "missing or empty frames: views \\[10\\]"):
+            pipeline.run(self.bad_path, self.orbit_path)
+        stages = [stage for stage, _, _ in pipeline.stage_log]
+        self.assertEqual(stages[-1], 'qc')
+        self.assertNotIn('reconstruct', stages)
+
+        # Not strict: the report is kept with the result
+        lenient = self.pipeline(strict=False)
+        result = lenient.run(self.bad_path, self.orbit_path)
+        self.assertEqual(result['qc']['missing_frames'], [10])
+        self.assertEqual(dict((stage, hit) for stage, _, hit in lenient.stage_log)['qc'], True)
+
+if __name__ == "__main__":
+    unittest.main()
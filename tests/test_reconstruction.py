@@ -6,7 +6,9 @@ import sys
 # 添加项目根目录到路径，以便导入模块
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from spect import OSEMReconstructor, SPECTDataLoader
+import tempfile
+from spect import OSEMReconstructor, SPECTDataLoader, ScanGeometry, SystemMatrixCache
+from spect.reconstruction import _resample_image
 
 class TestOSEM(unittest.TestCase):
     def test_reconstruct_slice(self):
@@ -42,5 +44,155 @@ class TestOSEM(unittest.TestCase):
         edge_val = result[10, 10]
         self.assertGreater(center_val, edge_val)
 
+class TestMultiResolution(unittest.TestCase):
+    def setUp(self):
+        self.geometry = ScanGeometry(n_bins=64, n_rows=4, n_angles=32)
+        self.angles = np.linspace(0, 360, 32, endpoint=False)
+        y, x = np.mgrid[:64, :64]
+        phantom = np.zeros((64, 64), dtype=np.float32)
+        phantom[(x - 32) ** 2 + (y - 30) ** 2 < 20 ** 2] = 1.0
+        phantom[(x - 25) ** 2 + (y - 25) ** 2 < 4 ** 2] = 4.0
+        self.phantom = phantom
+        H = self.geometry.system_matrix().compute_matrix(self.angles)
+        self.sinogram = H.dot(phantom.flatten()).reshape((32, 64))
+
+    def test_resample_preserves_counts(self):
+        image = np.random.default_rng(0).random((32, 32)).astype(np.float32)
+        for size in (16, 64):
+            resampled = _resample_image(image, size)
+            self.assertEqual(resampled.shape, (size, size))
+            self.assertAlmostEqual(resampled.sum(), image.sum(), delta=1e-3 * image.sum())
+
+    def test_coarse_to_fine_matches_full_grid(self):
+        full = OSEMReconstructor(n_subsets=4, n_iterations=8, geometry=self.geometry)
+        multires = OSEMReconstructor(n_subsets=4, n_iterations=8, geometry=self.geometry,
+                                     resolution_schedule=[(16, 2), (32, 2)])
+        self.assertEqual(multires.coarse_iterations, 4)
+
+        iterations = []
+        result = multires.reconstruct_slice(self.sinogram, self.angles,
+                                            iteration_callback=lambda it, image: iterations.append(it))
+        reference = full.reconstruct_slice(self.sinogram, self.angles)
+        self.assertEqual(result.shape, (64, 64))
+        # Only the full-grid iterations are reported (and checkpointed)
+        self.assertEqual(iterations, [4, 5, 6, 7])
+        self.assertAlmostEqual(result.sum(), self.phantom.sum(), delta=0.05 * self.phantom.sum())
+        self.assertLessEqual(np.abs(result - self.phantom).mean(),
+                             1.1 * np.abs(reference - self.phantom).mean())
+
+    def test_level_matrices_are_cached(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = SystemMatrixCache(self.geometry.system_matrix(), cache_dir=tmp)
+            recon = OSEMReconstructor(n_subsets=4, n_iterations=3, matrix_cache=cache, geometry=self.geometry,
+                                      resolution_schedule=[(32, 1)])
+            recon.reconstruct_slice(self.sinogram, self.angles)
+            level_sm = recon.level_cache(32).sm
+            self.assertEqual(level_sm.image_size, 32)
+            self.assertAlmostEqual(level_sm.pixel_size, 2 * self.geometry.voxel_size_mm)
+            self.assertEqual(len(os.listdir(tmp)), 2)
+            self.assertIs(recon.level_cache(32), recon.level_cache(32))
+
+    def test_invalid_schedule(self):
+        with self.assertRaises(ValueError):
+            OSEMReconstructor(n_subsets=4, n_iterations=4, geometry=self.geometry,
+                              resolution_schedule=[(32, 4)])
+        with self.assertRaises(ValueError):
+            OSEMReconstructor(n_subsets=4, n_iterations=4, geometry=self.geometry,
+                              resolution_schedule=[(64, 1)])
+
+class TestSupport(unittest.TestCase):
+    def setUp(self):
+        self.geometry = ScanGeometry(n_bins=64, n_rows=4, n_angles=32)
+        self.angles = np.linspace(0, 360, 32, endpoint=False)
+        y, x = np.mgrid[:64, :64]
+        phantom = np.zeros((64, 64), dtype=np.float32)
+        phantom[((x - 32) / 16) ** 2 + ((y - 32) / 12) ** 2 < 1] = 1.0
+        phantom[(x - 26) ** 2 + (y - 30) ** 2 < 9] = 4.0
+        self.phantom = phantom
+        H = self.geometry.system_matrix().compute_matrix(self.angles)
+        sinogram = H.dot(phantom.flatten()).reshape((32, 64))
+        self.proj = np.repeat(sinogram.T[:, None, :], 4, axis=1).astype(np.float32)
+
+    def test_fov_mask(self):
+        recon = OSEMReconstructor(n_subsets=4, n_iterations=2, geometry=self.geometry, support='fov')
+        mask = recon.support_mask(self.proj, self.angles)
+        self.assertTrue(mask[32, 32])
+        self.assertFalse(mask[0, 0])
+        self.assertGreater(mask.mean(), 0.7)
+
+    def test_body_support_matches_unrestricted(self):
+        full = OSEMReconstructor(n_subsets=4, n_iterations=4, geometry=self.geometry)
+        masked = OSEMReconstructor(n_subsets=4, n_iterations=4, geometry=self.geometry, support='body')
+        mask = masked.support_mask(self.proj, self.angles)
+        # The outline covers the object but only part of the field of view
+        self.assertTrue(mask[self.phantom > 0].all())
+        self.assertLess(mask.mean(), 0.5)
+
+        reference = full.reconstruct_volume(self.proj, self.angles)
+        result = masked.reconstruct_volume(self.proj, self.angles)
+        self.assertTrue(np.all(result[~mask] == 0))
+        self.assertLessEqual(np.abs(result - self.phantom[:, :, None]).mean(),
+                             1.05 * np.abs(reference - self.phantom[:, :, None]).mean())
+
+    def test_subset_systems_bounded(self):
+        # Each study's 'body' mask gets its own subset system; old ones are evicted
+        recon = OSEMReconstructor(n_subsets=4, n_iterations=1, geometry=self.geometry, support='body',
+                                  max_subset_systems=1, verbose=False)
+        for shift in (0, 4, 8):
+            recon.reconstruct_volume(np.roll(self.proj, shift, axis=0), self.angles)
+            self.assertEqual(len(recon._subset_systems), 1)
+
+    def test_explicit_mask(self):
+        mask = np.zeros((64, 64), dtype=bool)
+        mask[8:56, 8:56] = True
+        recon = OSEMReconstructor(n_subsets=4, n_iterations=2, geometry=self.geometry, support=mask)
+        iterations = []
+        result = recon.reconstruct_slice(self.proj[:, 0, :].T, self.angles, support_mask=mask,
+                                         iteration_callback=lambda it, image: iterations.append(image.copy()))
+        self.assertEqual(result.shape, (64, 64))
+        self.assertEqual(result[0, 0], 0)
+        # Checkpoint callbacks see full-size images
+        self.assertEqual(iterations[-1].size, 64 * 64)
+        with self.assertRaises(ValueError):
+            OSEMReconstructor(geometry=self.geometry, support=np.ones((32, 32), dtype=bool))
+        with self.assertRaises(ValueError):
+            OSEMReconstructor(geometry=self.geometry, support='lungs')
+
+class TestMultiHead(unittest.TestCase):
+    def test_head_offsets(self):
+        geometry = ScanGeometry(n_bins=64, n_rows=2, n_angles=32)
+        angles = np.linspace(0, 180, 32, endpoint=False)
+        probe_idx = np.repeat([1, 2], 16)
+        phantom = np.zeros((64, 64), dtype=np.float32)
+        phantom[20:44, 24:40] = 1.0
+        phantom[28:32, 28:32] = 5.0
+        # Head 2 is laterally offset by 2 bins
+        shift = np.where(probe_idx == 2, 2 * geometry.bin_size_mm, 0.0)
+        H = geometry.system_matrix().compute_matrix(angles, bin_shift_mm=shift)
+        sinogram = H.dot(phantom.flatten()).reshape((32, 64))
+        proj = np.repeat(sinogram.T[:, None, :], 2, axis=1)
+
+        plain = OSEMReconstructor(n_subsets=4, n_iterations=4, geometry=geometry)
+        aware = OSEMReconstructor(n_subsets=4, n_iterations=4, geometry=geometry,
+                                  head_offsets_mm={2: 2 * geometry.bin_size_mm})
+        threaded = OSEMReconstructor(n_subsets=4, n_iterations=4, geometry=geometry,
+                                     head_offsets_mm={2: 2 * geometry.bin_size_mm}, head_workers=2)
+        error_plain = np.abs(plain.reconstruct_volume(proj, angles, probe_idx=probe_idx)[:, :, 0] - phantom).mean()
+        result = aware.reconstruct_volume(proj, angles, probe_idx=probe_idx)
+        self.assertLess(np.abs(result[:, :, 0] - phantom).mean(), 0.7 * error_plain)
+
+        # Per-head blocks projected in threads give the same result
+        np.testing.assert_allclose(threaded.reconstruct_volume(proj, angles, probe_idx=probe_idx), result,
+                                   rtol=1e-4, atol=1e-4)
+        with self.assertRaises(ValueError):
+            aware.reconstruct_volume(proj, angles)
+
+        # Closing stops the head threads; they start again when needed
+        threaded.close()
+        self.assertIsNone(threaded._head_pool)
+        threaded.reconstruct_volume(proj, angles, probe_idx=probe_idx)
+        self.assertIsNotNone(threaded._head_pool)
+        threaded.close()
+
 if __name__ == "__main__":
     unittest.main()
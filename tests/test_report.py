@@ -0,0 +1,99 @@
+import unittest
+import numpy as np
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect.report import FIGURES, ReportEngine, build_batch_reports, load_fields
+
+SECTIONS = [
+    {"key": "intro", "title": "1. 简介",
+     "subsections": [{"subtitle": "(a) 参数", "content": "子集数目: {n_subsets}\n迭代次数: {n_iterations}"}]},
+    {"key": "results", "title": "2. 结果",
+     "subsections": [{"subtitle": "(a) 指标", "content": "RMSE 为 {rmse_recon:.3f}",
+                      "table": [["RMSE", "SSIM"], ["{rmse_recon:.6f}", "{ssim_recon:.6f}"]],
+                      "image": "compare_raw", "caption": "图 1"}]},
+]
+
+class TestReportEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, "cache")
+        from PIL import Image
+        image = (np.random.default_rng(0).random((50, 150, 4)) * 255).astype(np.uint8)
+        Image.fromarray(image, "RGBA").save(os.path.join(self.tmp_dir, FIGURES['compare_raw']))
+        self.fields = {'n_subsets': 4, 'n_iterations': 10, 'rmse_recon': 0.2, 'ssim_recon': 0.5}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def build(self, engine, fields, name="report"):
+        return engine.build(os.path.join(self.tmp_dir, name), fields, figures_dir=self.tmp_dir, date="2026年1月1日")
+
+    def test_only_changed_sections_rerender(self):
+        engine = ReportEngine(self.cache_dir, sections=SECTIONS)
+        paths = self.build(engine, self.fields)
+        self.assertFalse(any(hit for _, hit in engine.build_log))
+        with open(paths['pdf'], 'rb') as f:
+            self.assertTrue(f.read(5).startswith(b'%PDF'))
+        self.assertGreater(os.path.getsize(paths['docx']), 0)
+
+        # Unchanged inputs: every section and both documents come from the cache
+        again = self.build(engine, self.fields, name="again")
+        self.assertTrue(all(hit for _, hit in engine.build_log))
+        with open(paths['pdf'], 'rb') as a, open(again['pdf'], 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+
+        # A metric change re-renders only the section showing metrics
+        self.build(engine, {**self.fields, 'rmse_recon': 0.3})
+        self.assertEqual(dict(engine.build_log), {'intro': True, 'results': False,
+                                                  'document.pdf': False, 'document.docx': False})
+        blocks = engine.cache.load('report_section', engine._section(SECTIONS[1], {**self.fields, 'rmse_recon': 0.3},
+                                                                      self.tmp_dir)[0])['blocks']
+        self.assertIn({'type': 'paragraph', 'text': "RMSE 为 0.300"}, blocks)
+        self.assertEqual(blocks[-2]['rows'][1], ["0.300000", "0.500000"])
+
+    def test_missing_metrics_and_batch(self):
+        batch_dir = os.path.join(self.tmp_dir, "batch")
+        for study_id, metrics in (("s1", {'rmse_recon': 0.2}), ("s2", {})):
+            os.makedirs(os.path.join(batch_dir, study_id))
+            with open(os.path.join(batch_dir, study_id, "metrics.json"), "w") as f:
+                json.dump({'study': {'study_id': study_id}, 'parameters': {'n_subsets': 4}, 'metrics': metrics}, f)
+        self.assertEqual(load_fields(os.path.join(batch_dir, "s1", "metrics.json")),
+                         {'n_subsets': 4, 'rmse_recon': 0.2, 'study_id': 's1'})
+
+        reports = build_batch_reports(batch_dir, self.cache_dir, formats=['docx'], figures_dir=self.tmp_dir,
+                                      date="2026年1月1日")
+        self.assertEqual(sorted(reports), ["s1", "s2"])
+        for paths in reports.values():
+            self.assertTrue(os.path.exists(paths['docx']))
+
+    def test_script_sections(self):
+        # The report scripts only define sections; every field they use must come from load_fields
+        scripts_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+        sys.path.insert(0, scripts_dir)
+        try:
+            from generate_experiment_report import EXPERIMENT_SECTIONS
+            from generate_final_report import FINAL_SECTIONS
+            from generate_final_report_cn import FINAL_CN_SECTIONS
+            from generate_structured_report import STRUCTURED_SECTIONS
+        finally:
+            sys.path.remove(scripts_dir)
+        fields = {**self.fields, 'rmse_filtered': 0.1, 'ssim_filtered': 0.3, 'fwhm_mm': 10.0, 'pixel_size_mm': 3.3}
+        for sections in (EXPERIMENT_SECTIONS, STRUCTURED_SECTIONS, FINAL_SECTIONS, FINAL_CN_SECTIONS):
+            engine = ReportEngine(self.cache_dir, sections=sections)
+            paths = engine.build(os.path.join(self.tmp_dir, "script"), fields, figures_dir=self.tmp_dir,
+                                 formats=['pdf'], date="2026年1月1日")
+            self.assertTrue(os.path.exists(paths['pdf']))
+            for section in sections:
+                key = engine._section(section, fields, self.tmp_dir)[0]
+                text = json.dumps(engine.cache.load('report_section', key)['blocks'], ensure_ascii=False)
+                self.assertNotIn("N/A", text)
+
+if __name__ == "__main__":
+    unittest.main()
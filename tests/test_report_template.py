@@ -0,0 +1,38 @@
+import unittest
+import os
+import sys
+import glob
+import tempfile
+from unittest import mock
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect.report_template import FALLBACK_FONT, FONT_ENV, ReportTemplate, resolve_font
+
+TTF_FONTS = sorted(glob.glob("/usr/share/fonts/**/*.ttf", recursive=True))
+
+class TestReportTemplate(unittest.TestCase):
+    def test_resolve_font(self):
+        with tempfile.NamedTemporaryFile(suffix=".ttf") as f:
+            self.assertEqual(resolve_font(f.name), (os.path.basename(f.name)[:-4], f.name))
+            with mock.patch.dict(os.environ, {FONT_ENV: f.name}):
+                self.assertEqual(resolve_font()[1], f.name)
+        with self.assertRaises(FileNotFoundError):
+            resolve_font("/nonexistent/font.ttf")
+        with mock.patch.dict(os.environ, {FONT_ENV: ""}), \
+                mock.patch("spect.report_template.FONT_CANDIDATES", [("Missing", "/nonexistent/font.ttf")]):
+            self.assertEqual(resolve_font(), (FALLBACK_FONT, None))
+
+    @unittest.skipUnless(TTF_FONTS, "no TrueType font installed")
+    def test_template_built_once_per_font(self):
+        from reportlab.pdfbase import pdfmetrics
+
+        template = ReportTemplate.get(TTF_FONTS[0])
+        self.assertIs(ReportTemplate.get(TTF_FONTS[0]), template)
+        self.assertIn(template.font_name, pdfmetrics.getRegisteredFontNames())
+        self.assertEqual(template.styles['normal'].fontName, template.font_name)
+        self.assertEqual(template.styles['code'].fontName, 'Courier')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+import numpy as np
+import os
+import sys
+import json
+import shutil
+import tempfile
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect import batch
+from spect.service import ReconstructionService, submit_job
+
+class TestService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.orbit_path = os.path.join(base_dir, "data", "input", "orbit.xlsx")
+        self.proj_path = os.path.join(self.tmp_dir, "Proj.dat")
+        proj = np.zeros((32, 8, 64), dtype=np.float32)
+        proj[12:20] = 5.0
+        proj.tofile(self.proj_path)
+        self.ref_path = os.path.join(self.tmp_dir, "Ref.dat")
+        np.ones((32, 32, 8), dtype=np.float32).tofile(self.ref_path)
+
+        geometry = {'n_bins': 32, 'n_rows': 8, 'n_angles': 64, 'bin_size_mm': 13.2}
+        self.service = ReconstructionService(os.path.join(self.tmp_dir, "out"), n_subsets=4, n_iterations=2,
+                                             fwhm_mm=20.0, geometry=geometry, checkpoint=False)
+        self.service.serve(port=0, background=True)
+
+    def tearDown(self):
+        self.service.shutdown()
+        shutil.rmtree(self.tmp_dir)
+
+    def get(self, path):
+        with urlopen(f"{self.service.address}{path}") as response:
+            return json.loads(response.read())
+
+    def test_jobs_over_http(self):
+        self.assertEqual(self.get("/health")['status'], 'ok')
+        job = submit_job(self.service.address, {'study_id': 'first', 'projection': self.proj_path,
+                                                'orbit': self.orbit_path, 'reference': self.ref_path})
+        self.assertEqual(job['status'], 'ok', job.get('error'))
+        self.assertTrue(os.path.exists(job['outputs']['recon']))
+        self.assertIn('rmse_recon', job['metrics'])
+        self.assertEqual(np.fromfile(job['outputs']['recon'], dtype=np.float32).size, 32 * 32 * 8)
+
+        # Queued without waiting, then polled; job parameters override the defaults
+        queued = submit_job(self.service.address, {'projection': self.proj_path, 'orbit': self.orbit_path,
+                                                   'parameters': {'fwhm_mm': 10.0}}, wait=False)
+        self.assertIn(queued['status'], ('queued', 'running', 'ok'))
+        done = self.service.wait(queued['job_id'], timeout=60)
+        self.assertEqual(self.get(f"/jobs/{queued['job_id']}")['status'], done['status'])
+        self.assertEqual(done['status'], 'ok', done.get('error'))
+        self.assertEqual(len(self.get("/jobs")), 2)
+
+        with self.assertRaises(HTTPError) as ctx:
+            self.get("/jobs/missing")
+        self.assertEqual(ctx.exception.code, 404)
+        with self.assertRaises(HTTPError) as ctx:
+            submit_job(self.service.address, {'projection': self.proj_path})
+        self.assertEqual(ctx.exception.code, 400)
+        with self.assertRaises(HTTPError) as ctx:
+            submit_job(self.service.address, {'projection': self.proj_path, 'orbit': self.orbit_path,
+                                              'parameters': {'n_gpus': 2}})
+        self.assertEqual(ctx.exception.code, 400)
+
+    def post(self, body, headers):
+        from urllib.request import Request
+        req = Request(f"{self.service.address}/jobs", data=body, headers=headers)
+        with self.assertRaises(HTTPError) as ctx:
+            urlopen(req)
+        return ctx.exception.code
+
+    def test_unsafe_requests_are_rejected(self):
+        job = {'projection': self.proj_path, 'orbit': self.orbit_path}
+        for study_id in ("../escape", "/tmp/abs", "a/b", "..", "sp ace"):
+            with self.assertRaises(ValueError):
+                self.service.submit(dict(job, study_id=study_id))
+            with self.assertRaises(HTTPError) as ctx:
+                submit_job(self.service.address, dict(job, study_id=study_id))
+            self.assertEqual(ctx.exception.code, 400)
+
+        body = json.dumps(job).encode()
+        # Simple cross-site requests: no JSON content type, or another origin
+        self.assertEqual(self.post(body, {"Content-Type": "text/plain"}), 415)
+        self.assertEqual(self.post(body, {"Content-Type": "application/json",
+                                          "Origin": "http://evil.example"}), 403)
+        self.assertEqual(self.service.list_jobs(), [])
+
+    def test_failed_job_is_reported(self):
+        job = self.service.submit({'projection': os.path.join(self.tmp_dir, "missing.dat"),
+                                   'orbit': self.orbit_path})
+        done = self.service.wait(job['job_id'], timeout=60)
+        self.assertEqual(done['status'], 'failed')
+        self.assertIn('error', done)
+
+    def test_finished_jobs_are_pruned(self):
+        service = ReconstructionService(os.path.join(self.tmp_dir, "pruned"), max_finished_jobs=2)
+        job_ids = []
+        for _ in range(4):
+            job = service.submit({'projection': os.path.join(self.tmp_dir, "missing.dat"),
+                                  'orbit': self.orbit_path})
+            service.wait(job['job_id'], timeout=60)
+            job_ids.append(job['job_id'])
+        self.assertEqual([job['job_id'] for job in service.list_jobs()], job_ids[2:])
+        self.assertIsNone(service.job(job_ids[0]))
+
+        # Expired records go too
+        service.job_ttl_s = 0
+        job = service.submit({'projection': os.path.join(self.tmp_dir, "missing.dat"), 'orbit': self.orbit_path})
+        self.assertNotIn(job_ids[3], [record['job_id'] for record in service.list_jobs()])
+        service.shutdown()
+        with self.assertRaises(RuntimeError):
+            service.submit({'projection': self.proj_path, 'orbit': self.orbit_path})
+
+    def test_shutdown_closes_pipelines(self):
+        job = self.service.submit({'projection': self.proj_path, 'orbit': self.orbit_path})
+        self.assertEqual(self.service.wait(job['job_id'], timeout=60)['status'], 'ok')
+        self.assertEqual(len(batch._worker_reconstructors), 1)
+        self.service.shutdown()
+        self.assertEqual(len(batch._worker_reconstructors), 0)
+        self.assertEqual(len(batch._matrix_caches), 0)
+
+if __name__ == "__main__":
+    unittest.main()
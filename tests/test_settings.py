@@ -0,0 +1,38 @@
+import unittest
+import os
+import sys
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect import EnergyWindows, ProjectionQC, ScanGeometry
+from spect.settings import SettingsMixin
+
+class TestSettings(unittest.TestCase):
+    def test_equality_follows_to_dict(self):
+        for make, change in ((ScanGeometry, 'bin_size_mm'), (EnergyWindows, 'peak_width_kev'),
+                             (ProjectionQC, 'count_jump')):
+            a, b = make(), make()
+            self.assertEqual(a, b)
+            self.assertEqual(hash(a), hash(b))
+            self.assertEqual(len({a, b}), 1)
+
+            # Any setting in to_dict takes part in both equality and the hash
+            setattr(b, change, getattr(b, change) * 2)
+            self.assertNotEqual(a.to_dict(), b.to_dict())
+            self.assertNotEqual(a, b)
+            self.assertEqual(len({a, b}), 2)
+
+        # Different settings types never compare equal
+        self.assertNotEqual(EnergyWindows(), ProjectionQC())
+        self.assertTrue(repr(ProjectionQC(strict=False)).startswith("ProjectionQC("))
+        self.assertIn("strict=False", repr(ProjectionQC(strict=False)))
+
+    def test_to_dict_is_required(self):
+        class Incomplete(SettingsMixin):
+            pass
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+import os
+import sys
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect import OSEMReconstructor, PoissonSimulator, ScanGeometry
+from spect.simulation import ellipse_phantom
+
+class TestSimulation(unittest.TestCase):
+    def setUp(self):
+        self.geometry = ScanGeometry(n_bins=64, n_rows=2, n_angles=32)
+        self.angles = np.linspace(0, 360, 32, endpoint=False)
+        self.phantom = ellipse_phantom(64)
+
+    def test_phantom(self):
+        self.assertEqual(self.phantom.shape, (64, 64))
+        self.assertEqual(self.phantom[0, 0], 0)
+        self.assertAlmostEqual(float(self.phantom.max()), 4.0)
+        self.assertGreater(self.phantom.min(), -1e-6)
+
+    def test_forward_project_matches_matrix(self):
+        recon = OSEMReconstructor(n_subsets=4, n_iterations=2, geometry=self.geometry,
+                                  subset_ordering='bit_reversal')
+        H = self.geometry.system_matrix().compute_matrix(self.angles)
+        expected = H.dot(self.phantom.flatten()).reshape((32, 64))
+        np.testing.assert_allclose(recon.forward_project(self.phantom, self.angles), expected, rtol=1e-5, atol=1e-5)
+        stacked = recon.forward_project(np.stack([self.phantom, 2 * self.phantom]), self.angles)
+        np.testing.assert_allclose(stacked[1], 2 * expected, rtol=1e-5, atol=1e-5)
+
+    def test_batch_matches_single_slices(self):
+        recon = OSEMReconstructor(n_subsets=4, n_iterations=3, geometry=self.geometry,
+                                  resolution_schedule=[(32, 1)])
+        simulator = PoissonSimulator(recon, self.angles, seed=0)
+        sinograms = simulator.realize(simulator.project(self.phantom, total_counts=2e5), 3)
+        batch = recon.reconstruct_batch(sinograms, self.angles)
+        self.assertEqual(batch.shape, (3, 64, 64))
+        for k in range(3):
+            np.testing.assert_allclose(batch[k], recon.reconstruct_slice(sinograms[k], self.angles),
+                                       rtol=1e-4, atol=1e-4)
+
+        mask = np.zeros((64, 64), dtype=bool)
+        mask[8:56, 8:56] = True
+        masked = recon.reconstruct_batch(sinograms[:2], self.angles, support_mask=mask)
+        np.testing.assert_allclose(masked[1], recon.reconstruct_slice(sinograms[1], self.angles, support_mask=mask),
+                                   rtol=1e-4, atol=1e-4)
+
+    def test_noise_statistics(self):
+        recon = OSEMReconstructor(n_subsets=4, n_iterations=4, geometry=self.geometry)
+        simulator = PoissonSimulator(recon, self.angles, seed=1)
+        sinogram = simulator.project(self.phantom, total_counts=1e5)
+        self.assertAlmostEqual(float(sinogram.sum()), 1e5, delta=1.0)
+        noisy = simulator.realize(sinogram, 200)
+        # Poisson: mean and variance both follow the noiseless sinogram
+        busy = sinogram > 20
+        np.testing.assert_allclose(noisy.mean(axis=0)[busy], sinogram[busy], rtol=0.15)
+        np.testing.assert_allclose(noisy.var(axis=0)[busy].mean(), sinogram[busy].mean(), rtol=0.1)
+
+        study = simulator.run(self.phantom, 20, total_counts=1e5, batch_size=8)
+        self.assertEqual(study['n_realizations'], 20)
+        # The streamed moments match a direct computation over all realizations
+        again = PoissonSimulator(recon, self.angles, seed=1)
+        again.realize(again.project(self.phantom, total_counts=1e5), 200)
+        images = recon.reconstruct_batch(again.realize(sinogram, 20), self.angles)
+        np.testing.assert_allclose(study['mean'], images.mean(axis=0), rtol=1e-3, atol=1e-3)
+        np.testing.assert_allclose(study['variance'], images.var(axis=0, ddof=1), rtol=1e-2, atol=1e-3)
+        np.testing.assert_allclose(study['bias'], study['mean'] - study['truth'], atol=1e-5)
+
+if __name__ == "__main__":
+    unittest.main()
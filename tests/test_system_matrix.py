@@ -8,6 +8,7 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from spect import SystemMatrix
+from spect.system_matrix import csr_row_block
 
 class TestSystemMatrix(unittest.TestCase):
     def test_point_source_projection(self):
@@ -52,5 +53,43 @@ class TestSystemMatrix(unittest.TestCase):
         # Verify it's not empty
         self.assertGreater(projection.sum(), 0)
 
+    def test_subset_ordered_rows(self):
+        sm = SystemMatrix(image_size=32, detector_size=32)
+        angles = np.linspace(0, 360, 12, endpoint=False)
+        angle_order = np.array([0, 4, 8, 2, 6, 10, 1, 5, 9, 3, 7, 11])
+        H = sm.compute_matrix(angles)
+        H_ordered = sm.compute_matrix(angles, angle_order)
+
+        rows = (angle_order[:, None] * 32 + np.arange(32)).ravel()
+        self.assertEqual((H_ordered != H[rows]).nnz, 0)
+        self.assertNotEqual(sm.geometry_key(angles), sm.geometry_key(angles, angle_order))
+        self.assertEqual(sm.geometry_key(angles), sm.geometry_key(angles, np.arange(12)))
+
+    def test_detector_shift(self):
+        sm = SystemMatrix(image_size=32, detector_size=32)
+        angles = np.array([0.0, 90.0])
+        image = np.zeros((32, 32), dtype=np.float32)
+        image[16, 10] = 1.0
+        plain = sm.compute_matrix(angles).dot(image.flatten()).reshape((2, 32))
+        # Shifting the first view's detector by one bin moves its profile one bin down
+        shifted = sm.compute_matrix(angles, bin_shift_mm=[sm.detector_pixel_size, 0.0])
+        shifted = shifted.dot(image.flatten()).reshape((2, 32))
+        np.testing.assert_allclose(shifted[0, :-1], plain[0, 1:], atol=1e-6)
+        np.testing.assert_allclose(shifted[1], plain[1], atol=1e-6)
+        self.assertNotEqual(sm.geometry_key(angles), sm.geometry_key(angles, bin_shift_mm=[1.0, 0.0]))
+        self.assertEqual(sm.geometry_key(angles), sm.geometry_key(angles, bin_shift_mm=[0.0, 0.0]))
+
+    def test_row_block_is_a_view(self):
+        sm = SystemMatrix(image_size=32, detector_size=32)
+        H = sm.compute_matrix(np.linspace(0, 180, 8, endpoint=False))
+        block = csr_row_block(H, 64, 128)
+        self.assertTrue(np.shares_memory(block.data, H.data))
+        self.assertTrue(np.shares_memory(block.indices, H.indices))
+        self.assertEqual((block != H[64:128]).nnz, 0)
+        x = np.random.default_rng(0).random(32 * 32).astype(np.float32)
+        np.testing.assert_allclose(block.dot(x), H[64:128].dot(x), rtol=1e-5)
+        y = np.ones(64, dtype=np.float32)
+        np.testing.assert_allclose(block.transpose().dot(y), H[64:128].transpose().dot(y), rtol=1e-5)
+
 if __name__ == "__main__":
     unittest.main()
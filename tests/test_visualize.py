@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+import os
+import sys
+import shutil
+import tempfile
+
+# 添加项目根目录和 tools 目录到路径，以便导入模块
+base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, base_dir)
+sys.path.insert(0, os.path.join(base_dir, "tools"))
+
+from spect.preview_pack import PreviewPack
+from visualize_results import comparison_job, load_preview, montage, montage_job, ortho_job, render_figures
+
+class TestVisualize(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.volume = np.random.default_rng(0).random((8, 6, 5)).astype(np.float32)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_montage_tiles_slices(self):
+        image, n_cols = montage(self.volume, axis=2)
+        self.assertEqual(n_cols, 3)
+        self.assertEqual(image.shape, (2 * 8, 3 * 6))
+        # Slice 4 is the second tile of the second row; the last tile is empty
+        np.testing.assert_array_equal(image[8:16, 6:12], self.volume[:, :, 4])
+        self.assertFalse(image[8:16, 12:18].any())
+
+        image, n_cols = montage(self.volume, axis=0, n_cols=4)
+        self.assertEqual(image.shape, (2 * 6, 4 * 5))
+        np.testing.assert_array_equal(image[6:12, 15:20], self.volume[7])
+
+    def test_render_figures_in_pool(self):
+        reference = self.volume * 0.9
+        preview = PreviewPack.from_volume(self.volume)
+        paths = [os.path.join(self.tmp_dir, name) for name in ("compare.png", "ortho.png", "montage.png")]
+        jobs = [comparison_job(self.volume, reference, "Raw", paths[0], slice_idx=2),
+                ortho_job(self.volume, preview, "Ortho", paths[1]),
+                montage_job(self.volume, "Montage", paths[2])]
+        messages = render_figures(jobs, workers=2)
+        self.assertEqual(len(messages), 3)
+        self.assertTrue(messages[2].endswith("montage.png"))
+        for path in paths:
+            self.assertGreater(os.path.getsize(path), 0)
+
+    def test_reference_preview_is_saved(self):
+        path = os.path.join(self.tmp_dir, "Ref.dat")
+        self.volume.tofile(path)
+        preview = load_preview(path, self.volume)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir, "Ref.preview.npz")))
+        self.assertEqual(load_preview(path, None).peak_index, preview.peak_index)
+
+        # The axial slice can follow another volume's peak
+        _, kwargs = ortho_job(self.volume, preview, "Ortho", "ortho.png", axial_index=1)
+        np.testing.assert_array_equal(kwargs['axial'], self.volume[:, :, 1])
+        self.assertEqual(kwargs['peak_index'][:2], preview.peak_index[:2])
+        self.assertEqual(kwargs['peak_index'][2], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import numpy as np
+import os
+import sys
+import shutil
+import tempfile
+
+# 添加项目根目录到路径，以便导入模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spect import SPECTDataLoader, ScanGeometry
+from spect.volume_format import VolumeWriter, is_volume_file
+
+class TestVolumeFormat(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.loader = SPECTDataLoader(ScanGeometry(n_bins=32, n_rows=20, n_angles=16))
+        # Mostly-zero volume with a hot region, like a reconstruction
+        rng = np.random.default_rng(0)
+        self.volume = np.zeros((32, 32, 20), dtype=np.float32)
+        self.volume[8:20, 6:18, 5:13] = rng.gamma(2.0, 1.0, (12, 12, 8))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        orbit = np.zeros(4, dtype=[('index', np.int64), ('angle', np.float64)])
+        orbit['index'] = np.arange(4)
+        orbit['angle'] = [0.0, 45.0, 90.0, 135.0]
+        for compression in ('zlib', 'none'):
+            path = os.path.join(self.tmp_dir, f"vol_{compression}.svol")
+            self.loader.save_volume_file(path, self.volume, voxel_size_mm=3.3, orbit=orbit,
+                                         provenance={'study': 'unit'}, chunk_depth=3,
+                                         compression=compression)
+            self.assertTrue(is_volume_file(path))
+            np.testing.assert_array_equal(self.loader.load_volume(path), self.volume)
+
+            with self.loader.open_volume_file(path) as vf:
+                self.assertEqual(vf.shape, self.volume.shape)
+                self.assertEqual(vf.voxel_size_mm, 3.3)
+                self.assertEqual(vf.orbit['angle'], [0.0, 45.0, 90.0, 135.0])
+                self.assertEqual(vf.provenance['study'], 'unit')
+                np.testing.assert_array_equal(vf.read_slices(4, 11), self.volume[:, :, 4:11])
+                np.testing.assert_array_equal(vf.read_slice(-1), self.volume[:, :, -1])
+
+    def test_compression_and_slice_access(self):
+        path = os.path.join(self.tmp_dir, "vol.svol")
+        self.loader.save_volume_file(path, self.volume, chunk_depth=4)
+        self.assertLess(os.path.getsize(path), self.volume.nbytes / 2)
+
+        with self.loader.open_volume_file(path) as vf:
+            # All-zero chunks (slices 0-3, 16-19) are stored empty
+            sizes = [nbytes for _, nbytes in vf.header['chunks']]
+            self.assertEqual(sizes[0], 0)
+            self.assertEqual(sizes[-1], 0)
+        for z in range(self.volume.shape[2]):
+            np.testing.assert_array_equal(self.loader.read_slice(path, z), self.volume[:, :, z])
+        with self.assertRaises(IndexError):
+            self.loader.read_slice(path, 20)
+
+    def test_incomplete_volume_is_rejected(self):
+        path = os.path.join(self.tmp_dir, "partial.svol")
+        writer = VolumeWriter(path, self.volume.shape)
+        writer.write_slices(self.volume[:, :, :5])
+        with self.assertRaises(ValueError):
+            writer.close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_header_shape_must_match_geometry(self):
+        path = os.path.join(self.tmp_dir, "vol.svol")
+        self.loader.save_volume_file(path, self.volume)
+        with self.assertRaisesRegex(ValueError, r"\(32, 32, 20\).*\(128, 128, 128\)"):
+            SPECTDataLoader().load_volume(path)
+
+        proj_path = os.path.join(self.tmp_dir, "proj.svol")
+        self.loader.save_volume_file(proj_path, np.ones((32, 20, 16), dtype=np.float32))
+        self.assertEqual(self.loader.load_projection(proj_path).shape, (32, 20, 16))
+        with self.assertRaisesRegex(ValueError, r"\(32, 20, 16\).*\(128, 128, 64\)"):
+            SPECTDataLoader().load_projection(proj_path)
+        # A projection is not a volume of the same geometry
+        with self.assertRaises(ValueError):
+            self.loader.load_volume(proj_path)
+
+    def test_raw_files_still_load(self):
+        path = os.path.join(self.tmp_dir, "Recon.dat")
+        volume = np.random.rand(32, 32, 20).astype(np.float32)
+        volume.tofile(path)
+        self.assertFalse(is_volume_file(path))
+        np.testing.assert_array_equal(self.loader.load_volume(path), volume)
+
+if __name__ == "__main__":
+    unittest.main()
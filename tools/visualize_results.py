@@ -1,44 +1,69 @@
+import argparse
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
 # 添加项目根目录到路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from spect import SPECTDataLoader
+from spect.preview_pack import PreviewPack, preview_path
 
-def save_comparison_plot(my_vol, ref_vol, title_prefix, filename, slice_idx=None, axis=2):
+AXIS_NAMES = ("Sagittal", "Coronal", "Axial")
+
+def load_preview(volume_path, volume):
     """
-    Save a side-by-side comparison of a slice.
-    axis: 0=Sagittal, 1=Coronal, 2=Axial (Transverse)
+    Preview pack saved next to a volume by the pipeline, or built from it
+    (one pass) if there is none or it is older than the volume. A built pack
+    is saved next to the volume (when writable), so volumes the pipeline did
+    not write, e.g. the reference, are only scanned once.
     """
-    if slice_idx is None:
-        # Find slice with max intensity in ref volume
-        if axis == 0:
-            proj = np.max(ref_vol, axis=(1, 2))
-        elif axis == 1:
-            proj = np.max(ref_vol, axis=(0, 2))
-        else:
-            proj = np.max(ref_vol, axis=(0, 1))
-        slice_idx = np.argmax(proj)
-        
-    # Extract slices
-    if axis == 0:
-        sl_my = my_vol[slice_idx, :, :]
-        sl_ref = ref_vol[slice_idx, :, :]
-        axis_name = "Sagittal"
-    elif axis == 1:
-        sl_my = my_vol[:, slice_idx, :]
-        sl_ref = ref_vol[:, slice_idx, :]
-        axis_name = "Coronal"
-    else:
-        sl_my = my_vol[:, :, slice_idx]
-        sl_ref = ref_vol[:, :, slice_idx]
-        axis_name = "Axial"
-        
-    # Plot
-    fig, axes = plt.subplots(1, 3, figsize=(15, 5))
+    path = preview_path(volume_path)
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(volume_path):
+        return PreviewPack.load(path)
+    preview = PreviewPack.from_volume(volume)
+    try:
+        preview.save(path)
+    except OSError:
+        pass
+    return preview
+
+def new_figure(figsize):
+    """
+    Figure drawn by its own Agg canvas. No pyplot global state is involved,
+    so figures can be rendered headless and in worker processes.
+    """
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+def take_slice(volume, axis, slice_idx):
+    return np.asarray(np.take(volume, slice_idx, axis=axis), dtype=np.float32)
+
+def montage(volume, axis=2, n_cols=None):
+    """
+    Tile all slices of a volume across axis into one 2D image
+    (row-major, slice 0 top-left). Missing tiles in the last row are zero.
+    Returns: (image, n_cols)
+    """
+    slices = np.moveaxis(np.asarray(volume, dtype=np.float32), axis, 0)
+    n, h, w = slices.shape
+    n_cols = n_cols or int(np.ceil(np.sqrt(n)))
+    n_rows = int(np.ceil(n / n_cols))
+    tiles = np.zeros((n_rows * n_cols, h, w), dtype=np.float32)
+    tiles[:n] = slices
+    image = tiles.reshape(n_rows, n_cols, h, w).transpose(0, 2, 1, 3).reshape(n_rows * h, n_cols * w)
+    return image, n_cols
+
+def render_comparison(sl_my, sl_ref, title_prefix, axis_name, slice_idx, filename):
+    """
+    Side-by-side reference / result / difference of one slice.
+    """
+    fig = new_figure((15, 5))
+    axes = fig.subplots(1, 3)
     
     # Common scaling
     vmin = 0
@@ -46,25 +71,127 @@ def save_comparison_plot(my_vol, ref_vol, title_prefix, filename, slice_idx=None
     
     im0 = axes[0].imshow(sl_ref, cmap='gray', vmin=vmin, vmax=vmax)
     axes[0].set_title(f"Reference ({axis_name} {slice_idx})")
-    plt.colorbar(im0, ax=axes[0])
+    fig.colorbar(im0, ax=axes[0])
     
     im1 = axes[1].imshow(sl_my, cmap='gray', vmin=vmin, vmax=vmax)
     axes[1].set_title(f"My Recon ({axis_name} {slice_idx})")
-    plt.colorbar(im1, ax=axes[1])
+    fig.colorbar(im1, ax=axes[1])
     
     # Difference
     diff = sl_my - sl_ref
     im2 = axes[2].imshow(diff, cmap='seismic', vmin=-vmax/2, vmax=vmax/2)
     axes[2].set_title("Difference")
-    plt.colorbar(im2, ax=axes[2])
+    fig.colorbar(im2, ax=axes[2])
+    
+    fig.suptitle(f"{title_prefix} Comparison")
+    fig.tight_layout()
+    fig.savefig(filename)
+    return f"Saved comparison to {filename}"
+
+def render_ortho(axial, coronal, sagittal, peak_index, title, filename):
+    """
+    Axial, coronal and sagittal slices through peak_index (x, y, z).
+    """
+    max_x, max_y, max_z = peak_index
+    fig = new_figure((15, 5))
+    axes = fig.subplots(1, 3)
+    
+    axes[0].imshow(axial, cmap='gray')
+    axes[0].set_title(f"Axial (Z={max_z})")
     
-    plt.suptitle(f"{title_prefix} Comparison")
-    plt.tight_layout()
-    plt.savefig(filename)
-    plt.close()
-    print(f"Saved comparison to {filename}")
+    axes[1].imshow(np.rot90(coronal), cmap='gray') # Rotate for display convention
+    axes[1].set_title(f"Coronal (Y={max_y})")
+    
+    axes[2].imshow(np.rot90(sagittal), cmap='gray')
+    axes[2].set_title(f"Sagittal (X={max_x})")
+    
+    fig.suptitle(title)
+    fig.tight_layout()
+    fig.savefig(filename)
+    return f"Saved orthogonal views to {filename}"
+
+def render_montage(image, n_slices, n_cols, tile_shape, title, filename):
+    """
+    A montage (see montage()) drawn as a single image, with slice numbers
+    in the corner of each tile.
+    """
+    h, w = tile_shape
+    n_rows = image.shape[0] // h
+    fig = new_figure((2 * n_cols * w / max(h, w) + 1, 2 * n_rows * h / max(h, w) + 1))
+    ax = fig.add_axes((0, 0, 1, 0.95))
+    ax.imshow(image, cmap='gray', vmin=0, vmax=image.max() or 1.0, interpolation='nearest')
+    ax.set_axis_off()
+    for i in range(n_slices):
+        row, col = divmod(i, n_cols)
+        ax.text(col * w + 1, row * h + 1, str(i), color='yellow', fontsize=6, va='top', ha='left')
+    fig.suptitle(title)
+    fig.savefig(filename)
+    return f"Saved montage to {filename}"
+
+def comparison_job(my_vol, ref_vol, title_prefix, filename, slice_idx, axis=2):
+    """
+    (render function, kwargs) for render_figures. Only the two slices are
+    sent to the worker, not the volumes.
+    """
+    return render_comparison, dict(sl_my=take_slice(my_vol, axis, slice_idx),
+                                   sl_ref=take_slice(ref_vol, axis, slice_idx),
+                                   title_prefix=title_prefix, axis_name=AXIS_NAMES[axis],
+                                   slice_idx=slice_idx, filename=filename)
+
+def ortho_job(volume, preview, title, filename, axial_index=None):
+    """
+    Coronal and sagittal slices through the volume's peaks (from its
+    preview pack); the axial slice is axial_index if given, else its own peak.
+    """
+    max_x, max_y, max_z = preview.peak_index
+    max_z = max_z if axial_index is None else axial_index
+    return render_ortho, dict(axial=take_slice(volume, 2, max_z),
+                              coronal=preview.slice_at_peak('coronal'),
+                              sagittal=preview.slice_at_peak('sagittal'),
+                              peak_index=(max_x, max_y, max_z), title=title, filename=filename)
+
+def montage_job(volume, title, filename, axis=2, n_cols=None):
+    image, n_cols = montage(volume, axis, n_cols)
+    tile_shape = tuple(np.delete(volume.shape, axis))
+    return render_montage, dict(image=image, n_slices=volume.shape[axis], n_cols=n_cols,
+                                tile_shape=tile_shape, title=title, filename=filename)
+
+def _render(job):
+    function, kwargs = job
+    return function(**kwargs)
+
+def render_figures(jobs, workers=None):
+    """
+    Render independent figure jobs, each on its own Agg canvas, across a
+    process pool (workers <= 1 renders in this process).
+    Returns: the jobs' messages, in job order
+    """
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [_render(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_render, jobs))
+
+def save_comparison_plot(my_vol, ref_vol, title_prefix, filename, slice_idx=None, axis=2, ref_preview=None):
+    """
+    Save a side-by-side comparison of a slice.
+    axis: 0=Sagittal, 1=Coronal, 2=Axial (Transverse)
+    slice_idx: defaults to the reference's max-intensity slice (from ref_preview)
+    """
+    if slice_idx is None:
+        # Find slice with max intensity in ref volume
+        ref_preview = ref_preview or PreviewPack.from_volume(ref_vol)
+        slice_idx = ref_preview.peak_index[axis]
+    print(_render(comparison_job(my_vol, ref_vol, title_prefix, filename, slice_idx, axis)))
 
 def main():
+    parser = argparse.ArgumentParser(description="Render comparison figures of the reconstruction results.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="figure rendering processes (default: CPU count, 1 = serial)")
+    parser.add_argument("--montage", action="store_true",
+                        help="also draw every axial slice of MyRecon/MyFiltered as one montage image")
+    args = parser.parse_args()
+    
     loader = SPECTDataLoader()
     base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     data_dir = os.path.join(base_dir, "data")
@@ -73,49 +200,38 @@ def main():
     
     print("Loading volumes for visualization...")
     my_recon = loader.load_volume(os.path.join(outputs_dir, "MyRecon.dat"))
-    ref_recon = loader.load_volume(os.path.join(data_dir, "reference", "OSEMReconed.dat"))
+    ref_recon_path = os.path.join(data_dir, "reference", "OSEMReconed.dat")
+    ref_recon = loader.load_volume(ref_recon_path)
     
     my_filt = loader.load_volume(os.path.join(outputs_dir, "MyFiltered.dat"))
     ref_filt = loader.load_volume(os.path.join(data_dir, "reference", "Filtered.dat"))
+    my_filt_preview = load_preview(os.path.join(outputs_dir, "MyFiltered.dat"), my_filt)
     
     # Find a good slice (center of mass or max intensity)
     # Usually heart is high intensity
-    max_z = np.argmax(np.max(ref_recon, axis=(0, 1)))
+    max_z = load_preview(ref_recon_path, ref_recon).peak_index[2]
     print(f"Detected max intensity slice at Z={max_z}")
     
-    # 1. Raw Comparison (Axial)
     os.makedirs(pictures_dir, exist_ok=True)
-    save_comparison_plot(my_recon, ref_recon, "Raw Reconstruction", 
-                         os.path.join(pictures_dir, "viz_compare_raw_axial.png"), 
-                         slice_idx=max_z, axis=2)
-                         
-    # 2. Filtered Comparison (Axial)
-    save_comparison_plot(my_filt, ref_filt, "Filtered Reconstruction", 
-                         os.path.join(pictures_dir, "viz_compare_filtered_axial.png"), 
-                         slice_idx=max_z, axis=2)
-    
-    # 3. Orthogonal Views of My Result
-    fig, axes = plt.subplots(1, 3, figsize=(15, 5))
-    
-    # Axial
-    axes[0].imshow(my_filt[:, :, max_z], cmap='gray')
-    axes[0].set_title(f"Axial (Z={max_z})")
-    
-    # Coronal (Y)
-    max_y = np.argmax(np.max(my_filt, axis=(0, 2)))
-    axes[1].imshow(np.rot90(my_filt[:, max_y, :]), cmap='gray') # Rotate for display convention
-    axes[1].set_title(f"Coronal (Y={max_y})")
-    
-    # Sagittal (X)
-    max_x = np.argmax(np.max(my_filt, axis=(1, 2)))
-    axes[2].imshow(np.rot90(my_filt[max_x, :, :]), cmap='gray')
-    axes[2].set_title(f"Sagittal (X={max_x})")
-    
-    plt.suptitle("My Filtered Result - Orthogonal Views")
-    plt.tight_layout()
-    plt.savefig(os.path.join(pictures_dir, "viz_ortho_views.png"))
-    plt.close()
-    print(f"Saved orthogonal views to {os.path.join(pictures_dir, 'viz_ortho_views.png')}")
+    jobs = [
+        # 1. Raw Comparison (Axial)
+        comparison_job(my_recon, ref_recon, "Raw Reconstruction",
+                       os.path.join(pictures_dir, "viz_compare_raw_axial.png"), max_z, axis=2),
+        # 2. Filtered Comparison (Axial)
+        comparison_job(my_filt, ref_filt, "Filtered Reconstruction",
+                       os.path.join(pictures_dir, "viz_compare_filtered_axial.png"), max_z, axis=2),
+        # 3. Orthogonal Views of My Result: axial at the reference's max slice,
+        #    coronal/sagittal through the peaks recorded in its preview pack
+        ortho_job(my_filt, my_filt_preview, "My Filtered Result - Orthogonal Views",
+                  os.path.join(pictures_dir, "viz_ortho_views.png"), axial_index=max_z),
+    ]
+    if args.montage:
+        jobs.append(montage_job(my_recon, "My Recon - Axial Slices",
+                                os.path.join(pictures_dir, "viz_montage_recon.png")))
+        jobs.append(montage_job(my_filt, "My Filtered - Axial Slices",
+                                os.path.join(pictures_dir, "viz_montage_filtered.png")))
+    for message in render_figures(jobs, args.workers):
+        print(message)
 
 if __name__ == "__main__":
     main()